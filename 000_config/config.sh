@@ -6,9 +6,14 @@
                     target_density=0.85
                     run_gs=false
                     sizer="USizer"
+                    legalizer="abacus"
                     router_list=("NCTUgr")
                     tile_size=80
                     num_layer=8
                     adjustment=50
                     safety=90
+                    max_est_overflow=""
+                    num_jobs=4
+                    race_placers=("ComPLx" "NTUPlace3" "mPL6" "FastPlace-GP" "Capo")
+                    race_deadline=3600
                     
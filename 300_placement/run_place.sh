@@ -9,10 +9,10 @@ contains() {
 }
 if test "$#" -ne 5; then
     echo "Usage: ./run_place.sh <bench> <bookshelf_dir> <placer> <target_density> <out_dir>"
-    echo "Available placers: [ComPLx | NTUPlace3 | mPL6 | mPL5 | Capo | FastPlace-GP]"
+    echo "Available placers: [ComPLx | NTUPlace3 | mPL6 | mPL5 | Capo | FastPlace-GP | race]"
     exit
-elif contains "ComPLx NTUPlace3 mPL6 mPL5 Capo FastPlace-GP" $3 = 0; then
-    echo "Available placers: [ComPLx | NTUPlace3 | mPL6 | mPL5 | Capo | FastPlace-GP]"
+elif contains "ComPLx NTUPlace3 mPL6 mPL5 Capo FastPlace-GP race" $3 = 0; then
+    echo "Available placers: [ComPLx | NTUPlace3 | mPL6 | mPL5 | Capo | FastPlace-GP | race]"
     exit
 fi
 
@@ -29,7 +29,6 @@ out_dir=$5
 
 aux_file=${bookshelf_dir}/${bench}.aux
 
-bin_dir="../bin"
 log=${bench}_${placer}.log.txt
 
 if [ -d $out_dir ]; then
@@ -38,126 +37,38 @@ fi
 mkdir $out_dir
 
 #------------------------------------------------------------------------------
-# Capo placer
+# Race: run race_placers in parallel and keep the best HPWL
 #------------------------------------------------------------------------------
-if test "$placer" = "Capo"; then
-    echo "(I) Target density ($target_util) will be ignored, since you use Capo placer."
-    cmd="$bin_dir/MetaPl-Capo10.2-Lnx64.exe -faster -f $aux_file -save"
+if test "$placer" = "race"; then
+    source ../000_config/config.sh
+    race_placers=("${race_placers[@]:-ComPLx NTUPlace3 mPL6 FastPlace-GP Capo}")
+
+    cmd="python3 ../utils/300_race_placers.py --bench ${bench}"
+    cmd="$cmd --bookshelf_dir ${bookshelf_dir} --placers ${race_placers[@]}"
+    cmd="$cmd --target_density ${target_util} --deadline ${race_deadline:-3600}"
+    cmd="$cmd --out_dir ${out_dir}"
     echo $cmd
     eval $cmd | tee ${log}
 
-    mv out.pl ${out_dir}/${bench}_Capo.pl
-
-    out_pl=${bench}_Capo.pl
-
-#------------------------------------------------------------------------------
-# NTUPlace3
-#------------------------------------------------------------------------------
-elif test "$placer" = "NTUPlace3"; then
-
-    cmd="${bin_dir}/ntuplace3 -aux $aux_file -util $target_util"
-    echo $cmd
-    eval $cmd | tee ${log}
-
-    mv *.pl $out_dir
-    mv *.plt $out_dir
-
-    out_pl=${bench}.ntup.pl
-
-#------------------------------------------------------------------------------
-# ComPLx 
-#------------------------------------------------------------------------------
-elif test "$placer" = "ComPLx"; then
-
-    cmd="${bin_dir}/ComPLx.exe -f ${bookshelf_dir}/${bench}.aux -ut ${target_util}"
-    echo $cmd
-    eval $cmd | tee ${log}
-
-    # Detailed placement with FastPlace3.0
-    cmd="${bin_dir}/FastPlace3.0_Linux64_DP -legalize -noFlipping -target_density ${target_util}"
-    cmd="$cmd ${bookshelf_dir} ${bench}.aux"
-    cmd="$cmd . ${bench}-ComPLx.pl"
-    echo $cmd
-    eval $cmd | tee --append ${log}
-
-    mv ${bench}-ComPLx.pl ${out_dir}/
-    mv ${bench}_FP_dp.pl ${out_dir}/
-
-    out_pl=${bench}_FP_dp.pl
-
-
-#------------------------------------------------------------------------------
-# FastPlaceGP 
-#------------------------------------------------------------------------------
-elif test "$placer" = "FastPlace-GP"; then
-
-    #./FastPlace3.0_Linux32_GP [options] <benchmark_dir> <aux_file> <output_dir>
-    cmd="${bin_dir}/FastPlace3.0_Linux32_GP -target_density ${target_util}"
-    cmd="$cmd ${bookshelf_dir} ${bench}.aux ."
-    echo $cmd
-    eval $cmd | tee ${log}
-
-    # Detailed placement with FastPlace3.0
-    cmd="${bin_dir}/FastPlace3.0_Linux64_DP -legalize -noFlipping -target_density ${target_util}"
-    cmd="$cmd ${bookshelf_dir} ${bench}.aux"
-    cmd="$cmd . ${bench}_FP_gp.pl"
-    echo $cmd
-    eval $cmd | tee --append ${log}
-
-    mv ${bench}_FP_gp.pl ${out_dir}/
-    mv ${bench}_FP_dp.pl ${out_dir}/
-
-    out_pl=${bench}_FP_dp.pl
-
-
-
-#------------------------------------------------------------------------------
-# mPL6 
-#------------------------------------------------------------------------------
-elif test "$placer" = "mPL6"; then
-
-	cp ${bookshelf_dir}/* .
-	#cmd="${bin_dir}/mPL6 -d ${bench}.aux -cluster_ratio 0.1 -mvcycle 0 -mPL_DP 0"
-	cmd="${bin_dir}/mPL6 -d ${bench}.aux -mPL_DP 0 -target_density ${target_util}"
-    echo $cmd
-    eval $cmd | tee ${log}
-	rm -f ${bench}.aux ${bench}.nodes ${bench}.nets ${bench}.wts ${bench}.scl ${bench}.pl ${bench}.shapes
-
-    # Detailed placement with FastPlace3.0
-    cmd="${bin_dir}/FastPlace3.0_Linux64_DP -legalize -noFlipping -target_density ${target_util}"
-    cmd="$cmd ${bookshelf_dir} ${bench}.aux"
-    cmd="$cmd . ${bench}-mPL.pl"
-    echo $cmd
-    eval $cmd | tee --append ${log}
-
-    # mv *mPL-gp.pl $out_dir
-    mv *mPL.pl $out_dir
-    mv ${bench}_FP_dp.pl ${out_dir}/
-    
-    out_pl=${bench}_FP_dp.pl
+    out_pl=${bench}_solution.pl
 
 #------------------------------------------------------------------------------
-# mPL5
+# ComPLx, NTUPlace3, mPL6, mPL5, Capo, FastPlace-GP: run by tool_runner in a
+# scratch directory of their own (see get_placer_job), so that placers
+# writing fixed file names do not collide.
 #------------------------------------------------------------------------------
-elif test "$placer" = "mPL5"; then
-
-	cp ${bookshelf_dir}/* .
-	cmd="${bin_dir}/mPL5 -d ${bench}.aux -mPL_DP 0 -target_density ${target_util}"
+else
+    if test "$placer" = "Capo"; then
+        echo "(I) Target density ($target_util) will be ignored, since you use Capo placer."
+    fi
+
+    cmd="python3 ../utils/tool_runner.py --placers ${placer} --bench ${bench}"
+    cmd="$cmd --bookshelf_dir ${bookshelf_dir} --target_density ${target_util}"
+    cmd="$cmd --out_dir ${out_dir} --log ${log}"
     echo $cmd
-    eval $cmd | tee ${log}
-	rm -f ${bench}.aux ${bench}.nodes ${bench}.nets ${bench}.wts ${bench}.scl ${bench}.pl ${bench}.shapes
-
-    # Detailed placement with FastPlace3.0
-    cmd="${bin_dir}/FastPlace3.0_Linux64_DP -legalize -noFlipping -target_density ${target_util}"
-    cmd="$cmd -target_density ${target_util}"
-    cmd="$cmd . ${bench}-mPL.pl"
-    echo $cmd
-    eval $cmd | tee --append ${log}
-
-    mv *mPL.pl $out_dir
-    mv ${bench}_FP_dp.pl ${out_dir}/
+    eval $cmd
 
-    out_pl=${bench}_FP_dp.pl
+    out_pl=${bench}_solution.pl
 fi
 
 END=$(date +%s)
@@ -174,9 +85,22 @@ cmd="$cmd --nodes ${bookshelf_dir}/${bench}.nodes --scl ${bookshelf_dir}/${bench
 cmd="$cmd --pl ${out_dir}/${out_pl} --out out"
 echo $cmd
 eval $cmd
-gnuplot out.plt
-mv out.plt ${out_dir}/${out_dir}_plot.plt
 mv out.png ${out_dir}/${out_dir}_plot.png
 
-# Copy the placement solution
-cp ${out_dir}/${out_pl} ${out_dir}/${bench}_solution.pl
+# Bin density report and heatmap
+cmd="python3 ../utils/300_placement_density.py"
+cmd="$cmd --nodes ${bookshelf_dir}/${bench}.nodes --scl ${bookshelf_dir}/${bench}.scl"
+cmd="$cmd --pl ${out_dir}/${out_pl} --target ${target_util}"
+cmd="$cmd --out ${out_dir}/${out_dir}_density"
+echo $cmd
+eval $cmd | tee ${out_dir}/${out_dir}_density.txt
+
+# Wirelength of the placement solution
+cmd="python3 ../utils/hpwl.py --aux ${aux_file} --pl ${out_dir}/${bench}_solution.pl --rsmt"
+echo $cmd
+eval $cmd | tee ${out_dir}/${out_dir}_hpwl.txt
+
+# Legality of the placement solution
+cmd="python3 ../utils/check_legality.py --aux ${aux_file} --pl ${out_dir}/${bench}_solution.pl"
+echo $cmd
+eval $cmd | tee ${out_dir}/${out_dir}_legality.txt
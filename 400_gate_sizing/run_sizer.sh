@@ -32,14 +32,14 @@ START=$(date +%s)
 #------------------------------------------------------------------------------
 # UFRGS Sizer
 #------------------------------------------------------------------------------
+# Run by tool_runner in a scratch directory of its own (see get_sizer_job);
+# usizer.config and usizer_usizer.v are moved back here.
 if test "$sizer" = "USizer"; then
-    # write config file
-    config_file=usizer.config
-    echo "$verilog $sdc $spef $lib" > $config_file
-
-    cmd="../bin/usizer2013 -config ${config_file} open-eda"
+    cmd="python3 ../utils/tool_runner.py --sizer USizer --verilog $verilog"
+    cmd="$cmd --sdc $sdc --spef $spef --lib $lib"
+    cmd="$cmd --out_prefix usizer_usizer --out_dir . --log ${log}"
     echo $cmd
-    eval $cmd | tee ${log}
+    eval $cmd
 fi
 
 
@@ -24,31 +24,11 @@ router=$2
 out_name=$3
 log=${out_name}.log
 
-bin_dir="../bin"
-
-#------------------------------------------------------------------------------
-# NCTUgr
-#------------------------------------------------------------------------------
-if test "$router" = "NCTUgr"; then
-    cmd="$bin_dir/NCTUgr REGULAR_ISPD $input_gr ${bin_dir}/NCTU-GR/Parameter_Files/RegularDefault.set $out_name"
-    echo $cmd
-    eval $cmd | tee $log
-
 #------------------------------------------------------------------------------
-# FastRoute
+# NCTUgr, FastRoute, BFG-R: run by tool_runner in a scratch directory of
+# their own (see get_router_job); the outputs are moved back here.
 #------------------------------------------------------------------------------
-elif test "$router" = "FastRoute"; then
-    # It seems not to work when the binary is not in the current location
-    cmd="./FastRoute $input_gr -o $out_name"
-    echo $cmd
-    eval $cmd | tee $log
-
-#------------------------------------------------------------------------------
-# BFG-R
-#------------------------------------------------------------------------------
-elif test "$router" = "BFG-R"; then
-    # It seems not to work when the binary is not in the current location
-    cmd="$bin_dir/FGR $input_gr -o $out_name"
-    echo $cmd
-    eval $cmd | tee $log
-fi
+cmd="python3 ../utils/tool_runner.py --routers $router --gr $input_gr"
+cmd="$cmd --out_prefix $out_name --out_dir . --log $log"
+echo $cmd
+eval $cmd
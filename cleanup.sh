@@ -10,3 +10,4 @@ find 430_write_def       -mindepth 1 ! \( -name "run_*" -o -name 'Makefile' -o -
 find 440_timing          -mindepth 1 ! \( -name "run_*" -o -name 'Makefile' -o -name '.gitignore' \) -exec rm -rf {} +
 find 500_gr_bench_gen    -mindepth 1 ! \( -name "run_*" -o -name 'Makefile' -o -name '.gitignore' \) -exec rm -rf {} +
 find 510_global_route    -mindepth 1 ! \( -name "run_*" -o -name 'Makefile' -o -name '.gitignore' \) -exec rm -rf {} +
+rm -rf sweep
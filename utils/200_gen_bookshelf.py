@@ -8,15 +8,24 @@ from __future__ import print_function, division
 from time import gmtime, strftime
 from copy import deepcopy
 from math import ceil
-import sys
+import sys, os, array
+from itertools import islice
+
+import numpy as np
 
 import verilog_parser
 import def_parser
 import lef_parser
+import symbol_table
+import external_sort
+import tech_units
+import compressed_io
 
 M1_LAYER_NAME = 'metal1'
 M2_LAYER_NAME = 'metal2'
 
+WRITE_CHUNK = 1 << 16    # Pin and node lines formatted at a time
+
 
 def parse_cl():
     """ parse and check command line options
@@ -51,7 +60,19 @@ def parse_cl():
                         help="Utilization (in 0.1, 0.99).")
 
     parser.add_argument('-o', action="store", dest='dest_name',
-                        help="Base name of output files")
+                        help="Base name of output files; with a .gz, .bz2 "
+                             "or .zst extension, the files are compressed")
+
+    parser.add_argument('-j', action="store", type=int, dest='num_workers',
+                        default=1, help="Number of verilog parsing processes")
+    parser.add_argument('--mem_budget', action="store", type=int, 
+                        dest='mem_budget', default=None,
+                        help="Memory budget (MB) for sorting the pins of the "
+                             "nets on disk. Gates are then kept as compact "
+                             "arrays (about 20 bytes plus the name length "
+                             "each) and net names in memory, so memory still "
+                             "grows with the design, and with the DEF if "
+                             "one is given.")
 
     opt = parser.parse_args()
 
@@ -86,13 +107,29 @@ def parse_cl():
 
 
 
-def write_bookshelf_nodes(dest, the_verilog, the_lef, the_def, fix_big_blocks):
+def get_gate_arrays(the_verilog):
+    """ Return (gate type ids, gate type names, get_names) of the gates of
+    the_verilog; get_names(begin, end) returns the names of gates begin to
+    end. Gates kept in compact form are not built into Instances.
+    """
+    gates = the_verilog.gates
+    if gates is not None:
+        return gates.type_ids, gates.type_table.names, gates.get_names
+
+    instances = [g for g in the_verilog.instances if g.gate_type not in ('PI', 'PO')]
+    types = symbol_table.SymbolTable()
+    type_ids = types.add_all(g.gate_type for g in instances)
+    return type_ids, types.names, lambda b, e: [g.name for g in instances[b:e]]
 
-    gates = [g for g in the_verilog.instances if g.gate_type not in ('PI', 'PO')]
+
+def write_bookshelf_nodes(dest, the_verilog, units, the_def, fix_big_blocks):
+
+    type_ids, types, get_names = get_gate_arrays(the_verilog)
+    num_gates = len(type_ids)
     inputs = the_verilog.inputs
     outputs = the_verilog.outputs
 
-    f_nodes = open(dest + '.nodes', 'w')
+    f_nodes = compressed_io.open_file(compressed_io.add_suffix(dest, '.nodes'), 'w')
 
     f_nodes.write('UCLA nodes 1.0\n', )
     f_nodes.write('# File header with version information, etc.\n')
@@ -103,7 +140,7 @@ def write_bookshelf_nodes(dest, the_verilog, the_lef, the_def, fix_big_blocks):
     num_outputs   = len(outputs)
     num_big_blocks = len(the_def.big_blocks)
 
-    f_nodes.write("NumNodes\t:\t%d\n" % (len(gates) + num_inputs + num_outputs + num_big_blocks))
+    f_nodes.write("NumNodes\t:\t%d\n" % (num_gates + num_inputs + num_outputs + num_big_blocks))
 
     if fix_big_blocks:
         num_terminals = num_inputs + num_outputs + num_big_blocks
@@ -112,61 +149,50 @@ def write_bookshelf_nodes(dest, the_verilog, the_lef, the_def, fix_big_blocks):
 
     f_nodes.write("NumTerminals\t:\t%d\n\n" % (num_terminals))
 
-    # Establish macro dictionary
-    lef_macros = the_lef.macros
-    big_blocks = {g.name : g for g in lef_macros if g.macro_class.startswith('BLOCK')}
-    big_block_set = set(big_blocks.keys())
-    std_cells = {g.name : g for g in lef_macros if g.macro_class == 'CORE'}
-    std_cells_set = set(std_cells.keys())
-    assert len(big_blocks) + len(std_cells) == len(lef_macros)
+    # Macro classes
+    is_std_cell = np.array([c == 'CORE' for c in units.macro_class], dtype=bool)
+    is_big_block = np.array([c.startswith('BLOCK') for c in units.macro_class],
+                            dtype=bool)
+    assert np.count_nonzero(is_std_cell) + np.count_nonzero(is_big_block) \
+           == len(units.macros)
 
     # movable node
     total_area_in_bs = 0
 
     # Standard cells
-    width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-    height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-    min_height = 987654321
-
-    for g in the_verilog.instances:
-        # Find width and height from LEF
-        if g.gate_type in ('PI', 'PO'):
-            continue
-
-        if g.gate_type in std_cells_set:
-            lef_macro = std_cells[g.gate_type]
-
-            width_in_bs = ceil(lef_macro.width / width_divider)
-            height_in_bs = ceil(lef_macro.height / height_divider)
-            # total_width_in_bs += width_in_bs
-            total_area_in_bs += width_in_bs * height_in_bs
-
-            f_nodes.write("%-40s %15d %15d\n" % \
-                          (g.name, int(width_in_bs), int(height_in_bs)))
+    type_macro = units.get_macro_ids(types)
+    valid = type_macro >= 0
+    valid[valid] = is_std_cell[type_macro[valid]]
+    if not valid[type_ids].all():
+        i = int(np.argmin(valid[type_ids]))
+        sys.stderr.write("Cannot find macro definition for %s %s. \n"
+                         % (types[type_ids[i]], get_names(i, i + 1)[0]))
+        raise SystemExit(-1)
 
-            min_height = height_in_bs if min_height > height_in_bs else min_height
+    ids = type_macro[type_ids]
+    width_in_bs = units.macro_width[ids]
+    height_in_bs = units.macro_height[ids]
+    total_area_in_bs += int((width_in_bs * height_in_bs).sum())
+    min_height = int(height_in_bs.min()) if num_gates > 0 else 987654321
 
-        else:
-            sys.stderr.write("Cannot find macro definition for %s. \n" % (g))
-            raise SystemExit(-1)
+    for b in range(0, num_gates, WRITE_CHUNK):
+        e = min(b + WRITE_CHUNK, num_gates)
+        f_nodes.writelines("%-40s %15d %15d\n" % t
+                           for t in zip(get_names(b, e), width_in_bs[b:e].tolist(),
+                                        height_in_bs[b:e].tolist()))
 
     # Big block placement
     for g in the_def.big_blocks:
-        try:
-            lef_macro = big_blocks[g.gate_type]
-        except KeyError:
+        i = units.get_macro_id(g.gate_type)
+        if i < 0 or not is_big_block[i]:
             sys.stderr.write("Lef doesn't have big block definition (%s)" 
                              % (g.gate_type))
             raise SystemExit(-1)
 
-        width_in_bs = ceil(lef_macro.width / width_divider)
-        height_in_bs = ceil(lef_macro.height / height_divider)
-        # total_width_in_bs += width_in_bs
-        total_area_in_bs += width_in_bs * height_in_bs
+        width, height = int(units.macro_width[i]), int(units.macro_height[i])
+        total_area_in_bs += width * height
 
-        f_nodes.write("%-40s %15d %15d " % \
-                      (g.name, int(width_in_bs), int(height_in_bs)))
+        f_nodes.write("%-40s %15d %15d " % (g.name, width, height))
 
         if fix_big_blocks:
             f_nodes.write("%15s\n" % ('terminal'))
@@ -183,7 +209,38 @@ def write_bookshelf_nodes(dest, the_verilog, the_lef, the_def, fix_big_blocks):
     return total_area_in_bs
 
 
-def write_bookshelf_nets(dest, the_verilog, the_lef, the_def):
+def get_lef_pin_lookup(units):
+    """ Return a function (gate type, pin) -> (direction, x_offset, y_offset),
+    with offsets from the node center in Bookshelf units.
+    """
+    pins = units.pins
+
+    def get_lef_pin(gate_type, pin):
+        try:
+            return pins[(gate_type, pin)]
+        except KeyError:
+            i = units.get_macro_id(gate_type)
+            sys.stderr.write('Error: Verilog and LEF do not match:' \
+                             '(v, lef) = (%s %s, %s)\n' \
+                             % (gate_type, pin, units.macros[i] if i >= 0 else None))
+            raise SystemExit(-1)
+
+    return get_lef_pin
+
+
+def write_nets_header(f_nets, num_nets, num_pins):
+    f_nets.write('UCLA nets 1.0\n')
+    f_nets.write('# File header with version information, etc.\n')
+    f_nets.write('# Anything following "#" is a comment, and should be ignored\n\n')
+    f_nets.write("NumNets\t:\t%d\n" % (num_nets))
+    f_nets.write("NumPins\t:\t%d\n" % (num_pins))
+
+
+def write_bookshelf_nets(dest, the_verilog, units, the_def, clock_port):
+    # Gates read in parallel are built with the ports as read, so before
+    # the clock port is removed.
+    gates = [g for g in the_verilog.instances if g.gate_type not in ('PI', 'PO')]
+
     # Exclude clock port
     try:
         the_verilog.inputs.remove(clock_port)
@@ -191,44 +248,25 @@ def write_bookshelf_nets(dest, the_verilog, the_lef, the_def):
         sys.stderr.write("Warning: the clock port %s does not exist, "
                          "or it is already removed.\n" % clock_port)
 
-    # Generate bookshelf nets
-    f_nets = open(dest + '.nets', 'w')
-
-    f_nets.write('UCLA nets 1.0\n')
-    f_nets.write('# File header with version information, etc.\n')
-    f_nets.write('# Anything following "#" is a comment, and should be ignored\n\n')
-
     # NumNets = #inputs + #outputs + #wires - 1 (for clock net)
-    gates = [g for g in the_verilog.instances if g.gate_type not in ('PI', 'PO')]
     inputs = the_verilog.inputs
     outputs = the_verilog.outputs
     wires = the_verilog.wires
 
-    nets = inputs + outputs + wires
-    f_nets.write("NumNets\t:\t%d\n" % (len(nets)))
-
-    # net dictionary - key: name, val: list( [name, I|O, x_offset, y_offset] )
-    net_dict = {n : [[n, 'I', 0.0, 0.0]] for n in inputs}
-    net_dict.update( {n : [[n, 'O', 0.0, 0.0]] for n in outputs} )
-    net_dict.update( {n : list() for n in wires} )
-
-    num_pins = len(inputs + outputs)
+    nets = symbol_table.SymbolTable(inputs + outputs + wires)
+    directions = symbol_table.SymbolTable(('I', 'O'))
+    get_lef_pin = get_lef_pin_lookup(units)
 
-    # For fast lookup
-    lef_gate_dict = {lg.name: lg for lg in the_lef.macros}
-
-
-    width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-    height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-    for g in gates:
-        # lef_gate = [lg for lg in lef_macros if lg.name == g.gate_type][0]
-        lef_gate = lef_gate_dict[g.gate_type]
-        node_name = g.name
-        # Node center
-        node_x = (lef_gate.width / width_divider) * 0.5
-        node_y = (lef_gate.height / height_divider) * 0.5
+    # Pins as parallel arrays; nodes are the ports, then the gates
+    node_names = inputs + outputs + [g.name for g in gates]
+    pin_net = array.array('q', nets.get_ids(inputs + outputs))
+    pin_node = array.array('q', range(len(inputs + outputs)))
+    pin_dir = array.array('b', [0] * len(inputs) + [1] * len(outputs))
+    pin_dx = array.array('d', [0.0] * len(pin_net))
+    pin_dy = array.array('d', [0.0] * len(pin_net))
 
+    net_index = nets.index
+    for node, g in enumerate(gates, len(inputs + outputs)):
         # If you are using Python 3.5:
         # pin_dict = {**g.input_pin_dict, **g.output_pin_dict}
         # Else, please you the following code
@@ -237,36 +275,129 @@ def write_bookshelf_nets(dest, the_verilog, the_lef, the_def):
 
         for k, v in pin_dict.items():
             if v == clock_port: continue
-            num_pins += 1
-            try:
-                lef_pin = [p for p in lef_gate.pin_list if p.name == k][0]
-            except IndexError:
-                sys.stderr.write('Error: Verilog and LEF do not match:' \
-                                 '(v, lef) = (%s, %s)\n' % (g, lef_gate))
+            direction, x_offset, y_offset = get_lef_pin(g.gate_type, k)
+
+            pin_net.append(net_index[v])
+            pin_node.append(node)
+            pin_dir.append(directions.add(direction))
+            pin_dx.append(x_offset)
+            pin_dy.append(y_offset)
+
+    pin_net = np.frombuffer(pin_net, dtype=np.int64)
+    pin_node = np.frombuffer(pin_node, dtype=np.int64)
+    pin_dir = np.frombuffer(pin_dir, dtype=np.int8)
+    pin_dx = np.frombuffer(pin_dx, dtype=np.float64)
+    pin_dy = np.frombuffer(pin_dy, dtype=np.float64)
+
+    # Nets in name order, each a segment of the pins sorted by net rank
+    net_rank = nets.get_sort_rank()
+    pin_rank = net_rank[pin_net]
+    order = np.argsort(pin_rank, kind='stable')
+    degree = np.bincount(pin_rank, minlength=len(nets))
+
+    def iter_pin_lines():
+        for b in range(0, len(order), WRITE_CHUNK):
+            k = order[b:b + WRITE_CHUNK]
+            for n, d, x, y in zip(pin_node[k].tolist(), pin_dir[k].tolist(),
+                                  pin_dx[k].tolist(), pin_dy[k].tolist()):
+                yield "        %s  %s : %11.4f %11.4f\n" \
+                      % (node_names[n], directions.names[d], x, y)
+
+    with compressed_io.open_file(compressed_io.add_suffix(dest, '.nets'), 'w') as f_nets:
+        write_nets_header(f_nets, len(inputs + outputs + wires), len(order))
+
+        pin_lines = iter_pin_lines()
+        for i in np.argsort(net_rank).tolist():
+            f_nets.write("NetDegree : %d  %s\n" % (degree[net_rank[i]], nets.names[i]))
+            f_nets.writelines(islice(pin_lines, int(degree[net_rank[i]])))
+
+
+def write_bookshelf_nets_external(dest, src_v, the_verilog, units, 
+                                  clock_port, mem_budget):
+    """ Write the same .nets as write_bookshelf_nets within a memory budget
+    (in bytes), without the pins of the_verilog.
+
+    Gates are streamed from src_v, and each pin becomes a record keyed by
+    the rank of its net name and its order of appearance. The records are
+    sorted externally, so only the net table of the_verilog and one sort
+    buffer are kept in memory.
+    """
+    inputs = the_verilog.inputs
+    outputs = the_verilog.outputs
+    wires = the_verilog.wires
+
+    # The net table of the_verilog starts with inputs, outputs and wires.
+    # A removed clock port keeps its id, but gets no NetDegree line.
+    nets = the_verilog.net_table
+    num_nets = len(inputs) + len(outputs) + len(wires)
+    clock_id = -1
+    try:
+        the_verilog.inputs.remove(clock_port)
+        clock_id = nets.get_id(clock_port)
+    except ValueError:
+        sys.stderr.write("Warning: the clock port %s does not exist, "
+                         "or it is already removed.\n" % clock_port)
+    net_rank = nets.get_sort_rank()
+
+    get_lef_pin = get_lef_pin_lookup(units)
+
+    # Record: net rank (10 digits), sequence number (12 digits), pin line
+    with external_sort.ExternalSorter(mem_budget, os.path.dirname(dest) or None) \
+         as sorter:
+        def add_pin(net, node_name, direction, x_offset, y_offset):
+            i = nets.get_id(net)
+            if i < 0 or i >= num_nets:
+                sys.stderr.write("Error: undeclared net %s (%s).\n" % (net, node_name))
                 raise SystemExit(-1)
+            sorter.add("%010d%012d        %s  %s : %11.4f %11.4f\n" \
+                       % (net_rank[i], sorter.count, node_name, direction,
+                          x_offset, y_offset))
+
+        for n in inputs:
+            add_pin(n, n, 'I', 0.0, 0.0)
+        for n in outputs:
+            add_pin(n, n, 'O', 0.0, 0.0)
+
+        for gate_type, node_name, pins in verilog_parser.iter_gates(src_v):
+            # Inputs first, as in the pin dicts of the verilog parser
+            input_pins, output_pins = dict(), dict()
+            for pin, net in pins:
+                if pin.startswith('o'):
+                    output_pins[pin] = net
+                else:
+                    input_pins[pin] = net
+            pin_dict = dict(list(input_pins.items()) + list(output_pins.items()))
 
-            lef_pin_x = lef_pin.x / width_divider 
-            lef_pin_y = lef_pin.y / height_divider 
+            for k, v in pin_dict.items():
+                if v == clock_port: continue
+                add_pin(v, node_name, *get_lef_pin(gate_type, k))
 
-            direction = lef_pin.direction
-            x_offset = lef_pin_x - node_x
-            y_offset = lef_pin_y - node_y
+        if sorter.num_runs > 0:
+            print ("Sorted %d pins in %d runs." % (sorter.count, sorter.num_runs))
 
-            net_dict[v].append([node_name, direction, x_offset, y_offset])
-        
-    f_nets.write("NumPins\t:\t%d\n" % (num_pins))
+        # Merge the runs by net
+        with compressed_io.open_file(compressed_io.add_suffix(dest, '.nets'), 'w') \
+             as f_nets:
+            write_nets_header(f_nets, len(inputs) + len(outputs) + len(wires),
+                              sorter.count)
+
+            records = iter(sorter)
+            record = next(records, None)
+            for rank, i in enumerate(np.argsort(net_rank).tolist()):
+                if i >= num_nets or i == clock_id:
+                    continue    # no pins
 
-    for net, pins in sorted(net_dict.items()):
-        f_nets.write("NetDegree : %d  %s\n" % (len(pins), net))
-        for p in pins:
-            f_nets.write("        %s  %s : %11.4f %11.4f\n" % (p[0], p[1][0], p[2], p[3]))
-        f_nets.write("")
-                    
-    f_nets.close()
+                pins = list()
+                while record is not None and int(record[:10]) == rank:
+                    pins.append(record[22:])
+                    record = next(records, None)
+
+                f_nets.write("NetDegree : %d  %s\n" % (len(pins), nets.names[i]))
+                f_nets.writelines(pins)
 
 
 def write_bookshelf_wts(dest, the_verilog, the_lef, the_def):
-    f_wts = open(dest + '.wts', 'w')
+    f_wts = compressed_io.open_file(compressed_io.add_suffix(dest, '.wts'), 'w')
     f_wts.write('UCLA wts 1.0\n')
     f_wts.write('# File header with version information, etc.\n')
     f_wts.write('# Anything following "#" is a comment, and should be ignored\n\n')
@@ -281,42 +412,26 @@ def write_bookshelf_wts(dest, the_verilog, the_lef, the_def):
     f_wts.close()
 
 
-def write_bookshelf_scl(dest, the_lef, the_def):
+def write_bookshelf_scl(dest, units, the_def):
     """ 
     Write a scl file with pre-defined row list 
     """
-  
-    try:
-        assert the_lef.m1_layer_name is not None
-        assert the_lef.m2_layer_name is not None
-    except AssertionError:
-        sys.std.err.write("Error: Please set m1/m2 layer names properly.\n")
-        raise SystemExit(-1)
-
-    with open(dest + '.scl', 'w') as f:
-        f = open(dest + '.scl', 'w')
+    with compressed_io.open_file(compressed_io.add_suffix(dest, '.scl'), 'w') as f:
         f.write("UCLA scl 1.0\n\n")
         f.write("NumRows : %d\n\n" % (len(the_def.rows)))
 
         for row in the_def.rows:
-            f.write(row.get_bookshelf_row_string(the_lef))
+            f.write(row.get_bookshelf_row_string(units))
 
     return
 
 
-def create_bookshelf_scl(dest, the_lef, total_area_in_bs, util):
+def create_bookshelf_scl(dest, units, total_area_in_bs, util):
     """
     Create bookshelf scl file with a given utilization
     """
-    try:
-        width_divider  = the_lef.metal_layer_dict[M2_LAYER_NAME]
-        height_divider = the_lef.metal_layer_dict[M1_LAYER_NAME]
-    except KeyError:
-        sys.stderr.write("Error: Lef file is not read properly.\n")
-        raise SystemExit(-1)
-
-    site_width_in_bs = int(ceil(the_lef.site_width / width_divider))
-    site_height_in_bs = int(ceil(the_lef.site_height / height_divider))
+    site_width_in_bs = int(ceil(units.site_width))
+    site_height_in_bs = int(ceil(units.site_height))
     site_spacing = site_width_in_bs
 
     # placement_area = total_width_in_bs * site_height_in_bs / util
@@ -329,7 +444,7 @@ def create_bookshelf_scl(dest, the_lef, total_area_in_bs, util):
     site_symmetry = 'Y'
     subrow_origin = 0
 
-    f_scl = open(dest + '.scl', 'w')
+    f_scl = compressed_io.open_file(compressed_io.add_suffix(dest, '.scl'), 'w')
     f_scl.write("UCLA scl 1.0\n\n")
     f_scl.write("NumRows : %d\n\n" % (num_row))
 
@@ -350,24 +465,19 @@ def create_bookshelf_scl(dest, the_lef, total_area_in_bs, util):
     return x_length, y_length  
 
 
-def write_bookshelf_pl(dest, the_lef, the_def, fix_big_blocks):
+def write_bookshelf_pl(dest, units, the_def, fix_big_blocks):
 
-    f_pl = open(dest+ '.pl', 'w')
+    f_pl = compressed_io.open_file(compressed_io.add_suffix(dest, '.pl'), 'w')
     f_pl.write('UCLA pl 1.0\n\n')
 
-    # nodes file - skip the first line
-    lines = [x.rstrip() for x in open(dest+ '.nodes', 'r') 
-             if not x.startswith('#')][1:]
-    lines_iter = iter(lines)
+    # nodes file - skip the first line; streamed, as it has a line per node
+    f_nodes = compressed_io.open_file(compressed_io.add_suffix(dest, '.nodes'))
+    lines = islice((x.rstrip() for x in f_nodes if not x.startswith('#')), 1, None)
 
     num_nodes, num_terminals = 0, 0
     terminal_list = list()
 
-    width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-    height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-    x_divisor = width_divider * the_lef.units_distance_microns
-    y_divisor = height_divider * the_lef.units_distance_microns
+    x_divisor, y_divisor = units.x_dbu, units.y_dbu
 
     for line in lines:
         tokens = line.split()
@@ -420,6 +530,8 @@ def write_bookshelf_pl(dest, the_lef, the_def, fix_big_blocks):
                 f_pl.write("%s\t%d\t%d\t: N\n" % (node_name, 0, 0))
 
 
+    f_nodes.close()
+
     try: 
         assert len(terminal_list) == num_terminals
     except AssertionError:
@@ -437,24 +549,19 @@ def write_bookshelf_pl(dest, the_lef, the_def, fix_big_blocks):
 
 
 
-def create_bookshelf_pl(dest, the_lef, pl_width, pl_height, fix_big_blocks):
+def create_bookshelf_pl(dest, units, pl_width, pl_height, fix_big_blocks):
 
-    f_pl = open(dest+ '.pl', 'w')
+    f_pl = compressed_io.open_file(compressed_io.add_suffix(dest, '.pl'), 'w')
     f_pl.write('UCLA pl 1.0\n\n')
 
-    # nodes file - skip the first line
-    lines = [x.rstrip() for x in open(dest+ '.nodes', 'r') 
-             if not x.startswith('#')][1:]
-    lines_iter = iter(lines)
+    # nodes file - skip the first line; streamed, as it has a line per node
+    f_nodes = compressed_io.open_file(compressed_io.add_suffix(dest, '.nodes'))
+    lines = islice((x.rstrip() for x in f_nodes if not x.startswith('#')), 1, None)
 
     num_nodes, num_terminals = 0, 0
     terminal_list = list()
 
-    width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-    height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-    x_divisor = width_divider * the_lef.units_distance_microns
-    y_divisor = height_divider * the_lef.units_distance_microns
+    x_divisor, y_divisor = units.x_dbu, units.y_dbu
 
     for line in lines:
         tokens = line.split()
@@ -484,6 +591,8 @@ def create_bookshelf_pl(dest, the_lef, pl_width, pl_height, fix_big_blocks):
                 f_pl.write("%s\t%d\t%d\t: N\n" % (node_name, 0, 0))
 
 
+    f_nodes.close()
+
     try: 
         assert len(terminal_list) == num_terminals
     except AssertionError:
@@ -516,11 +625,11 @@ def create_bookshelf_pl(dest, the_lef, pl_width, pl_height, fix_big_blocks):
     f_pl.close()
 
 
-def write_bookshelf_shapes(dest, the_verilog, the_lef, the_def):
+def write_bookshelf_shapes(dest, the_verilog, units, the_def):
 
-    with open(dest + '.shapes', 'w') as f:
+    with compressed_io.open_file(compressed_io.add_suffix(dest, '.shapes'), 'w') as f:
         f.write('shapes 1.0\n\n')
-        rectilinear_macros = {m.name : m for m in the_lef.macros
+        rectilinear_macros = {m.name : m for m in units.macros
                               if m.__class__ == lef_parser.LefRectilinearMacro}
 
         rectilinear_nodes = dict()
@@ -547,11 +656,7 @@ def write_bookshelf_shapes(dest, the_verilog, the_lef, the_def):
         f.write('NumNonRectangularNodes : %d\n\n' % (len(rectilinear_nodes)))
 
         ##
-        width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-        height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-        x_divisor = width_divider * the_lef.units_distance_microns
-        y_divisor = height_divider * the_lef.units_distance_microns
+        x_divisor, y_divisor = units.x_dbu, units.y_dbu
 
         for k, v in rectilinear_nodes.items():
             # node = [gate_type, is_fixed, (x,y), macro]
@@ -574,7 +679,7 @@ def write_bookshelf_shapes(dest, the_verilog, the_lef, the_def):
 
                 # in DEF unit
                 llx, lly, urx, ury = \
-                    [i*the_lef.units_distance_microns for i in obs]
+                    [i*units.dbu_per_micron for i in obs]
 
                 x = int(round(llx / x_divisor)) + x_pl
                 y = int(round(lly / y_divisor)) + y_pl
@@ -586,11 +691,16 @@ def write_bookshelf_shapes(dest, the_verilog, the_lef, the_def):
 
 
 def gen_bookshelf(src_v, src_lef, src_def, fix_big_blocks, 
-                  clock_port, remove_clock_port, utilization, dest):
+                  clock_port, remove_clock_port, utilization, dest,
+                  num_workers=1, mem_budget=None):
     # Parse verilog and lef
     print ("Parsing verilog: %s" % (src_v))
     the_verilog = verilog_parser.Module()
-    the_verilog.read_verilog(src_v)
+    # With a memory budget, pins are not kept; the nets are written from
+    # a second pass over the verilog.
+    the_verilog.read_verilog(src_v, num_workers, mem_budget is None)
+    if mem_budget is None:
+        the_verilog.instances   # Build the gates before removing the clock port
     the_verilog.clock_port = clock_port
     the_verilog.print_stats()
 
@@ -609,56 +719,80 @@ def gen_bookshelf(src_v, src_lef, src_def, fix_big_blocks,
     the_lef.read_lef(src_lef)
     the_lef.print_stats()
 
-    the_def = def_parser.Def()
+    the_def = None
     if src_def is not None:
         print ("Parsing DEF.")
+        the_def = def_parser.Def()
         the_def.read_def(src_def)
         the_def.print_stats()
 
+    write_bookshelf(dest, the_verilog, the_lef, the_def, fix_big_blocks,
+                    clock_port, utilization, src_v, mem_budget)
+
+
+def write_bookshelf(dest, the_verilog, the_lef, the_def, fix_big_blocks,
+                    clock_port, utilization=0.7, src_v=None, mem_budget=None):
+    """ Write the Bookshelf files of a parsed design. the_def is None if
+    there is no DEF; then rows are created for the utilization. The clock
+    port is removed from the_verilog.inputs. src_v is only read with a
+    memory budget.
+    """
+    has_def = the_def is not None
+    if not has_def:
+        the_def = def_parser.Def()
+
+    units = tech_units.TechUnits(the_lef)
+
     #---------------------------------------
     # Hyper graph
     #---------------------------------------
     # Generate bookshelf nodes
     print ("Writing nodes.")
-    total_area_in_bs = write_bookshelf_nodes(dest, the_verilog, the_lef, 
+    total_area_in_bs = write_bookshelf_nodes(dest, the_verilog, units, 
                                                                 the_def, 
                                                                 fix_big_blocks)
     
     # Bookshelf nets file - doesn't include the clock net
     print ("Writing nets.")
-    write_bookshelf_nets(dest, the_verilog, the_lef, the_def)
+    if mem_budget is None:
+        write_bookshelf_nets(dest, the_verilog, units, the_def, clock_port)
+    else:
+        write_bookshelf_nets_external(dest, src_v, the_verilog, units,
+                                      clock_port, mem_budget << 20)
 
     # Generate bookshelf wts
     print ("Writing wts.")
     write_bookshelf_wts(dest, the_verilog, the_lef, the_def)
 
     # Placement informatoin
-    if src_def is not None:
+    if has_def:
         print ("Writing scl.")
-        write_bookshelf_scl(dest, the_lef, the_def)
+        write_bookshelf_scl(dest, units, the_def)
 
         print ("Writing pl.")
-        write_bookshelf_pl(dest, the_lef, the_def, fix_big_blocks)
+        write_bookshelf_pl(dest, units, the_def, fix_big_blocks)
 
     else:
         # Bookshelf scl file
         print ("Writing scl.")
-        pl_width, pl_height = create_bookshelf_scl(dest, the_lef, total_area_in_bs, utilization)
+        pl_width, pl_height = create_bookshelf_scl(dest, units, total_area_in_bs, utilization)
 
         # Bookshelf pl file
         print ("Writing pl.")
-        create_bookshelf_pl(dest, the_lef, pl_width, pl_height, fix_big_blocks)
+        create_bookshelf_pl(dest, units, pl_width, pl_height, fix_big_blocks)
 
-    if src_def is not None:
+    if has_def:
         print ("Writing shapes.")
-        write_bookshelf_shapes(dest, the_verilog, the_lef, the_def)
+        write_bookshelf_shapes(dest, the_verilog, units, the_def)
 
     print ("Writing aux.")
     # bookshelf aux
-    f_aux = open(dest + '.aux', 'w')
+    f_aux = compressed_io.open_file(compressed_io.add_suffix(dest, '.aux'), 'w')
+    # Readers find the compressed files from the plain names.
+    name = os.path.basename(compressed_io.strip_extension(dest))
     f_aux.write("RowBasedPlacement : " \
                 "%s.nodes %s.nets %s.wts %s.pl %s.scl %s.shapes" \
-                % (dest, dest, dest, dest, dest, dest))
+                % (name, name, name, name, name, name))
     f_aux.close()
     print ("Done.\n")
 
@@ -702,6 +836,7 @@ if __name__ == '__main__':
     print ("")
 
     gen_bookshelf(src_v, src_lef, src_def, fix_big_blocks, 
-                  clock_port, remove_clock_port, utilization, dest)
+                  clock_port, remove_clock_port, utilization, dest,
+                  cl_opt.num_workers, cl_opt.mem_budget)
 
 
@@ -0,0 +1,126 @@
+# File: 300_placement_density.py
+# Description: Report bin density of a Bookshelf placement (peak density and
+#              overflow ratio as used by ComPLx and NTUPlace3), and draw a
+#              density heatmap. Cell areas are split over the bins they
+#              overlap with raster.rasterize_rects, in linear time.
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import bookshelf
+import raster
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Report the bin density of a placement.')
+    parser.add_argument('--nodes', action="store", dest='src_nodes', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl', required=True)
+    parser.add_argument('--scl', action="store", dest='src_scl', required=True)
+    parser.add_argument('--target', action="store", type=float,
+                        dest='target_density', default=1.0,
+                        help="Target density (default: 1.0)")
+    parser.add_argument('--grid', action="store", type=int, nargs=2,
+                        dest='grid', metavar=('NX', 'NY'), default=None,
+                        help="Number of bins (default: about sqrt(#cells) "
+                             "square bins per side)")
+    parser.add_argument('--out', action="store", dest='out', default=None,
+                        help="Write a heatmap to <out>.png")
+
+    return parser.parse_args()
+
+
+def get_grid(region, num_cells):
+    """ About sqrt(num_cells) square bins per side, as in NTUPlace3. """
+    width, height = region[2] - region[0], region[3] - region[1]
+    num_bins = max(num_cells, 1)
+    bin_size = np.sqrt(width * height / num_bins)
+    return max(int(round(width / bin_size)), 1), \
+           max(int(round(height / bin_size)), 1)
+
+
+def get_bin_density(bs, region, nx, ny):
+    """ Return (movable area, free area) per bin, indexed [x, y].
+
+    Fixed terminals block their area; terminal_NI nodes do not.
+    """
+    bin_area = (region[2] - region[0]) * (region[3] - region[1]) / (nx * ny)
+
+    movable = (bs.node_type == bookshelf.MOVABLE) & ~bs.node_fixed
+    blockage = (bs.node_type != bookshelf.TERMINAL_NI) & ~movable
+
+    def area(mask):
+        llx, lly = bs.node_x[mask], bs.node_y[mask]
+        urx, ury = llx + bs.node_width[mask], lly + bs.node_height[mask]
+        return raster.rasterize_rects(llx, lly, urx, ury, region, nx, ny) \
+               * bin_area
+
+    movable_area = area(movable)
+    free_area = np.maximum(bin_area - area(blockage), 0.0)
+    return movable_area, free_area
+
+
+def report_density(nodes, pl, scl, target_density=1.0, grid=None, out=None):
+    bs = bookshelf.Bookshelf()
+    bs.read_scl(scl)
+    bs.read_nodes(nodes)
+    bs.read_pl(pl)
+
+    region = bs.get_place_region()
+    num_movable = int(np.count_nonzero(bs.node_type == bookshelf.MOVABLE))
+    nx, ny = grid if grid is not None else get_grid(region, num_movable)
+
+    movable_area, free_area = get_bin_density(bs, region, nx, ny)
+    total_movable = movable_area.sum()
+
+    has_space = free_area > 0
+    density = np.where(has_space, movable_area / np.where(has_space, free_area, 1.0),
+                       np.where(movable_area > 0, np.inf, 0.0))
+
+    overflow = np.maximum(movable_area - target_density * free_area, 0.0)
+    overflow_ratio = overflow.sum() / total_movable if total_movable > 0 else 0.0
+
+    print ("==================================================")
+    print ("Placement          : %s" % (pl))
+    print ("Bin grid           : %d x %d" % (nx, ny))
+    print ("Target density     : %.4f" % (target_density))
+    print ("Utilization        : %.4f" % (total_movable / max(free_area.sum(), 1e-12)))
+    print ("Peak bin density   : %.4f" % (density.max()))
+    print ("Overflow ratio     : %.4f" % (overflow_ratio))
+    print ("Overflowed bins    : %d / %d"
+           % (np.count_nonzero(overflow > 0), nx * ny))
+    print ("==================================================")
+
+    if out is not None:
+        width, height = region[2] - region[0], region[3] - region[1]
+        if width > height:
+            x_size, y_size = 1000, int(1000 * height / width)
+        else:
+            x_size, y_size = int(1000 * width / height), 1000
+        # 115% of the target maps to the top of the palette, as in the
+        # congestion maps.
+        image = raster.render_map(np.minimum(100.0 * density, 1e6),
+                                  raster.CONGESTION_PALETTE,
+                                  0, 115.0 * target_density,
+                                  max(x_size, 1), max(y_size, 1))
+        raster.write_png(out + '.png', image)
+
+    return density.max(), overflow_ratio
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    if opt.grid is not None and min(opt.grid) <= 0:
+        sys.stderr.write("Error: the number of bins must be positive.\n")
+        raise SystemExit(-1)
+
+    report_density(opt.src_nodes, opt.src_pl, opt.src_scl,
+                   opt.target_density, opt.grid, opt.out)
@@ -0,0 +1,183 @@
+# File: 300_placement_displacement.py
+# Description: Report how far cells move between two placements of the same
+#              design, e.g. global placement (<bench>-ComPLx.pl), detailed
+#              placement (<bench>_FP_dp.pl) and legalization after sizing
+#              (420). The placements are aligned by node name with
+#              PlacementTable.diff, and the displacement of all cells is
+#              computed at once: statistics, a histogram, the largest moves
+#              and a movement-vector plot.
+
+from __future__ import print_function, division
+
+import numpy as np
+
+import bookshelf
+import compressed_io
+import placement_table
+import raster
+
+# Movement-vector plot
+PLOT_SIZE = 1000
+VECTOR_COLOR = '#0B66FE'
+END_COLOR = '#FF0000'
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Report the displacement of cells between two placements.')
+    parser.add_argument('--ref', action="store", dest='ref_pl', required=True,
+                        help="Placement before (pl, or a %s table)"
+                             % (placement_table.BINARY_EXTENSION))
+    parser.add_argument('--pl', action="store", dest='src_pl', required=True,
+                        help="Placement after")
+    parser.add_argument('--nodes', action="store", dest='src_nodes', default=None,
+                        help="Skip the terminals of this nodes file "
+                             "(default: skip /FIXED nodes of --ref)")
+    parser.add_argument('--bins', action="store", type=int, dest='bins', default=10,
+                        help="Number of histogram bins")
+    parser.add_argument('--top', action="store", type=int, dest='top', default=10,
+                        help="Number of largest moves to list")
+    parser.add_argument('--per_cell', action="store", dest='per_cell', default=None,
+                        help="Write name, dx, dy and displacement of each "
+                             "moved cell to this file")
+    parser.add_argument('--out', action="store", dest='out', default=None,
+                        help="Write a movement-vector plot to <out>.png")
+    parser.add_argument('--max_vectors', action="store", type=int,
+                        dest='max_vectors', default=20000,
+                        help="Plot only the largest moves")
+
+    opt = parser.parse_args()
+
+    if opt.bins <= 0:
+        parser.error("--bins must be positive.")
+
+    return opt
+
+
+def get_displacement(ref, pl, nodes=None):
+    """ Return (ids, dx, dy, num_missing): the cells in both placements (ids
+    in ref), and the number of ref nodes missing from pl.
+
+    Terminals of nodes, or fixed nodes of ref if nodes is None, are skipped.
+    """
+    ids, dx, dy = ref.diff(pl)
+    num_missing = len(ref) - len(ids)
+
+    if nodes is not None:
+        bs = bookshelf.Bookshelf()
+        bs.read_nodes(nodes)
+        node_ids = bs.node_table.get_ids(ref.names)[ids]
+        movable = (node_ids < 0) | (bs.node_type[np.maximum(node_ids, 0)]
+                                    == bookshelf.MOVABLE)
+    else:
+        movable = ~ref.is_fixed()[ids]
+
+    return ids[movable], dx[movable], dy[movable], num_missing
+
+
+def write_per_cell(file_name, names, dx, dy, dist):
+    order = np.argsort(-dist, kind='stable')
+    with compressed_io.open_file(file_name, 'w') as f:
+        f.write("# name dx dy displacement (Manhattan)\n")
+        f.writelines("%s %.15g %.15g %.15g\n" % t
+                     for t in zip([names[i] for i in order],
+                                  dx[order], dy[order], dist[order]))
+
+
+def write_plot(file_name, ref, pl, ids, dx, dy, dist, max_vectors):
+    """ Draw the largest moves as vectors from the old to the new location. """
+    x0, y0 = ref.x[ids], ref.y[ids]
+    x1, y1 = x0 + dx, y0 + dy
+
+    all_x = np.concatenate((ref.x, pl.x))
+    all_y = np.concatenate((ref.y, pl.y))
+    region = (all_x.min(), all_y.min(), all_x.max(), all_y.max())
+    width, height = max(region[2] - region[0], 1), max(region[3] - region[1], 1)
+    region = (region[0], region[1], region[0] + width, region[1] + height)
+    if width > height:
+        x_size, y_size = PLOT_SIZE, int(PLOT_SIZE * height / width)
+    else:
+        x_size, y_size = int(PLOT_SIZE * width / height), PLOT_SIZE
+
+    moved = np.flatnonzero(dist > 0)
+    if len(moved) > max_vectors:
+        moved = moved[np.argpartition(-dist[moved], max_vectors - 1)[:max_vectors]]
+
+    image = np.full((max(y_size, 2), max(x_size, 2), 3), 255, dtype=np.uint8)
+    raster.draw_segments(image, x0[moved], y0[moved], x1[moved], y1[moved],
+                         region, raster.to_rgb(VECTOR_COLOR))
+    raster.draw_segments(image, x1[moved], y1[moved], x1[moved], y1[moved],
+                         region, raster.to_rgb(END_COLOR))
+    raster.write_png(file_name, raster.add_border(image, 3))
+
+
+def report_displacement(ref_pl, src_pl, nodes=None, bins=10, top=10,
+                        per_cell=None, out=None, max_vectors=20000):
+    ref = placement_table.read_placement(ref_pl)
+    pl = placement_table.read_placement(src_pl)
+
+    ids, dx, dy, num_missing = get_displacement(ref, pl, nodes)
+    dist = np.abs(dx) + np.abs(dy)
+    euclid = np.hypot(dx, dy)
+    moved = dist > 0
+    num_cells = len(ids)
+
+    print ("==================================================")
+    print ("Reference pl       : %s" % (ref_pl))
+    print ("Placement          : %s" % (src_pl))
+    print ("Cells compared     : %d" % (num_cells))
+    print ("Not in placement   : %d" % (num_missing))
+    print ("Moved cells        : %d (%.2f%%)"
+           % (np.count_nonzero(moved),
+              100.0 * np.count_nonzero(moved) / max(num_cells, 1)))
+    if num_cells > 0:
+        print ("Total displacement : %.2f" % (dist.sum()))
+        print ("Avg displacement   : %.4f" % (dist.mean()))
+        print ("Max displacement   : %.2f" % (dist.max()))
+        print ("Avg (Euclidean)    : %.4f" % (euclid.mean()))
+        print ("Max (Euclidean)    : %.2f" % (euclid.max()))
+        print ("Avg |dx|, |dy|     : %.4f, %.4f"
+               % (np.abs(dx).mean(), np.abs(dy).mean()))
+    print ("==================================================")
+
+    if np.count_nonzero(moved) > 0:
+        counts, edges = np.histogram(dist[moved], bins=bins)
+        print ("")
+        print ("Displacement of moved cells (Manhattan)")
+        print ("%12s %12s %10s %8s" % ('From', 'To', 'Cells', '%'))
+        for lo, hi, c in zip(edges[:-1], edges[1:], counts):
+            print ("%12.2f %12.2f %10d %8.2f"
+                   % (lo, hi, c, 100.0 * c / np.count_nonzero(moved)))
+
+        largest = np.argsort(-dist, kind='stable')[:min(top, np.count_nonzero(moved))]
+        if len(largest) > 0:
+            print ("")
+            print ("Largest moves")
+            print ("%-20s %24s %24s %10s" % ('Cell', 'From', 'To', 'Distance'))
+            for i in largest:
+                x0, y0 = ref.x[ids[i]], ref.y[ids[i]]
+                print ("%-20s %24s %24s %10.2f"
+                       % (ref.names[ids[i]], "(%g, %g)" % (x0, y0),
+                          "(%g, %g)" % (x0 + dx[i], y0 + dy[i]), dist[i]))
+
+    if per_cell is not None:
+        names = ref.names
+        write_per_cell(per_cell, [names[i] for i in ids[moved]],
+                       dx[moved], dy[moved], dist[moved])
+
+    if out is not None:
+        write_plot(out + '.png', ref, pl, ids, dx, dy, dist, max_vectors)
+
+    return dist
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    report_displacement(opt.ref_pl, opt.src_pl, opt.src_nodes, opt.bins,
+                        opt.top, opt.per_cell, opt.out, opt.max_vectors)
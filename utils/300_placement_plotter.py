@@ -1,5 +1,12 @@
 from time import gmtime, strftime
 
+import numpy as np
+
+import bookshelf
+import compressed_io
+import placement_table
+import raster
+
 
 def parse_cl():
     import argparse
@@ -9,6 +16,10 @@ def parse_cl():
     parser.add_argument('--pl', action="store", dest='src_pl', required=True)
     parser.add_argument('--scl', action="store", dest='src_scl', required=True)
     parser.add_argument('--out', action="store", dest='out', default='out')
+    parser.add_argument('--backend', action="store", dest='backend',
+                        choices=('raster', 'gnuplot'), default='raster',
+                        help="raster: write out.png directly, "
+                             "gnuplot: write out.plt to be run by gnuplot")
 
     return parser.parse_args()
 
@@ -38,7 +49,7 @@ class Node(object):
 
 
 def parse_bookshelf_nodes(nodes, node_dict):
-    with open(nodes, 'r') as f:
+    with compressed_io.open_file(nodes) as f:
         # read lines without blank lines
         lines = [l for l in (line.strip() for line in f) if l]
 
@@ -65,29 +76,19 @@ def parse_bookshelf_nodes(nodes, node_dict):
 
 
 def parse_bookshelf_pl(pl, node_dict):
-    with open(pl, 'r') as f:
-        # read lines without blank lines
-        lines = [l for l in (line.strip() for line in f) if l]
-
-    # Skip the first line: UCLA pl ...
-    lines_iter = iter(lines[1:])
-
-    for l in lines_iter:
-        if l.startswith('#'): continue
-
-        tokens = l.split()
-        assert len(tokens) > 3
-
-        name, x, y = tokens[0], int(float(tokens[1])), int(float(tokens[2]))
+    placement = placement_table.PlacementTable()
+    placement.read_pl(pl)
 
+    x, y = placement.x.astype(np.int64), placement.y.astype(np.int64)
+    for name, llx, lly in zip(placement.names, x.tolist(), y.tolist()):
         n = node_dict[name]
-        n.llx, n.lly = x, y
+        n.llx, n.lly = llx, lly
 
 
 def parse_bookshelf_scl(scl):
     """ Read an scl and determine placement region """
 
-    with open(scl, 'r') as f:
+    with compressed_io.open_file(scl) as f:
         # read lines without blank lines
         lines = [l for l in (line.strip() for line in f) if l]
 
@@ -192,8 +193,8 @@ def make_placement_plot(nodes, pl, scl, dest):
     parse_bookshelf_pl(pl, node_dict)
 
     # open plot file
-    f_dest = open(dest + '.plt', 'w')
-    png_name = dest + '.png'
+    f_dest = compressed_io.open_file(compressed_io.add_suffix(dest, '.plt'), 'w')
+    png_name = compressed_io.strip_extension(dest) + '.png'
 
     # Print plt header
     print_gnuplot_header(f_dest, png_name)
@@ -212,6 +213,44 @@ def make_placement_plot(nodes, pl, scl, dest):
     f_dest.close()
 
 
+def make_placement_raster(nodes, pl, scl, dest, default_size=1500):
+    """ Draw the placement straight into a PNG image.
+
+    Cell rectangles are accumulated into per-pixel coverage, so dense areas
+    are drawn darker and cells smaller than a pixel are not lost.
+    Colors and layering follow the gnuplot plot.
+    """
+    bs = bookshelf.Bookshelf()
+    bs.read_scl(scl)
+    bs.read_nodes(nodes)
+    bs.read_pl(pl)
+
+    urx, ury = bs.get_place_region()[2:]
+    if ury < urx:
+        width, height = default_size, int(default_size * ury / urx)
+    else:
+        width, height = int(default_size * urx / ury), default_size
+    region = (0, 0, urx, ury)
+
+    llx, lly = bs.node_x, bs.node_y
+    node_urx, node_ury = llx + bs.node_width, lly + bs.node_height
+
+    is_fixed = bs.node_type != bookshelf.MOVABLE
+    is_reg = np.char.startswith(np.array(bs.node_names), 'l')
+
+    # Same colors as in color_list of the gnuplot plot
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for mask, color, solid in ((~is_fixed, '#0B66FE', 0.5),
+                               (is_reg, '#FF0000', 0.33),
+                               (is_fixed, '#000000', 0.9)):
+        coverage = raster.rasterize_rects(llx[mask], lly[mask],
+                                          node_urx[mask], node_ury[mask],
+                                          region, width, height)
+        image = raster.blend(image, coverage, raster.to_rgb(color), solid)
+
+    raster.write_png(compressed_io.strip_extension(dest) + '.png', raster.add_border(image, 3))
+
+
 if __name__ == '__main__':
     cl_opt = parse_cl()
 
@@ -220,5 +259,8 @@ if __name__ == '__main__':
     scl = cl_opt.src_scl
     dest = cl_opt.out
 
-    make_placement_plot(nodes, pl, scl, dest)
+    if cl_opt.backend == 'gnuplot':
+        make_placement_plot(nodes, pl, scl, dest)
+    else:
+        make_placement_raster(nodes, pl, scl, dest)
 
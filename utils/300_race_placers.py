@@ -0,0 +1,138 @@
+"""
+    Race several placers on the same Bookshelf design.
+
+    All placers start at the same time. A placement is scored by its HPWL as
+    soon as its placer finishes. At the deadline the placers that are still
+    running are cancelled, as long as one of them has finished by then;
+    otherwise the first one to finish ends the race. The placement with the
+    smallest HPWL is copied to <out_dir>/<bench>_solution.pl.
+"""
+
+from __future__ import print_function, division
+import sys, os, shutil, asyncio
+from time import time
+
+import hpwl
+import tool_runner
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Run placers in parallel and keep the best placement.')
+    parser.add_argument('--bench', action="store", dest='bench', required=True)
+    parser.add_argument('--bookshelf_dir', action="store", dest='bookshelf_dir',
+                        required=True)
+    parser.add_argument('--placers', action="store", dest='placers', nargs='+',
+                        choices=tool_runner.PLACERS,
+                        default=['ComPLx', 'NTUPlace3', 'mPL6', 'FastPlace-GP', 'Capo'])
+    parser.add_argument('--target_density', action="store", dest='target_density',
+                        default='0.85')
+    parser.add_argument('--deadline', action="store", type=float, dest='deadline',
+                        default=3600.0,
+                        help="Seconds after which unfinished placers are cancelled")
+    parser.add_argument('--out_dir', action="store", dest='out_dir', required=True)
+    parser.add_argument('-j', action="store", type=int, dest='max_jobs',
+                        help="Maximum number of concurrent placers "
+                             "(default: all of them)")
+
+    return parser.parse_args()
+
+
+class Scorer(object):
+    """ HPWL of placements of one Bookshelf design. """
+    def __init__(self, bookshelf_dir, bench):
+        base = os.path.join(bookshelf_dir, bench)
+        self.bs = hpwl.read_design(base + '.nodes', base + '.nets', base + '.pl')
+        self.init_x = self.bs.node_x.copy()
+        self.init_y = self.bs.node_y.copy()
+
+
+    def get_hpwl(self, pl_file):
+        """ Return the HPWL of pl_file, or None if it does not place all nodes. """
+        bs = self.bs
+        bs.node_x[:], bs.node_y[:] = self.init_x, self.init_y
+        if bs.read_pl(pl_file) != bs.get_node_count():
+            return None
+        return hpwl.get_net_hpwl(bs).sum()
+
+
+async def race(runner, jobs, scorer, deadline):
+    """ Return (job result, HPWL) pairs of all placers, in job order. """
+    start = time()
+    tasks = [asyncio.ensure_future(runner.run_job(j)) for j in jobs]
+    scores = dict()     # task : HPWL
+
+    pending = set(tasks)
+    while pending:
+        # After the deadline, wait for the next placer to finish
+        timeout = deadline - (time() - start)
+        if timeout <= 0:
+            timeout = None
+        done, pending = await asyncio.wait(pending, timeout=timeout,
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            result = t.result()
+            if result.result_file is not None:
+                scores[t] = scorer.get_hpwl(result.result_file)
+                print ("%s finished: HPWL %s" % (result.name, scores[t]))
+
+        over = time() - start >= deadline
+        if pending and over and any(s is not None for s in scores.values()):
+            print ("Deadline: cancelling %s" \
+                   % (', '.join(j.name for t, j in zip(tasks, jobs) if t in pending)))
+            for t in pending:
+                t.cancel()
+            await asyncio.wait(pending)
+            break
+
+    # A task cancelled before it started has no result of its own
+    return [(tool_runner.JobResult(j, 'cancelled', None, 0.0, [])
+             if t.cancelled() else t.result(), scores.get(t))
+            for t, j in zip(tasks, jobs)]
+
+
+def race_placers(bench, bookshelf_dir, placers, target_density, deadline,
+                 out_dir, max_jobs=None):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    scorer = Scorer(bookshelf_dir, bench)
+    jobs = [tool_runner.get_placer_job(bench, bookshelf_dir, p, target_density,
+                                       os.path.join(out_dir, p))
+            for p in placers]
+    runner = tool_runner.ToolRunner(max_jobs or len(jobs))
+    results = asyncio.run(race(runner, jobs, scorer, deadline))
+
+    print ("")
+    print ("==================================================")
+    print ("%-14s %-10s %10s %16s" % ('Placer', 'Status', 'Time (s)', 'HPWL'))
+    winner = None
+    for result, score in results:
+        print ("%-14s %-10s %10.1f %16s" \
+               % (result.name, result.status, result.run_time,
+                  '-' if score is None else '%.0f' % (score)))
+        if score is not None and (winner is None or score < winner[1]):
+            winner = (result, score)
+    print ("==================================================")
+
+    if winner is None:
+        sys.stderr.write("Error: no placer produced a complete placement.\n")
+        raise SystemExit(-1)
+
+    print ("Winner             : %s" % (winner[0].name))
+    print ("HPWL               : %.0f" % (winner[1]))
+    shutil.copy(winner[0].result_file,
+                os.path.join(out_dir, '%s_solution.pl' % (bench)))
+    return winner[0].name
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    race_placers(opt.bench, opt.bookshelf_dir, opt.placers, opt.target_density,
+                 opt.deadline, opt.out_dir, opt.max_jobs)
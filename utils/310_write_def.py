@@ -12,6 +12,7 @@ import sys
 import verilog_parser
 import def_parser
 import lef_parser
+import placement_table
 
 M1_LAYER_NAME = 'metal1'
 M2_LAYER_NAME = 'metal2'
@@ -37,32 +38,15 @@ def parse_cl():
 
 def parse_pl(pl_file_name):
     """
-    Return a dictionary including placement information.
-    Key: name, Value: (x, y, orient)
+    Return a PlacementTable of the placement information.
     """
-    with open(pl_file_name, 'r') as f:
-        # read lines without blank lines
-        lines = [l for l in (line.strip() for line in f) if l]
+    pl = placement_table.PlacementTable()
+    pl.read_pl(pl_file_name)
 
-    # Skip the first line: UCLA nodes ...
-    lines_iter = iter(lines[1:])
- 
-    pl_dict = dict()
-    for l in lines_iter:
-        if l.startswith('#'): continue
+    # for ICCAD
+    pl.orient[:] = placement_table.ORIENT_INDEX['N']
 
-        tokens = l.split()
-        assert len(tokens) >= 5
-
-        name, x, y, orient = \
-            tokens[0], float(tokens[1]), float(tokens[2]), tokens[4]
-
-        # for ICCAD
-        orient = 'N'
-
-        pl_dict[name] = (x, y, orient)
-
-    return pl_dict
+    return pl
 
 
 def write_def(dest_def, src_lef, src_def, src_v, src_pl):
@@ -74,10 +58,6 @@ def write_def(dest_def, src_lef, src_def, src_v, src_pl):
     the_lef.m1_layer_name = 'metal1'
     the_lef.m2_layer_name = 'metal2'
 
-    width_multiplier  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-    height_multiplier = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-    dbu_per_micron    = the_lef.units_distance_microns
-
     print ("Parsing DEF: %s" % (src_def))
     the_def = def_parser.Def()
     the_def.read_def(src_def)
@@ -89,32 +69,50 @@ def write_def(dest_def, src_lef, src_def, src_v, src_pl):
     the_verilog.clock_port = 'iccad_clk'    # clock_port will not be used in this code
     the_verilog.print_stats()
 
+    write_placed_def(dest_def, the_lef, the_def, the_verilog, src_pl)
+
+
+def write_placed_def(dest_def, the_lef, the_def, the_verilog, src_pl):
+    """ Write the_def with the components of the_verilog placed at src_pl.
+    The parsed inputs are not modified.
+    """
     # Get placement info
     print ("Parsing bookshelf pl: %s" %(src_pl))
-    pl_dict = parse_pl(src_pl)    # name : (x, y, orient)
+    pl = parse_pl(src_pl)
 
     # Create new def file
     print ("Write def file")
     new_def = deepcopy(the_def)
     new_def.file_name = dest_def
-    new_def.components = list()
+    new_def.components = get_placed_components(the_lef, the_verilog, pl)
 
-    for g in the_verilog.instances:
-        if g.gate_type in ('PI', 'PO'):
-            continue
+    new_def.print_stats()
+    new_def.write_def(dest_def)
 
-        name = g.name
-        gate_type = g.gate_type
-        is_fixed = False
-        x, y, orient = pl_dict[name]
-        x = x * dbu_per_micron * width_multiplier
-        y = y * dbu_per_micron * height_multiplier
 
-        new_def.components.append(
-                def_parser.DefComponent(name, gate_type, is_fixed, x, y, orient))
+def get_placed_components(the_lef, the_verilog, pl):
+    """ Return DefComponents of the gates of the_verilog at their Bookshelf
+    locations in the PlacementTable pl, in DEF units.
+    """
+    width_multiplier  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
+    height_multiplier = the_lef.metal_layer_dict[the_lef.m1_layer_name]
+    dbu_per_micron    = the_lef.units_distance_microns
 
-    new_def.print_stats()
-    new_def.write_def(dest_def)
+    gates = [g for g in the_verilog.instances if g.gate_type not in ('PI', 'PO')]
+    ids = pl.get_ids(g.name for g in gates)
+    if (ids < 0).any():
+        missing = [g.name for g, i in zip(gates, ids) if i < 0]
+        sys.stderr.write("Error: %d gates are not placed (%s, ...).\n"
+                         % (len(missing), missing[0]))
+        raise SystemExit(-1)
+
+    dbu = pl.scale(dbu_per_micron * width_multiplier,
+                   dbu_per_micron * height_multiplier)
+
+    is_fixed = False
+    return [def_parser.DefComponent(g.name, g.gate_type, is_fixed,
+                                    dbu.x[i], dbu.y[i], dbu.get_orient(i))
+            for g, i in zip(gates, ids)]
 
 
 if __name__ == '__main__':
@@ -38,6 +38,14 @@ def generate_sizer_input(src, dest, dest_sdc, clock='iccad_clk', period='0.0'):
     module.clock_port = clock
     module.print_stats()
 
+    write_sizer_input(module, dest, dest_sdc, clock, period)
+
+
+def write_sizer_input(module, dest, dest_sdc, clock='iccad_clk', period='0.0'):
+    """ Write the sizer verilog and SDC of a parsed module. Blocks, tie
+    cells and floating logic are cut off; module itself is not changed.
+    """
+
     #
     inputs = set(module.inputs[:])
     outputs = set(module.outputs[:])
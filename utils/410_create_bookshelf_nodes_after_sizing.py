@@ -1,10 +1,11 @@
 
 from time import gmtime, strftime
-from math import ceil
 import sys, re, os
 
 import verilog_parser
 import lef_parser
+import tech_units
+import compressed_io
 
 
 def parse_cl():
@@ -43,16 +44,20 @@ def create_bs_nodes_after_sizing (src_nodes, src_v, src_lef, dest):
     the_lef.read_lef(src_lef)
     the_lef.print_stats()
 
-    with open(src_nodes, 'r') as f:
+    write_nodes_after_sizing(src_nodes, module, the_lef, dest)
+
+
+def write_nodes_after_sizing(src_nodes, module, the_lef, dest):
+    """ Copy src_nodes to dest with the widths of the sized module. """
+    with compressed_io.open_file(src_nodes) as f:
         lines = [l.strip() for l in f]
     lines_iter = iter(lines)
 
-    #
+    # Bookshelf sizes as in 200_gen_bookshelf
     instance_dict = {i.name : i.gate_type for i in module.instances}
-    lef_macro_dict = {m.name : m.width for m in the_lef.macros}
-    site_width = the_lef.sites[0].width
+    units = tech_units.TechUnits(the_lef)
 
-    with open(dest, 'w') as f:
+    with compressed_io.open_file(dest, 'w') as f:
         for line in lines_iter:
             if line == "":
                 f.write('\n')
@@ -71,10 +76,8 @@ def create_bs_nodes_after_sizing (src_nodes, src_v, src_lef, dest):
                 f.write(line + '\n')
                 continue
 
-            width = lef_macro_dict[gate_type] / site_width
-            # width = round(width) # FIXME
-            width = ceil(width) # FIXME
-            f.write("%-40s %15d %15d\n" % (instance_name, int(width), 9))
+            width, height = units.get_size(gate_type)
+            f.write("%-40s %15d %15d\n" % (instance_name, width, height))
         
 
 if __name__ == '__main__':
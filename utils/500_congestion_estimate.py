@@ -0,0 +1,249 @@
+# File: 500_congestion_estimate.py
+# Description: Estimate global routing congestion of a Bookshelf placement
+#              with RUDY (rectangular uniform wire density), on the tile grid
+#              and capacities that 500_gen_routing_benchmark.pl writes to the
+#              .gr file. The wire demand of every net is spread uniformly over
+#              its bounding box, and all boxes are accumulated on the tiles
+#              at once with raster.rasterize_rects. The result is a
+#              congestion map and an overflow prediction in seconds, before
+#              the global router runs.
+
+from __future__ import print_function, division
+
+import numpy as np
+
+import bookshelf
+import raster
+
+# As in 500_gen_routing_benchmark.pl
+ROW_HEIGHT = 9
+LARGE_MACRO_SIZE = 3 * ROW_HEIGHT
+# Congestion maps
+PLOT_SIZE = 1000
+PLOT_CBRANGE = (0, 115)
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Estimate the routing congestion of a placement.')
+    parser.add_argument('--aux', action="store", dest='src_aux', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl',
+                        help="Placement (default: the pl of the aux file)")
+    parser.add_argument('--tile_size', action="store", type=int,
+                        dest='tile_size', default=80)
+    parser.add_argument('--adjustment', action="store", type=float,
+                        dest='adjustment', default=50,
+                        help="Capacity of metal1/metal2 and its reduction "
+                             "over large macros, in %% of the tracks")
+    parser.add_argument('--safety', action="store", type=float,
+                        dest='safety', default=90,
+                        help="Guardband, in %% of the tracks")
+    parser.add_argument('--num_layer', action="store", type=int,
+                        dest='num_layer', default=8)
+    parser.add_argument('--max_overflow', action="store", type=float,
+                        dest='max_overflow', default=None,
+                        help="Exit with 2 if the predicted overflow is more "
+                             "than this %% of the demand")
+    parser.add_argument('--out', action="store", dest='out', default=None,
+                        help="Write congestion maps to <out>.RUDY_H/V.congestion.png")
+
+    opt = parser.parse_args()
+
+    if opt.tile_size <= 0:
+        parser.error("--tile_size must be positive.")
+    if opt.num_layer < 2:
+        parser.error("--num_layer must be at least 2.")
+
+    return opt
+
+
+def make_even(v):
+    """ Round capacities up to even, as the .gr generator does. """
+    return v + v % 2
+
+
+def get_tile_grid(bs, pin_x, pin_y, tile_size):
+    """ Return (minx, miny, nx, ny): the rows and pins, extended by half a
+    tile on each side.
+    """
+    llx, lly, urx, ury = bs.get_place_region()
+    if len(pin_x) > 0:
+        llx, urx = min(llx, pin_x.min()), max(urx, pin_x.max())
+        lly, ury = min(lly, pin_y.min()), max(ury, pin_y.max())
+
+    half = int(tile_size / 2.0)
+    minx, miny = max(int(llx) - half, 0), max(int(lly) - half, 0)
+    maxx, maxy = int(urx) + half, int(ury) + half
+
+    nx = max(int((maxx - minx) / tile_size + 0.5), 1)
+    ny = max(int((maxy - miny) / tile_size + 0.5), 1)
+    return minx, miny, nx, ny
+
+
+def get_tile_capacity(bs, grid, tile_size, adjustment, safety, num_layer):
+    """ Return the horizontal and vertical tracks of each tile, [x, y].
+
+    metal1 (H) and metal2 (V) get adjustment of the tracks; the other
+    layers alternate H/V with all of them. Over large macros, the tracks of
+    metal3 and metal4 are reduced by adjustment for each macro.
+    """
+    minx, miny, nx, ny = grid
+    adj, safe = adjustment / 100.0, safety / 100.0
+
+    m1 = make_even(int(tile_size * adj * safe))
+    m2 = make_even(int(tile_size * adj * safe))
+    base = make_even(int(tile_size * safe))
+    num_h = len(range(3, num_layer + 1, 2))
+    num_v = len(range(4, num_layer + 1, 2))
+
+    cap_h = np.full((nx, ny), float(m1 + num_h * base))
+    cap_v = np.full((nx, ny), float(m2 + num_v * base))
+
+    # Large macros inside the rows
+    llx, lly, urx, ury = bs.get_place_region()
+    x, y = bs.node_x, bs.node_y
+    w, h = bs.node_width, bs.node_height
+    large = ((w > LARGE_MACRO_SIZE) | (h > LARGE_MACRO_SIZE)) \
+            & (x >= llx) & (y >= lly) & (x + w <= urx) & (y + h <= ury)
+
+    x0 = np.clip(((x[large] - minx) / tile_size).astype(np.int64), 0, nx - 1)
+    x1 = np.clip(((x[large] + w[large] - minx) / tile_size).astype(np.int64), 0, nx - 1)
+    y0 = np.clip(((y[large] - miny) / tile_size).astype(np.int64), 0, ny - 1)
+    y1 = np.clip(((y[large] + h[large] - miny) / tile_size).astype(np.int64), 0, ny - 1)
+
+    def count(mask):
+        """ Number of masked macros over each tile. """
+        diff = np.zeros((nx + 1, ny + 1))
+        np.add.at(diff, (x0[mask], y0[mask]), 1)
+        np.add.at(diff, (x1[mask] + 1, y0[mask]), -1)
+        np.add.at(diff, (x0[mask], y1[mask] + 1), -1)
+        np.add.at(diff, (x1[mask] + 1, y1[mask] + 1), 1)
+        return diff.cumsum(axis=0).cumsum(axis=1)[:nx, :ny]
+
+    for cap, cnt, num_layers in ((cap_h, count(x1 > x0), num_h),
+                                 (cap_v, count(y1 > y0), num_v)):
+        if num_layers == 0:
+            continue
+        blocked = cnt > 0
+        reduced = make_even(np.maximum(
+                    (base * (1.0 - cnt[blocked] * adj)).astype(np.int64), 0))
+        cap[blocked] -= base - reduced
+
+    return cap_h, cap_v
+
+
+def get_rudy_demand(bs, pin_x, pin_y, grid, tile_size):
+    """ Return the horizontal and vertical tracks used in each tile, [x, y].
+
+    The horizontal wire of a net (its bounding box width) is spread evenly
+    over the box, and so is the vertical one. Boxes smaller than a tile are
+    widened to a tile, keeping the wirelength of the net.
+    """
+    minx, miny, nx, ny = grid
+    region = (minx, miny, minx + nx * tile_size, miny + ny * tile_size)
+
+    degree = np.diff(bs.net_start)
+    s = bs.net_start[:-1][degree > 0]
+    routed = degree[degree > 0] >= 2
+    if not routed.any():
+        return np.zeros((nx, ny)), np.zeros((nx, ny))
+
+    llx = np.minimum.reduceat(pin_x, s)[routed]
+    urx = np.maximum.reduceat(pin_x, s)[routed]
+    lly = np.minimum.reduceat(pin_y, s)[routed]
+    ury = np.maximum.reduceat(pin_y, s)[routed]
+    width, height = urx - llx, ury - lly
+    box_w, box_h = np.maximum(width, tile_size), np.maximum(height, tile_size)
+    cx, cy = 0.5 * (llx + urx), 0.5 * (lly + ury)
+
+    llx, urx = cx - 0.5 * box_w, cx + 0.5 * box_w
+    lly, ury = cy - 0.5 * box_h, cy + 0.5 * box_h
+
+    # Coverage is a fraction of the tile area; a horizontal wire of length
+    # width over the box is (width / box_w) * (tile_size / box_h) tracks in
+    # a tile covered by the box.
+    dem_h = raster.rasterize_rects(llx, lly, urx, ury, region, nx, ny,
+                                   (width / box_w) * (tile_size / box_h))
+    dem_v = raster.rasterize_rects(llx, lly, urx, ury, region, nx, ny,
+                                   (height / box_h) * (tile_size / box_w))
+    return dem_h, dem_v
+
+
+def write_maps(out, grid, tile_size, util_h, util_v):
+    minx, miny, nx, ny = grid
+    if nx > ny:
+        width, height = PLOT_SIZE, int(PLOT_SIZE * ny / nx)
+    else:
+        width, height = int(PLOT_SIZE * nx / ny), PLOT_SIZE
+    width, height = max(width, 1), max(height, 1)
+
+    for name, values in (('RUDY_H', util_h), ('RUDY_V', util_v)):
+        image = raster.render_map(np.minimum(values, 1e6), raster.CONGESTION_PALETTE,
+                                  PLOT_CBRANGE[0], PLOT_CBRANGE[1], width, height)
+        raster.write_png("%s.%s.congestion.png" % (out, name), image)
+
+
+def estimate_congestion(aux, pl=None, tile_size=80, adjustment=50, safety=90,
+                        num_layer=8, out=None):
+    """ Return the predicted overflow, in % of the routing demand. """
+    bs = bookshelf.Bookshelf()
+    bs.read_aux(aux, read_files=False)
+    files = bs.files
+    bs.read_scl(files['scl'])
+    bs.read_nodes(files['nodes'])
+    bs.read_pl(pl if pl is not None else files['pl'])
+    bs.read_nets(files['nets'])
+
+    pin_x, pin_y = bs.get_pin_xy()
+    grid = get_tile_grid(bs, pin_x, pin_y, tile_size)
+    cap_h, cap_v = get_tile_capacity(bs, grid, tile_size, adjustment, safety,
+                                     num_layer)
+    dem_h, dem_v = get_rudy_demand(bs, pin_x, pin_y, grid, tile_size)
+
+    def utilization(dem, cap):
+        return 100.0 * dem / np.maximum(cap, 1e-9)
+
+    util_h, util_v = utilization(dem_h, cap_h), utilization(dem_v, cap_v)
+    of_h = np.maximum(dem_h - cap_h, 0.0)
+    of_v = np.maximum(dem_v - cap_v, 0.0)
+    total_demand = dem_h.sum() + dem_v.sum()
+    total_overflow = of_h.sum() + of_v.sum()
+    overflow_pct = 100.0 * total_overflow / total_demand if total_demand > 0 else 0.0
+
+    minx, miny, nx, ny = grid
+    print ("==================================================")
+    print ("Placement          : %s" % (pl if pl is not None else files['pl']))
+    print ("Tile grid          : %d x %d (%d, %d), tile %d"
+           % (nx, ny, minx, miny, tile_size))
+    print ("Capacity (H, V)    : %.0f, %.0f" % (cap_h.sum(), cap_v.sum()))
+    print ("Demand (H, V)      : %.0f, %.0f" % (dem_h.sum(), dem_v.sum()))
+    print ("Peak usage (H, V)  : %.1f%%, %.1f%%" % (util_h.max(), util_v.max()))
+    print ("Overflowed tiles   : %d / %d"
+           % (np.count_nonzero((of_h > 0) | (of_v > 0)), nx * ny))
+    print ("Overflow (H, V)    : %.0f, %.0f" % (of_h.sum(), of_v.sum()))
+    print ("Max tile overflow  : %.1f" % (max(of_h.max(), of_v.max())))
+    print ("Overflow / demand  : %.2f%%" % (overflow_pct))
+    print ("==================================================")
+
+    if out is not None:
+        write_maps(out, grid, tile_size, util_h, util_v)
+
+    return overflow_pct
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    overflow_pct = estimate_congestion(opt.src_aux, opt.src_pl, opt.tile_size,
+                                       opt.adjustment, opt.safety,
+                                       opt.num_layer, opt.out)
+
+    if opt.max_overflow is not None and overflow_pct > opt.max_overflow:
+        print ("Predicted overflow exceeds %.2f%%: likely unroutable."
+               % (opt.max_overflow))
+        raise SystemExit(2)
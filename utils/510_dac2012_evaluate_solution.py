@@ -0,0 +1,468 @@
+# File: 510_dac2012_evaluate_solution.py
+# Description: Evaluate a placement and its global routing solution in the
+#              DAC 2012 routability-driven placement contest manner (HPWL,
+#              ACE and scaled wirelength), and render congestion maps.
+#              Python port of 510_dac2012_evaluate_solution.pl: blockage
+#              overlaps are merged per tile edge with a sorted interval
+#              sweep, and the maps are written straight to PNG.
+
+from __future__ import print_function, division
+import sys, os
+
+import numpy as np
+
+import bookshelf
+import gr_parser
+import raster
+
+# For ACE computation
+IGNORE_EDGE_RATIO = 0.8
+ACE_PERCENTS = (0.5, 1.0, 2.0, 5.0)
+# For Scaled_WL computation
+CONGESTION_WEIGHTS = (1.0, 1.0, 1.0, 1.0)
+PENALTY_FACTOR = 0.03
+# Pin blockage factor (applied on layers 2 and 3)
+PIN_BLOCKAGE_FACTOR = 0.0
+# Congestion maps
+PLOT_SIZE = 1000
+PLOT_CBRANGE = (0, 115)
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Evaluate a DAC 2012 placement/routing solution.')
+    parser.add_argument('aux', action="store", help="Benchmark aux file")
+    parser.add_argument('pl', action="store", help="Placement solution")
+    parser.add_argument('route', action="store", help="Routing solution")
+    parser.add_argument('-p', action="store_true", dest='plot',
+                        help="Generate congestion maps for each layer (PNG).")
+    parser.add_argument('-v', action="store", type=int, dest='verbose',
+                        default=1, help="Verbosity level (0-2).")
+
+    return parser.parse_args()
+
+
+def to_routing_grid(bs):
+    """ Build a GlobalRoutingGrid from the .route file and the nets. """
+    route = bs.route
+    the_gr = gr_parser.GlobalRoutingGrid()
+    the_gr.file_name = bs.files.get('route')
+    the_gr.grid_x, the_gr.grid_y = route.grid_x, route.grid_y
+    the_gr.num_layers = route.num_layers
+    the_gr.v_capacity, the_gr.h_capacity = route.v_capacity, route.h_capacity
+    the_gr.min_width, the_gr.min_spacing = route.min_width, route.min_spacing
+    the_gr.via_spacing = route.via_spacing
+    the_gr.origin_x, the_gr.origin_y = route.origin_x, route.origin_y
+    the_gr.tile_width, the_gr.tile_height = route.tile_width, route.tile_height
+    the_gr.set_net_table(bs.net_table)
+    the_gr.pin_start = bs.net_start
+    return the_gr
+
+
+def get_pins(bs):
+    """ Pin locations rounded to integers, as in the contest script. """
+    pin_x, pin_y = bs.get_pin_xy()
+    return np.trunc(pin_x + 0.5), np.trunc(pin_y + 0.5)
+
+
+def get_hpwl(bs, pin_x, pin_y):
+    degree = np.diff(bs.net_start)
+    if np.any(degree == 0):
+        sys.stderr.write("Error: net %s has no pin.\n"
+                         % (bs.net_names[np.argmax(degree == 0)]))
+        raise SystemExit(-1)
+
+    s = bs.net_start[:-1]
+    return int(np.sum(np.maximum.reduceat(pin_x, s) - np.minimum.reduceat(pin_x, s)
+                      + np.maximum.reduceat(pin_y, s) - np.minimum.reduceat(pin_y, s)))
+
+
+def get_blockage_rects(bs):
+    """ Return (lx, ly, dx, dy, layer) arrays of routing blockages.
+
+    Non-rectangular nodes are blocked by each of their shapes.
+    """
+    rects = list()
+    route = bs.route
+    for name, layers in route.blockages.items():
+        i = bs.node_index[name]
+        if name in bs.shapes:
+            shapes = bs.shapes[name]
+        else:
+            shapes = [(bs.node_x[i], bs.node_y[i],
+                       bs.node_width[i], bs.node_height[i])]
+
+        for l in layers:
+            if route.h_capacity[l - 1] <= 0 and route.v_capacity[l - 1] <= 0:
+                continue
+            rects.extend(s + (l, ) for s in shapes)
+
+    rects = np.array(rects, dtype=np.float64).reshape(-1, 5)
+    return rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3], \
+           rects[:, 4].astype(np.int64)
+
+
+def get_blockage_intervals(lo, hi, lo_index, hi_index, tile, origin,
+                           along_lo, along_hi):
+    """ Expand blockages into (rect, across, along, left, right) overlaps.
+
+    The edges crossed by the blockage are along_lo..along_hi-1 on one axis;
+    on the other axis, the blockage [lo, hi] overlaps tiles lo_index..hi_index
+    and [left, right] is its overlap with each of them.
+    """
+    num_across = hi_index - lo_index + 1
+    num_along = along_hi - along_lo
+    count = np.where(num_along > 0, num_across * num_along, 0)
+
+    rect = np.repeat(np.arange(len(count)), count)
+    k = np.arange(len(rect)) - np.repeat(np.cumsum(count) - count, count)
+    across = lo_index[rect] + k // num_along[rect]
+    along = along_lo[rect] + k % num_along[rect]
+
+    left = np.where(across == lo_index[rect], lo[rect], across * tile + origin)
+    right = np.where(across == hi_index[rect], hi[rect],
+                     (across + 1) * tile + origin)
+    valid = left < right
+    return rect[valid], across[valid], along[valid], left[valid], right[valid]
+
+
+def get_tile_capacity(bs):
+    """ Return (cap_r, cap_t), the capacities of the right and the top edges
+    of every tile after subtracting routing blockages.
+
+    Overlaps of blockages with a tile edge are merged into disjoint intervals,
+    and the capacity is reduced by the blocked fraction of the tile.
+    """
+    route = bs.route
+    gx, gy, gz = route.grid_x, route.grid_y, route.num_layers
+    ox, oy = route.origin_x, route.origin_y
+    tw, th = route.tile_width, route.tile_height
+
+    cap_r = np.empty((gz, gx, gy), dtype=np.int64)
+    cap_t = np.empty((gz, gx, gy), dtype=np.int64)
+    cap_r[:] = route.h_capacity[:, None, None]
+    cap_t[:] = route.v_capacity[:, None, None]
+    cap_r[:, -1, :] = 0
+    cap_t[:, :, -1] = 0
+
+    lx, ly, dx, dy, layer = get_blockage_rects(bs)
+    num_adjustments = 0
+    if len(layer) > 0:
+        # Clip to the grid
+        dx = np.where(lx + dx > ox + gx * tw, ox + gx * tw - lx, dx)
+        dx = np.where(lx < ox, dx - (ox - lx), dx)
+        lx = np.maximum(lx, ox)
+        dy = np.where(ly + dy > oy + gy * th, oy + gy * th - ly, dy)
+        dy = np.where(ly < oy, dy - (oy - ly), dy)
+        ly = np.maximum(ly, oy)
+        hx, hy = lx + dx, ly + dy
+
+        lx_index = np.trunc((lx - ox) / tw).astype(np.int64)
+        ly_index = np.trunc((ly - oy) / th).astype(np.int64)
+        hx_index = np.trunc((hx - ox) / tw).astype(np.int64)
+        hy_index = np.trunc((hy - oy) / th).astype(np.int64)
+
+        # A blockage abutting the lower tile boundary also blocks the edge
+        # to the lower tile.
+        lx_index -= lx == lx_index * tw + ox
+        ly_index -= ly == ly_index * th + oy
+
+        lx_index = np.clip(lx_index, 0, gx - 1)
+        ly_index = np.clip(ly_index, 0, gy - 1)
+        hx_index = np.clip(hx_index, 0, gx - 1)
+        hy_index = np.clip(hy_index, 0, gy - 1)
+
+        is_h = route.h_capacity[layer - 1] > 0
+
+        # Horizontal layers: blocked y spans on edges lx..hx-1,
+        # vertical layers: blocked x spans on edges ly..hy-1.
+        h = is_h
+        r, y, x, h_left, h_right = get_blockage_intervals(
+                ly[h], hy[h], ly_index[h], hy_index[h], th, oy,
+                lx_index[h], hx_index[h])
+        h_layer = layer[h][r] - 1
+        h_key = (h_layer * gx + x) * gy + y
+
+        v = ~is_h
+        r, x, y, v_left, v_right = get_blockage_intervals(
+                lx[v], hx[v], lx_index[v], hx_index[v], tw, ox,
+                ly_index[v], hy_index[v])
+        v_layer = layer[v][r] - 1
+        v_key = (v_layer * gx + x) * gy + y
+
+        key = np.concatenate((h_key, v_key))
+        left = np.concatenate((h_left, v_left))
+        right = np.concatenate((h_right, v_right))
+
+        # Union of the intervals of each edge: sort by (edge, left), then a
+        # running max of right (shifted per edge so that edges do not mix)
+        # tells how much of each interval is already covered.
+        order = np.lexsort((left, key))
+        key, left, right = key[order], left[order], right[order]
+        edges, group = np.unique(key, return_inverse=True)
+
+        base = left.min() if len(left) > 0 else 0.0
+        shift = group * (right.max() - base + 1.0) if len(left) > 0 else 0.0
+        left, right = left - base + shift, right - base + shift
+        covered = np.maximum.accumulate(right)
+        covered = np.concatenate(([-np.inf], covered[:-1]))
+        length = np.maximum(right - np.maximum(left, covered), 0.0)
+        occupied = np.bincount(group, weights=length, minlength=len(edges))
+
+        # Adjusted capacities
+        l, rest = np.divmod(edges, gx * gy)
+        x, y = np.divmod(rest, gy)
+        edge_h = route.h_capacity[l] > 0
+        max_capacity = np.where(edge_h, route.h_capacity[l], route.v_capacity[l])
+        max_space = np.where(edge_h, th, tw)
+        pitch = route.min_width[l] + route.min_spacing[l]
+
+        blocked = np.trunc((1.0 - route.blockage_porosity) * occupied)
+        capacity = np.trunc(max_capacity * ((max_space - blocked) / max_space))
+        capacity = np.maximum(capacity, 0).astype(np.int64)
+        capacity = (capacity // pitch) * pitch
+
+        cap_r[l[edge_h], x[edge_h], y[edge_h]] = capacity[edge_h]
+        cap_t[l[~edge_h], x[~edge_h], y[~edge_h]] = capacity[~edge_h]
+        num_adjustments = len(edges)
+
+    return cap_r, cap_t, num_adjustments
+
+
+def get_tile_demand(the_gr, the_route):
+    """ Return (dem_r, dem_t), the demand on the right and top tile edges. """
+    shape = (the_gr.num_layers, the_gr.grid_x, the_gr.grid_y)
+    dem_r = np.zeros(shape, dtype=np.int64)
+    dem_t = np.zeros(shape, dtype=np.int64)
+
+    pitch = the_gr.min_width + the_gr.min_spacing
+    for horizontal, demand in ((True, dem_r), (False, dem_t)):
+        net, layer, x, y = the_route.expand_wires(horizontal)
+        np.add.at(demand, (layer, x, y), pitch[layer])
+    return dem_r, dem_t
+
+
+def get_tile_pins(the_gr, pin_x, pin_y):
+    gx, gy = the_gr.to_grid(pin_x, pin_y)
+    tile_pins = np.zeros((the_gr.grid_x, the_gr.grid_y), dtype=np.int64)
+    np.add.at(tile_pins, (np.clip(gx, 0, the_gr.grid_x - 1),
+                          np.clip(gy, 0, the_gr.grid_y - 1)), 1)
+    return tile_pins
+
+
+def get_pin_blockage(tile_pins, axis):
+    """ Pin blockage (in tracks) of the lower and the upper edges of tiles. """
+    pins = np.ceil(tile_pins * PIN_BLOCKAGE_FACTOR)
+    lower, upper = pins.copy(), pins.copy()
+    if axis == 0:
+        lower[1:] += pins[:-1]
+        upper[:-1] += pins[1:]
+    else:
+        lower[:, 1:] += pins[:, :-1]
+        upper[:, :-1] += pins[:, 1:]
+    return lower, upper
+
+
+def get_edge_congestion(route, layer, cap, demand, tile_pins):
+    """ Return (edge congestion, layer capacity, is vertical) of a layer. """
+    vertical = route.v_capacity[layer] != 0
+    layer_capacity = route.v_capacity[layer] if vertical \
+                     else route.h_capacity[layer]
+
+    blockage = layer_capacity - cap[layer]
+    pin_blockage = 0.0
+    if layer in (1, 2):
+        pin_blockage = get_pin_blockage(tile_pins, 1 if vertical else 0)[1] \
+                       * (route.min_width[layer] + route.min_spacing[layer])
+
+    congestion = (demand[layer] + blockage + pin_blockage) / layer_capacity
+    ignored = blockage >= IGNORE_EDGE_RATIO * layer_capacity
+    return congestion, ignored, vertical
+
+
+def get_ace(congestion):
+    """ Average congestion of the top x% congested edges, for each x. """
+    congestion = np.sort(congestion)[::-1]
+    num_edges = len(congestion)
+    if num_edges == 0:
+        return [0.0 for p in ACE_PERCENTS]
+
+    total = np.cumsum(congestion)
+    ace = list()
+    for p in ACE_PERCENTS:
+        n = int((p * num_edges) / 100.0) + 1
+        ace.append(total[n - 1] / n)
+    return ace
+
+
+def plot_congestion_maps(design, route, cap_r, cap_t, dem_r, dem_t, tile_pins):
+    """ Congestion of a tile is the max of its two edges in the layer
+    direction, and the Max_H/Max_V maps take the max over the layers.
+    """
+    gx, gy = route.grid_x, route.grid_y
+    core_width, core_height = gx * route.tile_width, gy * route.tile_height
+    if core_width > core_height:
+        width, height = PLOT_SIZE, int(PLOT_SIZE * core_height / core_width)
+    else:
+        width, height = int(PLOT_SIZE * core_width / core_height), PLOT_SIZE
+    width, height = max(width, 1), max(height, 1)
+
+    max_h = np.zeros((gx, gy))
+    max_v = np.zeros((gx, gy))
+
+    def write_map(values, name):
+        image = raster.render_map(values, raster.CONGESTION_PALETTE,
+                                  PLOT_CBRANGE[0], PLOT_CBRANGE[1],
+                                  width, height)
+        raster.write_png("%s.%s.congestion.png" % (design, name), image)
+
+    for z in range(route.num_layers):
+        if route.h_capacity[z] <= 0 and route.v_capacity[z] <= 0:
+            continue
+
+        if route.h_capacity[z] > 0:
+            axis, capacity, c2, d2 = 0, route.h_capacity[z], cap_r[z], dem_r[z]
+        else:
+            axis, capacity, c2, d2 = 1, route.v_capacity[z], cap_t[z], dem_t[z]
+
+        # Lower (left/bottom) edges are the upper edges of the previous tile.
+        c1, d1 = np.zeros_like(c2), np.zeros_like(d2)
+        if axis == 0:
+            c1[1:], d1[1:] = c2[:-1], d2[:-1]
+        else:
+            c1[:, 1:], d1[:, 1:] = c2[:, :-1], d2[:, :-1]
+
+        b1, b2 = capacity - c1, capacity - c2
+        p1, p2 = 0.0, 0.0
+        if z in (1, 2):
+            pitch = route.min_width[z] + route.min_spacing[z]
+            lower, upper = get_pin_blockage(tile_pins, axis)
+            p1 = np.where(b1 < IGNORE_EDGE_RATIO * capacity, lower * pitch, 0)
+            p2 = np.where(b2 < IGNORE_EDGE_RATIO * capacity, upper * pitch, 0)
+
+        tile_congestion = 100.0 * np.maximum((d1 + b1 + p1) / capacity,
+                                             (d2 + b2 + p2) / capacity)
+        if axis == 0:
+            np.maximum(max_h, tile_congestion, out=max_h)
+        else:
+            np.maximum(max_v, tile_congestion, out=max_v)
+
+        write_map(tile_congestion, "M%d" % (z + 1))
+
+    write_map(max_h, "Max_H")
+    write_map(max_v, "Max_V")
+
+
+def evaluate(src_aux, src_pl, src_route, plot=False, verbose=1):
+    bs = bookshelf.Bookshelf()
+    bs.read_aux(src_aux, read_files=False)
+    for ext in ('nodes', 'nets', 'shapes', 'route'):
+        if ext not in bs.files:
+            sys.stderr.write("Error: no .%s file in %s.\n" % (ext, src_aux))
+            raise SystemExit(-1)
+
+    bs.read_nodes(bs.files['nodes'])
+    bs.read_shapes(bs.files['shapes'])
+    num_locations = bs.read_pl(src_pl)
+    if num_locations != bs.get_node_count():
+        sys.stderr.write("Error: NumNodes(%d) does not match "
+                         "Num_Loc_Records(%d).\n"
+                         % (bs.get_node_count(), num_locations))
+        raise SystemExit(-1)
+    bs.read_nets(bs.files['nets'])
+    bs.read_route(bs.files['route'])
+
+    route = bs.route
+    # All terminals are treated as terminal_NI.
+    if len(route.ni_terminal_layers) != bs.num_terminals:
+        sys.stderr.write("Error: Terminal_NI mismatch. From .nodes file (%d) "
+                         "From .route file (%d).\n"
+                         % (bs.num_terminals, len(route.ni_terminal_layers)))
+        raise SystemExit(-1)
+    for name in list(route.ni_terminal_layers) + list(route.blockages):
+        if name not in bs.node_index:
+            sys.stderr.write("Error: invalid object (%s) in .route file.\n"
+                             % (name))
+            raise SystemExit(-1)
+
+    pin_x, pin_y = get_pins(bs)
+    hpwl = get_hpwl(bs, pin_x, pin_y)
+
+    the_gr = to_routing_grid(bs)
+    cap_r, cap_t, num_adjustments = get_tile_capacity(bs)
+
+    # Only nets spanning multiple tiles are routed.
+    tile_x, tile_y = the_gr.to_grid(pin_x, pin_y)
+    s = bs.net_start[:-1]
+    gr_net = (np.minimum.reduceat(tile_x, s) != np.maximum.reduceat(tile_x, s)) \
+             | (np.minimum.reduceat(tile_y, s) != np.maximum.reduceat(tile_y, s))
+
+    the_route = gr_parser.RouteSolution()
+    the_route.read_route(src_route, the_gr, net_mask=gr_net)
+    dem_r, dem_t = get_tile_demand(the_gr, the_route)
+    tile_pins = get_tile_pins(the_gr, pin_x, pin_y)
+
+    if verbose > 0:
+        print ("==================================================")
+        print ("Number of nodes        : %d" % (bs.get_node_count()))
+        print ("Number of terminals    : %d" % (bs.num_terminals))
+        print ("Number of nets         : %d" % (bs.get_net_count()))
+        print ("Number of pins         : %d" % (len(bs.pin_node)))
+        print ("Nets spanning g-cells  : %d" % (np.count_nonzero(gr_net)))
+        print ("Grid                   : %d x %d x %d"
+               % (route.grid_x, route.grid_y, route.num_layers))
+        print ("Number of blockages    : %d" % (len(route.blockages)))
+        print ("Capacity adjustments   : %d" % (num_adjustments))
+        print ("==================================================")
+
+    # ACE of the horizontal and the vertical edges
+    h_congestion, v_congestion = list(), list()
+    for z in range(route.num_layers):
+        if route.v_capacity[z] == 0 and route.h_capacity[z] == 0:
+            continue
+        vertical = route.v_capacity[z] != 0
+        congestion, ignored, vertical = get_edge_congestion(
+                route, z, cap_t if vertical else cap_r,
+                dem_t if vertical else dem_r, tile_pins)
+        (v_congestion if vertical else h_congestion).append(congestion[~ignored])
+
+    h_ace = get_ace(np.concatenate(h_congestion) if h_congestion else [])
+    v_ace = get_ace(np.concatenate(v_congestion) if v_congestion else [])
+    max_ace = [max(h, v) for h, v in zip(h_ace, v_ace)]
+
+    if verbose > 1:
+        print ("ACE      " + "".join("%6g%%  " % (p) for p in ACE_PERCENTS))
+        print ("Hor      " + "".join("%.2f   " % (100 * a) for a in h_ace))
+        print ("Ver      " + "".join("%.2f   " % (100 * a) for a in v_ace))
+
+    # Scaled wirelength
+    pwc = 100.0 * sum(w * a for w, a in zip(CONGESTION_WEIGHTS, max_ace)) \
+          / sum(CONGESTION_WEIGHTS)
+    rc = max(100.0, pwc)
+    scaled_wl = hpwl * (1.0 + PENALTY_FACTOR * (rc - 100.0))
+
+    design = os.path.basename(src_aux).split('.')[0]
+    print ("")
+    print ("===== Quality Metrics (%s) =====" % (design))
+    print ("Total Half Perimeter Wire Length: %d" % (hpwl))
+    print ("ACE      " + "".join(" %.2f%%   " % (p) for p in ACE_PERCENTS))
+    print ("         " + "".join("%.2f   " % (100 * a) for a in max_ace))
+    print ("Scaled Wire Length: %.0f" % (scaled_wl))
+
+    if plot:
+        if verbose > 0:
+            print ("\nGenerate congestion maps for each layer...")
+        plot_congestion_maps(design, route, cap_r, cap_t, dem_r, dem_t,
+                             tile_pins)
+
+    return hpwl, max_ace, scaled_wl
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+    evaluate(opt.aux, opt.pl, opt.route, opt.plot, opt.verbose)
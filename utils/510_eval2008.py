@@ -0,0 +1,210 @@
+# File: 510_eval2008.py
+# Description: Evaluate a global routing solution in the ISPD 2008 global
+#              routing contest manner (total/max overflow and wirelength).
+#              Python port of 510_eval2008.pl, where tile edge usage is
+#              accumulated over per-layer edge grids with np.add.at.
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import gr_parser
+
+VIA_COST = 1
+MAX_CHECKED_PINS = 1000   # the contest script skips checks on bigger nets
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Evaluate an ISPD08 global routing solution.')
+    parser.add_argument('gr', action="store", help="Input design (.gr)")
+    parser.add_argument('route', action="store", help="Routed result")
+    parser.add_argument('-c', action="store_true", dest='check',
+                        help="Check the connectivity of each net.")
+    parser.add_argument('-H', action="store_true", dest='no_header',
+                        help="Do not print header.")
+    parser.add_argument('-v', action="store", type=int, dest='verbose',
+                        default=0, help="Verbosity level (0-2).")
+
+    return parser.parse_args()
+
+
+def get_edge_usage(the_gr, the_route):
+    """ Return per-edge usage (h_use, v_use) and the unit edges of wires.
+
+    A wire of net n on layer l consumes max(net min width, min width of l)
+    + min spacing of l on every tile edge it crosses.
+    """
+    h_use = np.zeros((the_gr.num_layers, the_gr.grid_x - 1, the_gr.grid_y),
+                     dtype=np.int64)
+    v_use = np.zeros((the_gr.num_layers, the_gr.grid_x, the_gr.grid_y - 1),
+                     dtype=np.int64)
+
+    edges = list()
+    for horizontal, usage in ((True, h_use), (False, v_use)):
+        net, layer, x, y = the_route.expand_wires(horizontal)
+        width = np.maximum(the_gr.net_min_width[net], the_gr.min_width[layer])
+        np.add.at(usage, (layer, x, y), width + the_gr.min_spacing[layer])
+        edges.append((net, layer, x, y))
+
+    return h_use, v_use, edges
+
+
+def check_unrouted_nets(the_gr, the_route):
+    """ Return nets whose pins span multiple tiles but have no route. """
+    gx, gy = the_gr.to_grid(the_gr.pin_x, the_gr.pin_y)
+    start = the_gr.pin_start[:-1]
+    num_pins = np.diff(the_gr.pin_start)
+
+    unrouted = np.zeros(the_gr.get_net_count(), dtype=bool)
+    has_pins = num_pins > 0
+    if not np.any(has_pins):
+        return unrouted
+
+    s = start[has_pins]
+    spans = (np.minimum.reduceat(gx, s) != np.maximum.reduceat(gx, s)) \
+            | (np.minimum.reduceat(gy, s) != np.maximum.reduceat(gy, s))
+
+    unrouted[has_pins] = spans
+    unrouted &= ~the_route.routed
+    unrouted &= num_pins <= MAX_CHECKED_PINS
+    return unrouted
+
+
+def check_connectivity(the_gr, the_route):
+    """ Check that every pin is attached to a single routing tree.
+
+    This walks each net with a union-find, so it is much slower than the
+    overflow computation and only runs on request (-c).
+    """
+    order = np.argsort(the_route.seg_net, kind='stable')
+    seg_net = the_route.seg_net[order]
+    bounds = np.flatnonzero(np.diff(seg_net)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(seg_net)]))
+
+    x1, y1, l1 = the_route.x1[order], the_route.y1[order], the_route.l1[order]
+    x2, y2, l2 = the_route.x2[order], the_route.y2[order], the_route.l2[order]
+    pgx, pgy = the_gr.to_grid(the_gr.pin_x, the_gr.pin_y)
+
+    num_errors = 0
+    for s, e in zip(starts, ends):
+        net = seg_net[s]
+        p0, p1 = the_gr.pin_start[net], the_gr.pin_start[net + 1]
+        if p1 - p0 > MAX_CHECKED_PINS:
+            continue
+
+        parent = dict()
+        def find(v):
+            root = v
+            while parent.setdefault(root, root) != root:
+                root = parent[root]
+            while parent[v] != root:
+                parent[v], v = root, parent[v]
+            return root
+
+        # Each segment connects all the grid points along it.
+        for i in range(s, e):
+            a = (int(x1[i]), int(y1[i]), int(l1[i]))
+            b = (int(x2[i]), int(y2[i]), int(l2[i]))
+            if a[0] != b[0]:
+                points = [(x, a[1], a[2]) for x in range(a[0], b[0] + 1)]
+            elif a[1] != b[1]:
+                points = [(a[0], y, a[2]) for y in range(a[1], b[1] + 1)]
+            else:
+                points = [(a[0], a[1], l) for l in range(a[2], b[2] + 1)]
+            root = find(points[0])
+            for p in points[1:]:
+                parent[find(p)] = root
+
+        for p in range(p0, p1):
+            point = (int(pgx[p]), int(pgy[p]), int(the_gr.pin_layer[p]))
+            if point not in parent:
+                print ("net %s pin (%d,%d,%d) not attached"
+                       % (the_gr.net_names[net], the_gr.pin_x[p],
+                          the_gr.pin_y[p], the_gr.pin_layer[p] + 1))
+                num_errors += 1
+
+        roots = set(find(v) for v in list(parent.keys()))
+        if len(roots) > 1:
+            sys.stderr.write("ERROR net %s disjoint\n" % (the_gr.net_names[net]))
+            num_errors += 1
+
+    return num_errors
+
+
+def evaluate(src_gr, src_route, check=False, no_header=False, verbose=0):
+    the_gr = gr_parser.GlobalRoutingGrid()
+    the_gr.read_gr(src_gr)
+    if verbose > 0:
+        the_gr.print_stats()
+
+    the_route = gr_parser.RouteSolution()
+    the_route.read_route(src_route, the_gr)
+
+    h_cap, v_cap = the_gr.get_edge_capacity()
+    h_use, v_use, edges = get_edge_usage(the_gr, the_route)
+
+    # Overflow
+    h_of = np.maximum(h_use - h_cap, 0)
+    v_of = np.maximum(v_use - v_cap, 0)
+    total_overflow = int(h_of.sum() + v_of.sum())
+    max_overflow = int(max(h_of.max(initial=0), v_of.max(initial=0)))
+    num_overflow_edges = int(np.count_nonzero(h_of) + np.count_nonzero(v_of))
+
+    overflowed_nets = set()
+    for (net, layer, x, y), of in zip(edges, (h_of, v_of)):
+        overflowed_nets.update(np.unique(net[of[layer, x, y] > 0]).tolist())
+
+    # Wirelength: tile-to-tile wire length plus via cost
+    wire_length = int((the_route.x2 - the_route.x1).sum()
+                      + (the_route.y2 - the_route.y1).sum())
+    num_vias = int((the_route.l2 - the_route.l1).sum())
+    total_length = wire_length + VIA_COST * num_vias
+
+    if verbose > 1:
+        net_length = np.bincount(the_route.seg_net,
+                                 weights=(the_route.x2 - the_route.x1)
+                                         + (the_route.y2 - the_route.y1)
+                                         + VIA_COST * (the_route.l2 - the_route.l1),
+                                 minlength=the_gr.get_net_count())
+        for name, length in zip(the_gr.net_names, net_length):
+            print ("INFO netlen %s %d" % (name, length))
+
+    num_errors = check_connectivity(the_gr, the_route) if check else 0
+
+    unrouted = check_unrouted_nets(the_gr, the_route)
+    for i in np.flatnonzero(unrouted):
+        sys.stderr.write("ERROR net %s unrouted\n" % (the_gr.net_names[i]))
+
+    # Report in the contest format
+    if not no_header:
+        print ("%-36s %13s %12s %14s"
+               % ('File Names(In, Out)', 'Tot OF', 'Max OF', 'WL'))
+    print ("%-36s %13d %12d %14d"
+           % ("%s, %s " % (src_gr, src_route),
+              total_overflow, max_overflow, total_length))
+    print ("")
+    print ("Wire length        : %d" % (wire_length))
+    print ("Number of vias     : %d" % (num_vias))
+    print ("Overflowed edges   : %d" % (num_overflow_edges))
+    print ("Overflowed nets    : %d" % (len(overflowed_nets)))
+    if check:
+        print ("Connectivity errors: %d" % (num_errors))
+
+    if np.any(unrouted):
+        sys.stderr.write("ERROR has unrouted net\n")
+        raise SystemExit(-1)
+
+    return total_overflow, max_overflow, total_length
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+    evaluate(opt.gr, opt.route, opt.check, opt.no_header, opt.verbose)
@@ -0,0 +1,391 @@
+"""
+    A Bookshelf parser (aux, nodes, nets, pl, scl, shapes and route files).
+
+    Nodes, pins and rows are stored in NumPy arrays indexed by node (or net)
+    index, so that evaluators and plotters can work on whole designs at once.
+"""
+
+from __future__ import print_function, division
+import sys, os
+
+import numpy as np
+
+import compressed_io
+import symbol_table
+
+# Node types
+MOVABLE, TERMINAL, TERMINAL_NI = 0, 1, 2
+
+# Pin direction codes
+PIN_DIRECTIONS = ('I', 'O', 'B')
+
+
+def read_lines(file_name):
+    """ Read a bookshelf file without blank lines and comments. """
+    with compressed_io.open_file(file_name) as f:
+        return [l for l in (line.strip() for line in f)
+                if l and not l.startswith('#')]
+
+
+class BookshelfRoute(object):
+    """ Routing information of a DAC2012 bookshelf .route file. """
+    def __init__(self):
+        self.grid_x, self.grid_y, self.num_layers = 0, 0, 0
+        self.v_capacity, self.h_capacity = None, None
+        self.min_width, self.min_spacing, self.via_spacing = None, None, None
+        self.origin_x, self.origin_y = 0, 0
+        self.tile_width, self.tile_height = 1, 1
+        self.blockage_porosity = 0.0
+        self.ni_terminal_layers = dict()    # name : pin layer (1-based)
+        self.blockages = dict()             # name : blocked layers (1-based)
+
+
+class Bookshelf(object):
+    def __init__(self):
+        self.files = dict()     # extension : file name
+
+        # Nodes (node_names and node_index are views of node_table)
+        self.node_table = symbol_table.SymbolTable()
+        self.node_names = self.node_table.names
+        self.node_index = self.node_table.index     # name : index
+        self.node_width = None
+        self.node_height = None
+        self.node_type = None           # MOVABLE, TERMINAL, TERMINAL_NI
+        self.num_terminals = 0
+
+        # Placement (lower-left corners)
+        self.node_x = None
+        self.node_y = None
+        self.node_fixed = None
+
+        # Nets (pins of net i are pin_*[net_start[i]:net_start[i+1]])
+        self.net_table = symbol_table.SymbolTable()
+        self.net_names = self.net_table.names
+        self.net_start = None
+        self.pin_node = None
+        self.pin_direction = None       # index of PIN_DIRECTIONS
+        self.pin_dx = None              # offsets from the node center
+        self.pin_dy = None
+
+        # Rows
+        self.row_y = None
+        self.row_height = None
+        self.row_site_width = None
+        self.row_site_spacing = None
+        self.row_x = None               # subrow origin
+        self.row_num_sites = None
+
+        # Non-rectangular nodes, name : list of (llx, lly, width, height)
+        self.shapes = dict()
+
+        self.route = None
+
+
+    def get_node_count(self):
+        return len(self.node_names)
+
+
+    def get_net_count(self):
+        return len(self.net_names)
+
+
+    def read_aux(self, file_name, read_files=True):
+        """ Read an aux file and (optionally) all the files listed in it. """
+        lines = read_lines(file_name)
+        tokens = lines[0].split()
+        if not tokens[0].startswith('RowBasedPlacement'):
+            sys.stderr.write("Error: unsupported aux file %s.\n" % (file_name))
+            raise SystemExit(-1)
+
+        base_dir = os.path.dirname(file_name)
+        for t in tokens[2:]:
+            ext = t[t.rfind('.') + 1:]
+            self.files[ext] = os.path.join(base_dir, t)
+
+        if not read_files:
+            return
+
+        for ext, reader in (('nodes', self.read_nodes),
+                            ('pl', self.read_pl),
+                            ('nets', self.read_nets),
+                            ('scl', self.read_scl),
+                            ('shapes', self.read_shapes),
+                            ('route', self.read_route)):
+            if ext in self.files:
+                reader(self.files[ext])
+
+
+    def read_nodes(self, file_name):
+        lines = read_lines(file_name)
+
+        names, widths, heights, types = list(), list(), list(), list()
+        num_nodes, num_terminals = None, None
+        for l in lines[1:]:     # Skip the first line: UCLA nodes ...
+            tokens = l.split()
+            if tokens[0] == 'NumNodes':
+                num_nodes = int(tokens[-1])
+                continue
+            elif tokens[0] == 'NumTerminals':
+                num_terminals = int(tokens[-1])
+                continue
+
+            names.append(tokens[0])
+            widths.append(tokens[1])
+            heights.append(tokens[2])
+
+            if len(tokens) < 4:
+                types.append(MOVABLE)
+            elif tokens[3] == 'terminal':
+                types.append(TERMINAL)
+            elif tokens[3] == 'terminal_NI':
+                types.append(TERMINAL_NI)
+            else:
+                sys.stderr.write("Error: unknown node type %s (%s).\n"
+                                 % (tokens[3], tokens[0]))
+                raise SystemExit(-1)
+
+        self.node_table = symbol_table.get_unique_table(names, 'node', file_name)
+        self.node_names = self.node_table.names
+        self.node_index = self.node_table.index
+        self.node_width = np.array(widths, dtype=np.float64)
+        self.node_height = np.array(heights, dtype=np.float64)
+        self.node_type = np.array(types, dtype=np.int8)
+        self.num_terminals = int(np.count_nonzero(self.node_type))
+
+        if num_nodes is not None and num_nodes != len(names):
+            sys.stderr.write("Error: NumNodes (%d) != number of nodes (%d).\n"
+                             % (num_nodes, len(names)))
+            raise SystemExit(-1)
+        if num_terminals is not None and num_terminals != self.num_terminals:
+            sys.stderr.write("Error: NumTerminals (%d) != number of "
+                             "terminals (%d).\n"
+                             % (num_terminals, self.num_terminals))
+            raise SystemExit(-1)
+
+        num = len(names)
+        self.node_x = np.zeros(num, dtype=np.float64)
+        self.node_y = np.zeros(num, dtype=np.float64)
+        self.node_fixed = self.node_type != MOVABLE
+
+
+    def read_pl(self, file_name):
+        """ Read node locations. Nodes should be read first. """
+        lines = read_lines(file_name)
+
+        index, xs, ys, fixed = list(), list(), list(), list()
+        node_index = self.node_index
+        for l in lines[1:]:     # Skip the first line: UCLA pl ...
+            tokens = l.split()
+            try:
+                index.append(node_index[tokens[0]])
+            except KeyError:
+                sys.stderr.write("Error: invalid node %s in %s.\n"
+                                 % (tokens[0], file_name))
+                raise SystemExit(-1)
+            xs.append(tokens[1])
+            ys.append(tokens[2])
+            fixed.append(tokens[-1].startswith('/FIXED'))
+
+        index = np.array(index, dtype=np.int64)
+        self.node_x[index] = np.array(xs, dtype=np.float64)
+        self.node_y[index] = np.array(ys, dtype=np.float64)
+        self.node_fixed[index] |= np.array(fixed, dtype=bool)
+
+        return len(index)
+
+
+    def read_nets(self, file_name):
+        lines = read_lines(file_name)
+
+        net_names, net_degrees = list(), list()
+        pin_nodes, pin_dirs, pin_dxs, pin_dys = list(), list(), list(), list()
+        node_index = self.node_index
+        direction_code = {d : i for i, d in enumerate(PIN_DIRECTIONS)}
+
+        lines_iter = iter(lines[1:])    # Skip the first line: UCLA nets ...
+        for l in lines_iter:
+            tokens = l.split()
+            if tokens[0] in ('NumNets', 'NumPins'):
+                continue
+
+            assert tokens[0] == 'NetDegree'
+            degree = int(tokens[2])
+            net_names.append(tokens[3] if len(tokens) > 3
+                             else 'noname_net_%d' % (len(net_names)))
+            net_degrees.append(degree)
+
+            for i in range(degree):
+                tokens = next(lines_iter).split()
+                try:
+                    pin_nodes.append(node_index[tokens[0]])
+                except KeyError:
+                    sys.stderr.write("Error: invalid node %s in %s.\n"
+                                     % (tokens[0], file_name))
+                    raise SystemExit(-1)
+
+                pin_dirs.append(direction_code.get(tokens[1], 2))
+                if len(tokens) >= 5:
+                    pin_dxs.append(tokens[3])
+                    pin_dys.append(tokens[4])
+                else:
+                    pin_dxs.append(0.0)
+                    pin_dys.append(0.0)
+
+        self.net_table = symbol_table.get_unique_table(net_names, 'net', file_name)
+        self.net_names = self.net_table.names
+        self.net_start = np.zeros(len(net_names) + 1, dtype=np.int64)
+        np.cumsum(net_degrees, out=self.net_start[1:])
+        self.pin_node = np.array(pin_nodes, dtype=np.int64)
+        self.pin_direction = np.array(pin_dirs, dtype=np.int8)
+        self.pin_dx = np.array(pin_dxs, dtype=np.float64)
+        self.pin_dy = np.array(pin_dys, dtype=np.float64)
+
+
+    def read_scl(self, file_name):
+        lines = read_lines(file_name)
+
+        rows = list()
+        lines_iter = iter(lines[1:])    # Skip the first line: UCLA scl ...
+        for l in lines_iter:
+            tokens = l.split()
+            if tokens[0] != 'CoreRow':
+                continue
+
+            row = dict()
+            while True:
+                tokens = next(lines_iter).replace(':', ' ').split()
+                if tokens[0] == 'End':
+                    break
+                # SubrowOrigin : x  NumSites : n in one line
+                for k, v in zip(tokens[0::2], tokens[1::2]):
+                    row[k] = v
+
+            rows.append((row['Coordinate'], row['Height'], row['Sitewidth'],
+                         row.get('Sitespacing', row['Sitewidth']),
+                         row['SubrowOrigin'], row['NumSites']))
+
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 6)
+        self.row_y, self.row_height = rows[:, 0], rows[:, 1]
+        self.row_site_width, self.row_site_spacing = rows[:, 2], rows[:, 3]
+        self.row_x, self.row_num_sites = rows[:, 4], rows[:, 5]
+
+
+    def read_shapes(self, file_name):
+        lines = read_lines(file_name)
+
+        lines_iter = iter(lines[1:])    # Skip the first line: shapes 1.0
+        for l in lines_iter:
+            tokens = l.replace(':', ' ').split()
+            if tokens[0] == 'NumNonRectangularNodes':
+                continue
+
+            name, num_shapes = tokens[0], int(tokens[1])
+            if name not in self.node_index:
+                sys.stderr.write("Error: invalid node %s in %s.\n"
+                                 % (name, file_name))
+                raise SystemExit(-1)
+
+            shapes = list()
+            for i in range(num_shapes):
+                tokens = next(lines_iter).split()
+                shapes.append(tuple(float(t) for t in tokens[1:5]))
+            self.shapes[name] = shapes
+
+
+    def read_route(self, file_name):
+        lines = read_lines(file_name)
+        route = BookshelfRoute()
+
+        def values(line, dtype=np.int64):
+            return np.array(line.split(':')[1].split(), dtype=dtype)
+
+        lines_iter = iter(lines[1:])    # Skip the first line: route 1.0
+        for l in lines_iter:
+            key = l.split()[0]
+            if key == 'Grid':
+                route.grid_x, route.grid_y, route.num_layers = \
+                    [int(v) for v in values(l)]
+            elif key == 'VerticalCapacity':
+                route.v_capacity = values(l)
+            elif key == 'HorizontalCapacity':
+                route.h_capacity = values(l)
+            elif key == 'MinWireWidth':
+                route.min_width = values(l)
+            elif key == 'MinWireSpacing':
+                route.min_spacing = values(l)
+            elif key == 'ViaSpacing':
+                route.via_spacing = values(l)
+            elif key == 'GridOrigin':
+                route.origin_x, route.origin_y = values(l, np.float64)
+            elif key == 'TileSize':
+                route.tile_width, route.tile_height = values(l, np.float64)
+            elif key == 'BlockagePorosity':
+                route.blockage_porosity = float(values(l, np.float64)[0])
+            elif key == 'NumNiTerminals':
+                for i in range(int(values(l)[0])):
+                    tokens = next(lines_iter).split()
+                    route.ni_terminal_layers[tokens[0]] = int(tokens[1])
+            elif key == 'NumBlockageNodes':
+                for i in range(int(values(l)[0])):
+                    tokens = next(lines_iter).split()
+                    # name num_layers layer1 layer2 ...
+                    route.blockages[tokens[0]] = \
+                        [int(t) for t in tokens[2:2 + int(tokens[1])]]
+
+        self.route = route
+
+
+    def write_pl(self, file_name):
+        """ Write node locations (all nodes in the N orientation). """
+        suffix = np.full(self.get_node_count(), '', dtype=object)
+        suffix[self.node_fixed] = ' /FIXED'
+        suffix[self.node_type == TERMINAL_NI] = ' /FIXED_NI'
+
+        with compressed_io.open_file(file_name, 'w') as f:
+            f.write('UCLA pl 1.0\n\n')
+            f.writelines("%s\t%.15g\t%.15g\t: N%s\n" % t
+                         for t in zip(self.node_names, self.node_x,
+                                      self.node_y, suffix))
+
+
+    def get_pin_xy(self):
+        """ Return pin locations (node center + pin offset). """
+        node = self.pin_node
+        x = self.node_x[node] + 0.5 * self.node_width[node] + self.pin_dx
+        y = self.node_y[node] + 0.5 * self.node_height[node] + self.pin_dy
+        return x, y
+
+
+    def get_place_region(self):
+        """ Return (llx, lly, urx, ury) covered by the rows. """
+        urx = self.row_x + self.row_num_sites * self.row_site_spacing
+        ury = self.row_y + self.row_height
+        return (self.row_x.min(), self.row_y.min(), urx.max(), ury.max())
+
+
+    def print_stats(self):
+        print ("==================================================")
+        print ("Number of nodes    : %d" % (self.get_node_count()))
+        print ("Number of terminals: %d" % (self.num_terminals))
+        if self.net_start is not None:
+            print ("Number of nets     : %d" % (self.get_net_count()))
+            print ("Number of pins     : %d" % (len(self.pin_node)))
+        if self.row_y is not None:
+            print ("Number of rows     : %d" % (len(self.row_y)))
+        print ("==================================================\n")
+
+
+if __name__ == '__main__':
+    """ Test """
+    def parse_cl():
+        import argparse
+        parser = argparse.ArgumentParser(description='A Bookshelf parser.')
+        parser.add_argument('-i', action="store", dest='src', required=True)
+        opt = parser.parse_args()
+        return opt
+
+    opt = parse_cl()
+
+    bookshelf = Bookshelf()
+    bookshelf.read_aux(opt.src)
+    bookshelf.print_stats()
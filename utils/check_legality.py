@@ -0,0 +1,193 @@
+"""
+    A placement legality checker for Bookshelf placements.
+
+    Checks row alignment, site alignment, out-of-region cells and overlaps.
+    Nodes are expanded into the rows they cover and swept per row in x
+    order, so the whole check is O(n log n).
+"""
+
+from __future__ import print_function, division
+
+import numpy as np
+
+import bookshelf
+
+EPSILON = 1e-6
+NUM_WORST = 10
+
+
+def get_row_intervals(bs, nodes, row_y, row_height):
+    """ Expand nodes into (node, row, lx, ux) for every row they overlap,
+    sorted by row and then by lx.
+    """
+    lly = bs.node_y[nodes]
+    ury = lly + bs.node_height[nodes]
+    first = np.searchsorted(row_y + row_height, lly + EPSILON, side='left')
+    last = np.searchsorted(row_y, ury - EPSILON, side='left')
+    count = np.maximum(last - first, 0)
+
+    k = np.repeat(np.arange(len(nodes)), count)
+    row = np.repeat(first, count) + np.arange(len(k)) \
+          - np.repeat(np.cumsum(count) - count, count)
+    node = nodes[k]
+    lx = bs.node_x[node]
+    ux = lx + bs.node_width[node]
+
+    order = np.lexsort((lx, row))
+    return node[order], row[order], lx[order], ux[order]
+
+
+def find_overlaps(bs, row_y, row_height):
+    """ Return overlapping node pairs (a, b) and their overlap areas.
+
+    In each row, the nodes overlapping a node j are the ones after it whose
+    lx is below its ux: a contiguous range of the lx-sorted row, so every
+    overlapping pair is found. Pairs of fixed nodes are not reported.
+    """
+    blocking = np.flatnonzero(bs.node_type != bookshelf.TERMINAL_NI)
+    node, row, lx, ux = get_row_intervals(bs, blocking, row_y, row_height)
+    if len(node) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), \
+               np.zeros(0)
+
+    # Rows are shifted apart so that one search works over all rows.
+    base = lx.min()
+    shift = row * (ux.max() - base + 1.0)
+    end = np.searchsorted(lx - base + shift, ux - EPSILON - base + shift,
+                          side='left')
+    count = np.maximum(end - np.arange(len(node)) - 1, 0)
+
+    j = np.repeat(np.arange(len(node)), count)
+    i = j + 1 + np.arange(len(j)) - np.repeat(np.cumsum(count) - count, count)
+    overlap = np.minimum(ux[i], ux[j]) - lx[i]
+
+    a, b = node[j], node[i]
+    r = row[i]
+    # Overlap in y within the row
+    y0 = np.maximum(np.maximum(bs.node_y[a], bs.node_y[b]), row_y[r])
+    y1 = np.minimum(np.minimum(bs.node_y[a] + bs.node_height[a],
+                               bs.node_y[b] + bs.node_height[b]),
+                    row_y[r] + row_height[r])
+    area = overlap * np.maximum(y1 - y0, 0)
+
+    movable = bs.node_type == bookshelf.MOVABLE
+    keep = movable[a] | movable[b]
+    a, b, area = a[keep], b[keep], area[keep]
+
+    # A multi-row pair may show up in several rows
+    pair = np.minimum(a, b) * bs.get_node_count() + np.maximum(a, b)
+    pairs, inverse = np.unique(pair, return_inverse=True)
+    area = np.bincount(inverse, weights=area, minlength=len(pairs))
+    return pairs // bs.get_node_count(), pairs % bs.get_node_count(), area
+
+
+def check_legality(bs):
+    """ Return a dict of violations: name -> (node indices, amounts). """
+    order = np.argsort(bs.row_y, kind='stable')
+    row_y, row_height = bs.row_y[order], bs.row_height[order]
+    row_x, row_site = bs.row_x[order], bs.row_site_spacing[order]
+    row_end = row_x + bs.row_num_sites[order] * row_site
+
+    cells = np.flatnonzero(bs.node_type == bookshelf.MOVABLE)
+    x, y = bs.node_x[cells], bs.node_y[cells]
+    w, h = bs.node_width[cells], bs.node_height[cells]
+
+    # Row alignment: the bottom edge on a row
+    row = np.clip(np.searchsorted(row_y, y + EPSILON, side='right') - 1,
+                  0, len(row_y) - 1)
+    row_offset = np.abs(y - row_y[row])
+    next_row = np.minimum(row + 1, len(row_y) - 1)
+    row_offset = np.minimum(row_offset, np.abs(row_y[next_row] - y))
+    not_row_aligned = row_offset > EPSILON
+
+    # Site alignment in the row
+    sites = (x - row_x[row]) / row_site[row]
+    site_offset = np.abs(sites - np.rint(sites)) * row_site[row]
+    not_site_aligned = ~not_row_aligned & (site_offset > EPSILON)
+
+    # Out of region: outside the core or beyond the subrow
+    llx, lly, urx, ury = bs.get_place_region()
+    out_core = np.maximum.reduce([llx - x, lly - y, x + w - urx, y + h - ury,
+                                  np.zeros(len(x))])
+    out_row = np.maximum(np.maximum(row_x[row] - x, x + w - row_end[row]), 0)
+    out_distance = np.where(not_row_aligned, out_core,
+                            np.maximum(out_core, out_row))
+    out_of_region = out_distance > EPSILON
+
+    a, b, area = find_overlaps(bs, row_y, row_height)
+
+    return {'row'     : (cells[not_row_aligned], row_offset[not_row_aligned]),
+            'site'    : (cells[not_site_aligned], site_offset[not_site_aligned]),
+            'region'  : (cells[out_of_region], out_distance[out_of_region]),
+            'overlap' : ((a, b), area)}
+
+
+def print_report(bs, violations, num_worst=NUM_WORST):
+    names = bs.node_names
+    titles = (('row', 'Not row aligned'),
+              ('site', 'Not site aligned'),
+              ('region', 'Out of region'))
+
+    print ("==================================================")
+    print ("Number of cells    : %d"
+           % (np.count_nonzero(bs.node_type == bookshelf.MOVABLE)))
+    for key, title in titles:
+        print ("%-19s: %d" % (title, len(violations[key][0])))
+    (a, b), area = violations['overlap']
+    print ("Overlapping pairs  : %d" % (len(a)))
+    print ("Overlap area       : %.1f" % (area.sum()))
+    print ("==================================================")
+
+    for key, title in titles:
+        nodes, amount = violations[key]
+        if len(nodes) == 0:
+            continue
+        print ("\n%s (worst %d):" % (title, min(num_worst, len(nodes))))
+        for i in np.argsort(-amount, kind='stable')[:num_worst]:
+            print ("  %-30s %12.2f %12.2f  off by %.2f"
+                   % (names[nodes[i]], bs.node_x[nodes[i]], bs.node_y[nodes[i]],
+                      amount[i]))
+
+    if len(a) > 0:
+        print ("\nOverlaps (worst %d):" % (min(num_worst, len(a))))
+        for i in np.argsort(-area, kind='stable')[:num_worst]:
+            print ("  %-30s %-30s area %.2f" % (names[a[i]], names[b[i]], area[i]))
+
+
+def is_legal(violations):
+    return all(len(v[1]) == 0 for v in violations.values())
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Check the legality of a placement.')
+    parser.add_argument('--aux', action="store", dest='src_aux', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl', default=None,
+                        help="Placement (default: the .pl in the aux file)")
+    parser.add_argument('-n', action="store", type=int, dest='num_worst',
+                        default=NUM_WORST, help="Number of worst offenders.")
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    bs = bookshelf.Bookshelf()
+    bs.read_aux(opt.src_aux, read_files=False)
+    bs.read_nodes(bs.files['nodes'])
+    bs.read_scl(bs.files['scl'])
+    bs.read_pl(opt.src_pl if opt.src_pl is not None else bs.files['pl'])
+
+    violations = check_legality(bs)
+    print_report(bs, violations, opt.num_worst)
+
+    if not is_legal(violations):
+        print ("\nPlacement is NOT legal.")
+        raise SystemExit(1)
+    print ("\nPlacement is legal.")
@@ -0,0 +1,162 @@
+"""
+    Transparent compressed file I/O.
+
+    open_file picks the codec from the file extension (.gz, .bz2, and .zst
+    if the zstandard module is installed). Reads are streamed. Compressed
+    writes are buffered, and the compression runs in a background thread,
+    so the caller only formats text. A file that does not exist is looked
+    up with a compressed extension, so archived runs can be read in place.
+"""
+
+from __future__ import print_function, division
+import sys, os, io, gzip, bz2, threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zst')
+
+CHUNK_SIZE = 1 << 20    # Characters handed to the writer thread at a time
+QUEUE_SIZE = 8          # Chunks in flight before write() blocks
+GZIP_LEVEL = 6          # As gzip(1)
+
+
+def get_extension(file_name):
+    """ Return the compressed extension of a file name, or None. """
+    for ext in COMPRESSED_EXTENSIONS:
+        if file_name.endswith(ext):
+            return ext
+    return None
+
+
+def add_suffix(file_name, suffix):
+    """ Append suffix before the compressed extension, if any:
+    add_suffix('top.gz', '.nodes') is 'top.nodes.gz'.
+    """
+    ext = get_extension(file_name)
+    if ext is None:
+        return file_name + suffix
+    return file_name[:-len(ext)] + suffix + ext
+
+
+def strip_extension(file_name):
+    """ Return file_name without its compressed extension. """
+    ext = get_extension(file_name)
+    return file_name if ext is None else file_name[:-len(ext)]
+
+
+def find_file(file_name):
+    """ Return file_name, or a compressed copy of it if only that exists. """
+    if os.path.exists(file_name) or get_extension(file_name) is not None:
+        return file_name
+    for ext in COMPRESSED_EXTENSIONS:
+        if os.path.exists(file_name + ext):
+            return file_name + ext
+    return file_name
+
+
+def open_text(file_name, mode):
+    """ Open a (compressed) text file in this thread. """
+    ext = get_extension(file_name)
+    if ext == '.gz':
+        return gzip.open(file_name, mode + 't', compresslevel=GZIP_LEVEL)
+    elif ext == '.bz2':
+        return bz2.open(file_name, mode + 't')
+    elif ext == '.zst':
+        if zstandard is None:
+            sys.stderr.write("Error: %s needs the zstandard module.\n"
+                             % (file_name))
+            raise SystemExit(-1)
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                         open(file_name, 'rb'), closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(
+                         open(file_name, mode + 'b'), closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    else:
+        return open(file_name, mode)
+
+
+class BackgroundWriter(object):
+    """ A text file writer that compresses in a background thread. """
+    def __init__(self, file_name, mode='w'):
+        self.file_name = file_name
+        self.f = open_text(file_name, mode)
+        self.chunks, self.size = list(), 0
+        self.error = None
+
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is None:
+                try:
+                    self.f.write(data)
+                except Exception as e:
+                    self.error = e
+
+
+    def write(self, s):
+        self.chunks.append(s)
+        self.size += len(s)
+        if self.size >= CHUNK_SIZE:
+            self.flush()
+
+
+    def writelines(self, lines):
+        for s in lines:
+            self.write(s)
+
+
+    def flush(self):
+        if self.chunks:
+            self.queue.put(''.join(self.chunks))
+            self.chunks, self.size = list(), 0
+
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self.f.close()
+        if self.error is not None:
+            raise self.error
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_file(file_name, mode='r'):
+    """ Open a text file for reading ('r'), writing ('w') or appending ('a').
+
+    .gz, .bz2 and .zst files are decompressed or compressed on the fly.
+    """
+    if mode == 'r':
+        return open_text(find_file(file_name), 'r')
+    elif get_extension(file_name) is None:
+        return open(file_name, mode)
+    else:
+        return BackgroundWriter(file_name, mode)
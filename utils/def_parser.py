@@ -9,6 +9,8 @@ __date__ = "07/24/2016"
 from time import gmtime, strftime
 import sys
 
+import compressed_io
+
 __def_row_name__ = 'core_SITE_ROW'
 __port_layer__ = 'metal3'
 __big_block_prefix__ = 'BLK_'
@@ -41,7 +43,7 @@ class Def(object):
         """ Read def and make a list of rows, components and pins """
 
         self.file_name = file_name
-        with open(file_name, 'r') as f:
+        with compressed_io.open_file(file_name) as f:
             lines = [l for l in (line.strip() for line in f) if l]
         lines_iter = iter(lines)
 
@@ -166,7 +168,7 @@ class Def(object):
 
 
     def write_def(self, file_name="out.def"):
-        with open(file_name, 'w') as f:
+        with compressed_io.open_file(file_name, 'w') as f:
             f.write("# Generated by def_parser.py, %s\n\n"
                     % (strftime("%Y-%m-%d %H:%M:%S", gmtime())))
             f.write("VERSION %s ;\n" % (self.version))
@@ -235,25 +237,19 @@ class DefRow(object):
         self.dx, self.dy = dx, dy
 
 
-    def get_bookshelf_row_string(self, the_lef=None):
-        if the_lef is None:
-            sys.stderr.write('(E) get_bookshelf_row_string: the_lef is not given.\n')
+    def get_bookshelf_row_string(self, units=None):
+        """ Return the row in scl format; units is a TechUnits. """
+        if units is None:
+            sys.stderr.write('(E) get_bookshelf_row_string: units are not given.\n')
             raise SystemExit(-1)
 
-        # Scale factors to make width/height be the number of metal tracks
-        # These values are assigned in parse_lef function
-        width_divider  = the_lef.metal_layer_dict[the_lef.m2_layer_name]
-        height_divider = the_lef.metal_layer_dict[the_lef.m1_layer_name]
-
-        x_divisor = width_divider * the_lef.units_distance_microns
-        y_divisor = height_divider * the_lef.units_distance_microns
-
-        coordinate = round(self.y / y_divisor)
-        site_height  = the_lef.site_height / height_divider
-        site_width   = the_lef.site_width / width_divider
-        site_spacing = self.dx / x_divisor
+        # Width/height in metal tracks
+        coordinate = round(self.y / units.y_dbu)
+        site_height  = units.site_height
+        site_width   = units.site_width
+        site_spacing = self.dx / units.x_dbu
         assert site_width == site_spacing
-        subrow_origin = round(self.x / x_divisor)
+        subrow_origin = round(self.x / units.x_dbu)
         num_sites = self.m
 
         return \
@@ -0,0 +1,267 @@
+"""
+    Incremental DEF update.
+
+    A DefIndex holds the byte range, master and placement of every record in
+    the COMPONENTS section of a DEF file. patch_def writes a copy of the file
+    in which only the records of changed components are rewritten; all
+    other bytes are copied through unchanged, in large blocks.
+"""
+
+from __future__ import print_function, division
+import sys, os, re, importlib
+
+import compressed_io
+import def_parser
+
+COPY_CHUNK = 1 << 20
+
+MASTER_RE = re.compile(br'^(\s*-\s+\S+\s+)(\S+)')
+PLACEMENT_RE = re.compile(br'\+\s*(PLACED|FIXED)\s*\(\s*(-?[\d.]+)\s+(-?[\d.]+)\s*\)\s*(\S+)')
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description="Update the components of a DEF file in place. "
+                            "Changes are given as a list, or derived from a "
+                            "netlist and a Bookshelf placement.")
+    parser.add_argument('--def', action="store", dest='src_def', required=True)
+    parser.add_argument('--def_out', action="store", dest='dest_def', required=True)
+    parser.add_argument('--changes', action="store", dest='src_changes',
+                        help="Lines of: name master x y [orient [PLACED|FIXED]], "
+                             "in DEF units")
+    parser.add_argument('--verilog', action="store", dest='src_v')
+    parser.add_argument('--pl', action="store", dest='src_pl')
+    parser.add_argument('--lef', action="store", dest='src_lef')
+
+    opt = parser.parse_args()
+
+    if opt.src_changes is None and None in (opt.src_v, opt.src_pl, opt.src_lef):
+        parser.error("Either --changes or all of --verilog, --pl and --lef "
+                     "are required.")
+
+    return opt
+
+
+class DefIndex(object):
+    """ Byte ranges and placements of the COMPONENTS records of a DEF file. """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.header = None          # byte range of the 'COMPONENTS n ;' line
+        self.end = None             # offset of the 'END COMPONENTS' line
+        self.names = list()
+        self.ranges = list()        # (begin, end) of each record
+        self.masters = list()
+        self.placements = list()    # (is_fixed, x, y, orient), or None
+        self.index = dict()         # name : record id
+
+        self.read()
+
+
+    def read(self):
+        if compressed_io.get_extension(self.file_name) is not None:
+            sys.stderr.write("Error: %s must be uncompressed to be patched.\n"
+                             % (self.file_name))
+            raise SystemExit(-1)
+
+        with open(self.file_name, 'rb') as f:
+            offset = 0
+            lines = iter(f)
+            for line in lines:
+                if line.split(None, 1)[:1] == [b'COMPONENTS']:
+                    self.header = (offset, offset + len(line))
+                    offset += len(line)
+                    break
+                offset += len(line)
+            else:
+                sys.stderr.write("Error: no COMPONENTS in %s.\n" % (self.file_name))
+                raise SystemExit(-1)
+
+            record, begin = list(), None
+            for line in lines:
+                tokens = line.split()
+                if len(tokens) == 0:
+                    offset += len(line)
+                    continue
+                if begin is None:
+                    if tokens[0] == b'END' and tokens[1:2] == [b'COMPONENTS']:
+                        self.end = offset
+                        break
+                    begin = offset
+                record.append(line)
+                offset += len(line)
+
+                if line.rstrip().endswith(b';'):
+                    self.add_record(b''.join(record), begin, offset)
+                    record, begin = list(), None
+
+        if self.end is None:
+            sys.stderr.write("Error: no END COMPONENTS in %s.\n" % (self.file_name))
+            raise SystemExit(-1)
+
+
+    def add_record(self, record, begin, end):
+        # - name master ...
+        tokens = record.split(None, 3)
+        name, master = tokens[1].decode(), tokens[2].decode()
+
+        placement = None
+        m = PLACEMENT_RE.search(record)
+        if m is not None:
+            placement = (m.group(1) == b'FIXED', float(m.group(2)),
+                         float(m.group(3)), m.group(4).decode())
+
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.ranges.append((begin, end))
+        self.masters.append(master)
+        self.placements.append(placement)
+
+
+    def get_component_count(self):
+        return len(self.names)
+
+
+    def get_changes(self, components):
+        """ Return the DefComponents whose master or placement differ from
+        the indexed ones (new components included).
+        """
+        changes = list()
+        for c in components:
+            i = self.index.get(c.name)
+            if i is None or self.masters[i] != c.gate_type \
+               or self.placements[i] != (c.is_fixed, float(int(c.x)),
+                                         float(int(c.y)), c.orient):
+                changes.append(c)
+        return changes
+
+
+def format_record(record, component):
+    """ Rewrite the master and placement of a record, keeping its layout and
+    any other attributes.
+    """
+    c = component
+    record = MASTER_RE.sub(lambda m: m.group(1) + c.gate_type.encode(), record,
+                           count=1)
+
+    placement = ('+ %s ( %d %d ) %s' % ('FIXED' if c.is_fixed else 'PLACED',
+                                        c.x, c.y, c.orient)).encode()
+    record, num = PLACEMENT_RE.subn(lambda m: placement, record, count=1)
+    if num == 0:    # Unplaced: add the placement before the ';'
+        end = record.rindex(b';')
+        record = record[:end].rstrip() + b' ' + placement + b' ' + record[end:]
+    return record
+
+
+def copy_range(src, dest, begin, end):
+    src.seek(begin)
+    size = end - begin
+    while size > 0:
+        data = src.read(min(size, COPY_CHUNK))
+        if not data:
+            break
+        dest.write(data)
+        size -= len(data)
+
+
+def patch_def(index, dest_def, changes):
+    """ Write index.file_name to dest_def with the changed DefComponents.
+    Components that are not in the index are added at the end of the
+    section. Return the number of rewritten and added records.
+    """
+    updates, additions = list(), list()
+    for c in changes:
+        i = index.index.get(c.name)
+        if i is None:
+            additions.append(c)
+        else:
+            updates.append((index.ranges[i], c))
+    updates.sort(key=lambda u: u[0])
+
+    with open(index.file_name, 'rb') as src, open(dest_def, 'wb') as dest:
+        pos = 0
+        if len(additions) > 0:
+            # New component count
+            begin, end = index.header
+            copy_range(src, dest, 0, begin)
+            src.seek(begin)
+            line = src.read(end - begin)
+            count = index.get_component_count() + len(additions)
+            dest.write(re.sub(br'\d+', str(count).encode(), line, count=1))
+            pos = end
+
+        for (begin, end), c in updates:
+            copy_range(src, dest, pos, begin)
+            src.seek(begin)
+            dest.write(format_record(src.read(end - begin), c))
+            pos = end
+
+        copy_range(src, dest, pos, index.end)
+        for c in additions:
+            dest.write(("%s\n" % (c)).encode())
+        copy_range(src, dest, index.end, os.path.getsize(index.file_name))
+
+    return len(updates), len(additions)
+
+
+def read_changes(file_name):
+    """ DefComponents of a change list. """
+    changes = list()
+    with compressed_io.open_file(file_name) as f:
+        for line in f:
+            tokens = line.split()
+            if len(tokens) == 0 or tokens[0].startswith('#'):
+                continue
+            if len(tokens) < 4:
+                sys.stderr.write("Error: invalid change in %s: %s\n"
+                                 % (file_name, line.strip()))
+                raise SystemExit(-1)
+            orient = tokens[4] if len(tokens) > 4 else 'N'
+            is_fixed = len(tokens) > 5 and tokens[5] == 'FIXED'
+            changes.append(def_parser.DefComponent(tokens[0], tokens[1], is_fixed,
+                                                   float(tokens[2]),
+                                                   float(tokens[3]), orient))
+    return changes
+
+
+def get_placement_changes(index, src_v, src_pl, src_lef):
+    """ Changes of the gates of a netlist placed at a Bookshelf placement. """
+    import verilog_parser
+    import lef_parser
+    write_def = importlib.import_module('310_write_def')
+
+    the_lef = lef_parser.Lef()
+    the_lef.read_lef(src_lef)
+    the_lef.m1_layer_name = 'metal1'
+    the_lef.m2_layer_name = 'metal2'
+
+    the_verilog = verilog_parser.Module()
+    the_verilog.read_verilog(src_v)
+
+    pl = write_def.parse_pl(src_pl)
+    components = write_def.get_placed_components(the_lef, the_verilog, pl)
+    return index.get_changes(components)
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    index = DefIndex(opt.src_def)
+    if opt.src_changes is not None:
+        changes = read_changes(opt.src_changes)
+    else:
+        changes = get_placement_changes(index, opt.src_v, opt.src_pl, opt.src_lef)
+
+    num_updated, num_added = patch_def(index, opt.dest_def, changes)
+
+    print ("==================================================")
+    print ("Source DEF         : %s" % (opt.src_def))
+    print ("Output DEF         : %s" % (opt.dest_def))
+    print ("Components         : %d" % (index.get_component_count()))
+    print ("Updated components : %d" % (num_updated))
+    print ("Added components   : %d" % (num_added))
+    print ("==================================================")
@@ -0,0 +1,102 @@
+"""
+    An external merge sort for text records.
+
+    A record is a line whose sort key is a fixed-width prefix, so plain
+    string order is record order. Records are buffered up to a memory
+    budget, spilled to sorted run files, and merged lazily when read back.
+"""
+
+from __future__ import print_function, division
+import os, heapq, shutil, tempfile
+
+MAX_FAN_IN = 256        # Runs merged at a time
+RECORD_OVERHEAD = 64    # Bytes per buffered record besides its characters
+
+
+class ExternalSorter(object):
+    def __init__(self, mem_budget, tmp_dir=None):
+        self.mem_budget = mem_budget    # in bytes
+        self.tmp_dir = tmp_dir
+        self.run_dir = None
+        self.runs = list()              # sorted run files
+        self.num_runs = 0               # runs written, including merged ones
+        self.buffer, self.size = list(), 0
+        self.count = 0
+
+
+    def add(self, record):
+        """ Add a record (a string ending with a newline). """
+        self.buffer.append(record)
+        self.size += len(record) + RECORD_OVERHEAD
+        self.count += 1
+        if self.size >= self.mem_budget:
+            self.spill()
+
+
+    def spill(self):
+        if len(self.buffer) == 0:
+            return
+        self.buffer.sort()
+        self.runs.append(self.write_run(self.buffer))
+        self.buffer, self.size = list(), 0
+
+
+    def write_run(self, records):
+        if self.run_dir is None:
+            self.run_dir = tempfile.mkdtemp(prefix='sort_', dir=self.tmp_dir)
+        file_name = os.path.join(self.run_dir, 'run%d' % (self.num_runs))
+        self.num_runs += 1
+        with open(file_name, 'w') as f:
+            f.writelines(records)
+        return file_name
+
+
+    def merge_runs(self, runs):
+        """ Merge run files into a new one. """
+        files = [open(r) for r in runs]
+        try:
+            merged = self.write_run(heapq.merge(*files))
+        finally:
+            for f in files:
+                f.close()
+        for r in runs:
+            os.remove(r)
+        return merged
+
+
+    def __iter__(self):
+        """ Yield all records in order. """
+        if len(self.runs) == 0:     # Everything fit in the budget
+            self.buffer.sort()
+            for record in self.buffer:
+                yield record
+            return
+
+        self.spill()
+        while len(self.runs) > MAX_FAN_IN:
+            self.runs = self.runs[MAX_FAN_IN:] \
+                        + [self.merge_runs(self.runs[:MAX_FAN_IN])]
+
+        files = [open(r) for r in self.runs]
+        try:
+            for record in heapq.merge(*files):
+                yield record
+        finally:
+            for f in files:
+                f.close()
+
+
+    def close(self):
+        """ Remove the run files. """
+        if self.run_dir is not None:
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+            self.run_dir = None
+        self.runs, self.buffer, self.size = list(), list(), 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
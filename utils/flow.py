@@ -0,0 +1,347 @@
+"""
+    A flow driver that runs the Python steps of the flow in one process.
+
+    Verilog, LEF and DEF files are parsed once and shared by the steps that
+    read them: 200 (Bookshelf), 310 and 430 (placed DEF), 400 (sizer input),
+    410 (nodes after sizing) and 420 (legalization). External tools run as
+    subprocesses in between. Inputs and outputs are in the stage
+    directories, as with the run_batch scripts.
+"""
+
+from __future__ import print_function, division
+import sys, os, copy, shutil, subprocess, importlib
+from time import time
+
+import verilog_parser
+import lef_parser
+import def_parser
+import legalizer
+
+gen_bookshelf = importlib.import_module('200_gen_bookshelf')
+write_def = importlib.import_module('310_write_def')
+sizer_input = importlib.import_module('400_generate_sizer_input')
+sizer_nodes = importlib.import_module('410_create_bookshelf_nodes_after_sizing')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_PORT = 'iccad_clk'
+CLOCK_PERIOD = 50000.0
+SIZER_LIB = os.path.join('bench', 'techlib', 'open_eda_Late.lib')
+
+STEPS = ('200', '300', '310', '400', '410', '420', '430')
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Run the Python steps of the flow in one process.')
+    parser.add_argument('--bench', action="store", dest='bench', required=True)
+    parser.add_argument('--script', action="store", dest='script', required=True)
+    parser.add_argument('--placer', action="store", dest='placer', required=True)
+    parser.add_argument('--sizer', action="store", dest='sizer', default='USizer')
+    parser.add_argument('--target_density', action="store", type=float,
+                        dest='target_density', default=0.85)
+    parser.add_argument('--legalizer', action="store", dest='legalizer',
+                        default='abacus',
+                        choices=('abacus', 'tetris', 'FastPlace'))
+    parser.add_argument('--steps', action="store", dest='steps', nargs='+',
+                        default=list(STEPS), choices=STEPS,
+                        help="Steps to run (default: all). 400 needs the "
+                             "SPEF of 320_timing.")
+    parser.add_argument('--root', action="store", dest='root_dir',
+                        default=ROOT_DIR, help="Flow directory")
+    parser.add_argument('-j', action="store", type=int, dest='num_workers',
+                        default=1, help="Number of verilog parsing processes")
+
+    return parser.parse_args()
+
+
+def make_dir(path):
+    """ Create an empty directory. """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+
+def link(src, dest):
+    if os.path.lexists(dest):
+        os.remove(dest)
+    os.symlink(os.path.abspath(src), dest)
+
+
+def check_file(file_name, step):
+    if not os.path.exists(file_name):
+        sys.stderr.write("Error: %s was not generated (step %s).\n"
+                         % (file_name, step))
+        raise SystemExit(-1)
+
+
+class DesignCache(object):
+    """ Parsed design files by path; a file is parsed again if it changes. """
+    def __init__(self, num_workers=1):
+        self.num_workers = num_workers
+        self.designs = dict()       # (kind, path) : ((mtime, size), design)
+        self.num_parsed, self.num_hits = 0, 0
+
+
+    def get(self, kind, file_name, reader):
+        path = os.path.realpath(file_name)
+        st = os.stat(path)
+        stamp = (st.st_mtime, st.st_size)
+
+        cached = self.designs.get((kind, path))
+        if cached is not None and cached[0] == stamp:
+            self.num_hits += 1
+            return cached[1]
+
+        print ("Parsing %s: %s" % (kind, file_name))
+        design = reader(path)
+        self.designs[(kind, path)] = (stamp, design)
+        self.num_parsed += 1
+        return design
+
+
+    def get_verilog(self, file_name):
+        def read(path):
+            module = verilog_parser.Module()
+            module.read_verilog(path, self.num_workers)
+            module.instances    # Build the gates once, before the module is shared
+            module.clock_port = CLOCK_PORT
+            module.print_stats()
+            return module
+        return self.get('verilog', file_name, read)
+
+
+    def get_lef(self, file_name):
+        def read(path):
+            the_lef = lef_parser.Lef()
+            the_lef.set_m1_layer_name(gen_bookshelf.M1_LAYER_NAME)
+            the_lef.set_m2_layer_name(gen_bookshelf.M2_LAYER_NAME)
+            the_lef.read_lef(path)
+            the_lef.print_stats()
+            return the_lef
+        return self.get('LEF', file_name, read)
+
+
+    def get_def(self, file_name):
+        def read(path):
+            the_def = def_parser.Def()
+            the_def.read_def(path)
+            the_def.print_stats()
+            return the_def
+        return self.get('DEF', file_name, read)
+
+
+class Flow(object):
+    """ One design (bench, synthesis script, placer, sizer) in the flow. """
+    def __init__(self, bench, script, placer, sizer='USizer',
+                 target_density=0.85, legalizer='abacus', root_dir=ROOT_DIR,
+                 cache=None):
+        self.bench = bench
+        self.placer = placer
+        self.sizer = sizer
+        self.target_density = target_density
+        self.legalizer = legalizer
+        self.root_dir = os.path.abspath(root_dir)
+        self.cache = cache if cache is not None else DesignCache()
+
+        self.base_name = '%s_%s' % (bench, script)
+        self.place_name = '%s_%s' % (self.base_name, placer)
+        self.sizing_name = '%s_%s' % (self.place_name, sizer)
+
+        # Inputs
+        self.verilog = self.path('100_logic_synthesis', self.base_name,
+                                 self.base_name + '_final.v')
+        self.lef = self.path('bench', bench, bench + '.lef')
+        self.def_file = self.path('bench', bench, bench + '.def')
+        self.sdc = self.path('bench', bench, bench + '.sdc')
+
+        # Outputs of each step
+        self.bookshelf_dir = self.path('200_floorplanning',
+                                       'bookshelf-' + self.base_name)
+        self.solution_pl = self.path('300_placement', self.place_name,
+                                     bench + '_solution.pl')
+        self.placed_def = self.path('310_write_def', self.place_name + '.def')
+        self.spef = self.path('320_timing', self.place_name, 'out', bench + '.spef')
+        self.sizing_dir = self.path('400_gate_sizing', self.sizing_name)
+        self.sized_verilog = os.path.join(self.sizing_dir, self.sizing_name + '.v')
+        self.sized_nodes = self.path('410_write_bookshelf', self.sizing_name + '.nodes')
+        self.legalized_pl = self.path('420_legalization', self.sizing_name + '_FP',
+                                      bench + '_FP_dp.pl')
+        self.sized_def = self.path('430_write_def', self.sizing_name + '_FP',
+                                   self.sizing_name + '.def')
+
+
+    def path(self, *names):
+        return os.path.join(self.root_dir, *names)
+
+
+    def get_bookshelf(self, ext):
+        return os.path.join(self.bookshelf_dir, '%s.%s' % (self.bench, ext))
+
+
+    def run(self, cmd, cwd, log=None):
+        """ Run an external command, echoing (and logging) its output. """
+        print (' '.join(cmd))
+        sys.stdout.flush()
+
+        f_log = open(log, 'w') if log is not None else None
+        try:
+            proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    universal_newlines=True)
+            for line in proc.stdout:
+                sys.stdout.write(line)
+                if f_log is not None:
+                    f_log.write(line)
+            ret = proc.wait()
+        finally:
+            if f_log is not None:
+                f_log.close()
+
+        if ret != 0:
+            sys.stderr.write("Warning: %s exited with %d.\n" % (cmd[0], ret))
+        return ret
+
+
+    def floorplan(self):
+        """ 200: Bookshelf files of the synthesized netlist. """
+        make_dir(self.bookshelf_dir)
+
+        # The nets writer removes the clock port from the inputs; the cached
+        # module keeps its own lists.
+        cached = self.cache.get_verilog(self.verilog)
+        module = copy.copy(cached)
+        module.inputs = list(cached.inputs)
+        module.instances = list(cached.instances)
+
+        gen_bookshelf.write_bookshelf(os.path.join(self.bookshelf_dir, self.bench),
+                                      module, self.cache.get_lef(self.lef),
+                                      self.cache.get_def(self.def_file),
+                                      True, CLOCK_PORT)
+
+
+    def place(self):
+        """ 300: run_place.sh of the placement stage. """
+        stage_dir = self.path('300_placement')
+        self.run(['./run_place.sh', self.bench,
+                  os.path.relpath(self.bookshelf_dir, stage_dir), self.placer,
+                  str(self.target_density), self.place_name], stage_dir)
+        check_file(self.solution_pl, '300')
+
+
+    def write_placed_def(self):
+        """ 310: DEF of the placement. """
+        write_def.write_placed_def(self.placed_def, self.cache.get_lef(self.lef),
+                                   self.cache.get_def(self.def_file),
+                                   self.cache.get_verilog(self.verilog),
+                                   self.solution_pl)
+
+
+    def size(self):
+        """ 400: sizer input and the sizer, in its own directory. """
+        if self.sizer != 'USizer':
+            sys.stderr.write("Error: unsupported sizer %s.\n" % (self.sizer))
+            raise SystemExit(-1)
+        check_file(self.spef, '320')
+        make_dir(self.sizing_dir)
+
+        sizer_v = self.base_name + '_sizer_input.v'
+        sizer_input.write_sizer_input(self.cache.get_verilog(self.verilog),
+                                      os.path.join(self.sizing_dir, sizer_v),
+                                      os.path.join(self.sizing_dir,
+                                                   self.base_name + '_sizer_input.sdc'),
+                                      CLOCK_PORT, CLOCK_PERIOD)
+
+        # The sizer takes the original SDC
+        sdc, spef, lib = self.bench + '.sdc', self.bench + '.spef', 'cell.lib'
+        shutil.copy(self.sdc, os.path.join(self.sizing_dir, sdc))
+        link(self.spef, os.path.join(self.sizing_dir, spef))
+        link(self.path(SIZER_LIB), os.path.join(self.sizing_dir, lib))
+        with open(os.path.join(self.sizing_dir, 'usizer.config'), 'w') as f:
+            f.write("%s %s %s %s\n" % (sizer_v, sdc, spef, lib))
+
+        self.run([self.path('bin', 'usizer2013'), '-config', 'usizer.config',
+                  'open-eda'], self.sizing_dir,
+                 os.path.join(self.sizing_dir, self.sizing_name + '.log.txt'))
+
+        check_file(os.path.join(self.sizing_dir, 'usizer_usizer.v'), '400')
+        os.rename(os.path.join(self.sizing_dir, 'usizer_usizer.v'), self.sized_verilog)
+
+
+    def update_nodes(self):
+        """ 410: Bookshelf nodes with the sized cell widths. """
+        sizer_nodes.write_nodes_after_sizing(self.get_bookshelf('nodes'),
+                                             self.cache.get_verilog(self.sized_verilog),
+                                             self.cache.get_lef(self.lef),
+                                             self.sized_nodes)
+
+
+    def legalize(self):
+        """ 420: legalize the placement after sizing. """
+        out_dir = os.path.dirname(self.legalized_pl)
+        make_dir(out_dir)
+
+        if self.legalizer == 'FastPlace':
+            for ext in ('aux', 'nets', 'scl', 'shapes', 'wts'):
+                link(self.get_bookshelf(ext),
+                     os.path.join(out_dir, '%s.%s' % (self.bench, ext)))
+            link(self.solution_pl, os.path.join(out_dir, self.bench + '.pl'))
+            link(self.sized_nodes, os.path.join(out_dir, self.bench + '.nodes'))
+            self.run([self.path('bin', 'FastPlace3.0_Linux64_DP'), '-legalize',
+                      '-fast', '.', self.bench + '.aux', '.', self.bench + '.pl'],
+                     out_dir,
+                     os.path.join(out_dir, self.sizing_name + '.log.txt'))
+        else:
+            legalizer.run_legalizer(self.sized_nodes, self.solution_pl,
+                                    self.get_bookshelf('scl'), self.legalized_pl,
+                                    self.legalizer, self.get_bookshelf('nodes'))
+        check_file(self.legalized_pl, '420')
+
+
+    def write_sized_def(self):
+        """ 430: DEF of the sized, legalized design. """
+        make_dir(os.path.dirname(self.sized_def))
+        write_def.write_placed_def(self.sized_def, self.cache.get_lef(self.lef),
+                                   self.cache.get_def(self.def_file),
+                                   self.cache.get_verilog(self.sized_verilog),
+                                   self.legalized_pl)
+
+
+    def run_steps(self, steps=STEPS):
+        """ Run the given steps in flow order, and report their run times. """
+        step_functions = {'200' : self.floorplan, '300' : self.place,
+                          '310' : self.write_placed_def, '400' : self.size,
+                          '410' : self.update_nodes, '420' : self.legalize,
+                          '430' : self.write_sized_def}
+
+        run_times = list()
+        for step in [s for s in STEPS if s in steps]:
+            print ("")
+            print ("==================================================")
+            print ("Step %s: %s" % (step, self.sizing_name))
+            print ("==================================================")
+            sys.stdout.flush()
+            start = time()
+            step_functions[step]()
+            run_times.append((step, time() - start))
+
+        print ("")
+        print ("==================================================")
+        for step, run_time in run_times:
+            print ("Step %-14s: %.2f s" % (step, run_time))
+        print ("Files parsed       : %d" % (self.cache.num_parsed))
+        print ("Parses saved       : %d" % (self.cache.num_hits))
+        print ("==================================================")
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    flow = Flow(opt.bench, opt.script, opt.placer, opt.sizer,
+                opt.target_density, opt.legalizer, opt.root_dir,
+                DesignCache(opt.num_workers))
+    flow.run_steps(opt.steps)
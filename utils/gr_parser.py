@@ -0,0 +1,307 @@
+"""
+    A global routing benchmark parser (ISPD'08 .gr and routing solutions).
+
+    Everything is kept in NumPy arrays so that evaluators can accumulate
+    tile edge usage without walking the routes one edge at a time.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import compressed_io
+import symbol_table
+
+
+def to_int_array(lines, num_cols):
+    """ Convert lines of integers, with () , - as separators, to an array. """
+    table = str.maketrans('(),-', '    ')
+    text = ' '.join(lines).translate(table)
+    return np.array(text.split(), dtype=np.int64).reshape(-1, num_cols)
+
+
+class GlobalRoutingGrid(object):
+    """ ISPD'08 global routing benchmark. """
+    def __init__(self):
+        self.file_name = None
+        self.grid_x, self.grid_y, self.num_layers = 0, 0, 0
+        self.v_capacity = None      # per layer
+        self.h_capacity = None      # per layer
+        self.min_width = None       # per layer
+        self.min_spacing = None     # per layer
+        self.via_spacing = None     # per layer
+        self.origin_x, self.origin_y = 0, 0
+        self.tile_width, self.tile_height = 1, 1
+
+        # Nets (pins of net i are pin_*[pin_start[i]:pin_start[i+1]])
+        # net_names and net_index are views of net_table
+        self.net_table = symbol_table.SymbolTable()
+        self.net_names = self.net_table.names
+        self.net_index = self.net_table.index   # name : index
+        self.net_ids = None
+        self.net_min_width = None
+        self.pin_start = None
+        self.pin_x, self.pin_y, self.pin_layer = None, None, None
+
+        # Capacity adjustments: (x1, y1, l1, x2, y2, l2, capacity)
+        # Layers are 0-based here.
+        self.adjustments = np.zeros((0, 7), dtype=np.int64)
+
+
+    def get_net_count(self):
+        return len(self.net_names)
+
+
+    def set_net_table(self, table):
+        self.net_table = table
+        self.net_names = table.names
+        self.net_index = table.index
+
+
+    def read_gr(self, file_name):
+        """ Read a .gr file. """
+
+        self.file_name = file_name
+        with compressed_io.open_file(file_name) as f:
+            lines = [l for l in (line.strip() for line in f) if l]
+        lines_iter = iter(lines)
+
+        def get_values(keyword):
+            line = next(lines_iter)
+            if not line.startswith(keyword):
+                sys.stderr.write("Error: '%s' expected in %s, but got '%s'.\n"
+                                 % (keyword, file_name, line))
+                raise SystemExit(-1)
+
+            values = np.array(line[len(keyword):].split(), dtype=np.int64)
+            if len(values) != self.num_layers:
+                sys.stderr.write("Error: %s has %d values (%d layers).\n"
+                                 % (keyword, len(values), self.num_layers))
+                raise SystemExit(-1)
+            return values
+
+        tokens = next(lines_iter).split()
+        assert tokens[0] == 'grid'
+        self.grid_x, self.grid_y, self.num_layers = [int(t) for t in tokens[1:4]]
+
+        self.v_capacity  = get_values('vertical capacity')
+        self.h_capacity  = get_values('horizontal capacity')
+        self.min_width   = get_values('minimum width')
+        self.min_spacing = get_values('minimum spacing')
+        self.via_spacing = get_values('via spacing')
+
+        tokens = next(lines_iter).split()
+        self.origin_x, self.origin_y = int(tokens[0]), int(tokens[1])
+        self.tile_width, self.tile_height = int(tokens[2]), int(tokens[3])
+
+        tokens = next(lines_iter).split()
+        assert tokens[0] == 'num' and tokens[1] == 'net'
+        num_nets = int(tokens[2])
+
+        # Net headers are parsed one by one; pin lines are converted in bulk.
+        net_ids = np.zeros(num_nets, dtype=np.int64)
+        net_min_width = np.zeros(num_nets, dtype=np.int64)
+        pin_start = np.zeros(num_nets + 1, dtype=np.int64)
+        net_names, pin_lines = list(), list()
+
+        offset = 8  # grid, 5 capacity/width lines, origin, num net
+        for i in range(num_nets):
+            tokens = lines[offset].split()
+            name, num_pins = tokens[0], int(tokens[2])
+            net_ids[i], net_min_width[i] = int(tokens[1]), int(tokens[3])
+
+            net_names.append(name)
+            pin_lines.extend(lines[offset + 1:offset + 1 + num_pins])
+            pin_start[i + 1] = pin_start[i] + num_pins
+            offset += num_pins + 1
+
+        self.set_net_table(symbol_table.get_unique_table(net_names, 'net', file_name))
+        self.net_ids = net_ids
+        self.net_min_width = net_min_width
+        self.pin_start = pin_start
+
+        pins = to_int_array(pin_lines, 3)
+        self.pin_x, self.pin_y = pins[:, 0], pins[:, 1]
+        self.pin_layer = pins[:, 2] - 1
+
+        if len(pins) > 0 and self.pin_layer.min() < 0:
+            sys.stderr.write("Error: layer must be non-zero positive.\n")
+            raise SystemExit(-1)
+
+        # Capacity adjustments
+        if offset < len(lines):
+            num_adjustments = int(lines[offset])
+            adjustments = to_int_array(
+                    lines[offset + 1:offset + 1 + num_adjustments], 7)
+            adjustments[:, 2] -= 1
+            adjustments[:, 5] -= 1
+            self.adjustments = adjustments
+
+
+    def print_stats(self):
+        print ("==================================================")
+        print ("GR benchmark       : %s" % (self.file_name))
+        print ("Grid               : %d x %d x %d"
+               % (self.grid_x, self.grid_y, self.num_layers))
+        print ("Tile size          : %d x %d" % (self.tile_width, self.tile_height))
+        print ("Number of nets     : %d" % (len(self.net_names)))
+        print ("Number of pins     : %d" % (len(self.pin_x)))
+        print ("Number of cap adj. : %d" % (len(self.adjustments)))
+        print ("==================================================\n")
+
+
+    def to_grid(self, x, y):
+        """ Real coordinates to tile indices (truncated toward zero). """
+        gx = np.trunc((x - self.origin_x) / self.tile_width).astype(np.int64)
+        gy = np.trunc((y - self.origin_y) / self.tile_height).astype(np.int64)
+        return gx, gy
+
+
+    def get_edge_capacity(self):
+        """ Return (h_cap, v_cap) tile edge capacities after adjustments.
+
+        h_cap[l, x, y] is the capacity of the edge (x, y) - (x+1, y) and
+        v_cap[l, x, y] is the capacity of the edge (x, y) - (x, y+1).
+        """
+        h_cap = np.empty((self.num_layers, self.grid_x - 1, self.grid_y),
+                         dtype=np.int64)
+        v_cap = np.empty((self.num_layers, self.grid_x, self.grid_y - 1),
+                         dtype=np.int64)
+        h_cap[:] = self.h_capacity[:, None, None]
+        v_cap[:] = self.v_capacity[:, None, None]
+
+        adj = self.adjustments
+        if len(adj) == 0:
+            return h_cap, v_cap
+
+        x1, y1, l1, x2, y2, l2, cap = adj.T
+        if np.any(l1 != l2) or np.any((x1 != x2) & (y1 != y2)) \
+           or np.any((x1 == x2) & (y1 == y2)):
+            sys.stderr.write("Error: invalid capacity adjustment.\n")
+            raise SystemExit(-1)
+
+        is_h = x1 != x2
+        if np.any(np.abs(x2 - x1)[is_h] != 1) or np.any(np.abs(y2 - y1)[~is_h] != 1):
+            sys.stderr.write("Error: capacity adjustment is not a unit edge.\n")
+            raise SystemExit(-1)
+
+        # Later lines win, as in the contest script.
+        h_cap[l1[is_h], np.minimum(x1, x2)[is_h], y1[is_h]] = cap[is_h]
+        v_cap[l1[~is_h], x1[~is_h], np.minimum(y1, y2)[~is_h]] = cap[~is_h]
+
+        return h_cap, v_cap
+
+
+class RouteSolution(object):
+    """ Global routing solution as segment arrays (in tile coordinates).
+
+    Segments are normalized so that (x1, y1, l1) <= (x2, y2, l2), and
+    seg_net holds the net index (in GlobalRoutingGrid) of each segment.
+    """
+    def __init__(self):
+        self.file_name = None
+        self.seg_net = None
+        self.x1, self.y1, self.l1 = None, None, None
+        self.x2, self.y2, self.l2 = None, None, None
+        self.routed = None      # per net flag
+
+
+    def read_route(self, file_name, the_gr, net_mask=None):
+        """ Read a routing solution.
+
+        If net_mask is given, segments of nets with a False flag are skipped
+        without being checked.
+        """
+        self.file_name = file_name
+        with compressed_io.open_file(file_name) as f:
+            lines = [l for l in (line.strip() for line in f) if l]
+
+        num_nets = the_gr.get_net_count()
+        seg_lines, seg_count, net_list = list(), list(), list()
+
+        lines_iter = iter(lines)
+        for line in lines_iter:
+            tokens = line.split()
+            try:
+                net = the_gr.net_index[tokens[0]]
+            except KeyError:
+                sys.stderr.write("Error: net %s not found.\n" % (tokens[0]))
+                raise SystemExit(-1)
+
+            skip = net_mask is not None and not net_mask[net]
+            count = 0
+            for line in lines_iter:
+                if line == '!':
+                    break
+                if not skip:
+                    seg_lines.append(line)
+                    count += 1
+
+            net_list.append(net)
+            seg_count.append(count)
+
+        segs = to_int_array(seg_lines, 6)
+        self.seg_net = np.repeat(np.array(net_list, dtype=np.int64),
+                                 np.array(seg_count, dtype=np.int64))
+
+        x1, y1 = the_gr.to_grid(segs[:, 0], segs[:, 1])
+        x2, y2 = the_gr.to_grid(segs[:, 3], segs[:, 4])
+        l1, l2 = segs[:, 2] - 1, segs[:, 5] - 1
+
+        dx, dy, dl = x1 != x2, y1 != y2, l1 != l2
+        num_dirs = dx.astype(int) + dy.astype(int) + dl.astype(int)
+        for mask, msg in ((num_dirs > 1, 'diagonal'), (num_dirs == 0, 'null')):
+            if np.any(mask):
+                net = self.seg_net[np.argmax(mask)]
+                sys.stderr.write("Error: net %s %s route.\n"
+                                 % (the_gr.net_names[net], msg))
+                raise SystemExit(-1)
+
+        self.x1, self.x2 = np.minimum(x1, x2), np.maximum(x1, x2)
+        self.y1, self.y2 = np.minimum(y1, y2), np.maximum(y1, y2)
+        self.l1, self.l2 = np.minimum(l1, l2), np.maximum(l1, l2)
+
+        out_of_grid = (self.x1 < 0) | (self.x2 >= the_gr.grid_x) \
+                      | (self.y1 < 0) | (self.y2 >= the_gr.grid_y) \
+                      | (self.l1 < 0) | (self.l2 >= the_gr.num_layers)
+        if np.any(out_of_grid):
+            net = self.seg_net[np.argmax(out_of_grid)]
+            sys.stderr.write("Error: net %s is routed out of the grid.\n"
+                             % (the_gr.net_names[net]))
+            raise SystemExit(-1)
+
+        self.routed = np.zeros(num_nets, dtype=bool)
+        self.routed[self.seg_net] = True
+
+
+    def get_segment_count(self):
+        return len(self.seg_net)
+
+
+    def expand_wires(self, horizontal):
+        """ Split horizontal (or vertical) wires into unit tile edges.
+
+        Return (net, layer, x, y) arrays, one entry per unit edge, where the
+        edge goes from (x, y) to (x+1, y) (or to (x, y+1)).
+        """
+        if horizontal:
+            mask = self.x1 != self.x2
+            length = (self.x2 - self.x1)[mask]
+        else:
+            mask = self.y1 != self.y2
+            length = (self.y2 - self.y1)[mask]
+
+        # Offsets 0, 1, ..., length-1 for every wire without a Python loop
+        seg = np.repeat(np.arange(len(length)), length)
+        start = np.cumsum(length) - length
+        step = np.arange(len(seg)) - np.repeat(start, length)
+
+        net = self.seg_net[mask][seg]
+        layer = self.l1[mask][seg]
+        x, y = self.x1[mask][seg], self.y1[mask][seg]
+        if horizontal:
+            x = x + step
+        else:
+            y = y + step
+        return net, layer, x, y
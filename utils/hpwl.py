@@ -0,0 +1,163 @@
+"""
+    A wirelength evaluator for Bookshelf placements (HPWL and RSMT estimate).
+
+    Pins are kept in net order (CSR), so per-net bounding boxes are segmented
+    reductions over the pin arrays.
+"""
+
+from __future__ import print_function, division
+
+import numpy as np
+
+import bookshelf
+import compressed_io
+
+# Nets up to this degree get a rectilinear MST in the RSMT estimate;
+# larger nets use the single trunk tree only.
+MAX_MST_DEGREE = 32
+
+
+def get_net_hpwl(bs, pin_x=None, pin_y=None):
+    """ Return the half perimeter wirelength of each net (0 if no pin). """
+    if pin_x is None:
+        pin_x, pin_y = bs.get_pin_xy()
+
+    degree = np.diff(bs.net_start)
+    hpwl = np.zeros(len(degree))
+    has_pins = degree > 0
+    s = bs.net_start[:-1][has_pins]
+    if len(s) > 0:
+        hpwl[has_pins] = np.maximum.reduceat(pin_x, s) - np.minimum.reduceat(pin_x, s) \
+                         + np.maximum.reduceat(pin_y, s) - np.minimum.reduceat(pin_y, s)
+    return hpwl
+
+
+def get_single_trunk_length(bs, pin_x, pin_y):
+    """ Length of the better of the horizontal and vertical single trunk
+    Steiner trees of each net (trunk at the median pin coordinate).
+    """
+    degree = np.diff(bs.net_start)
+    net = np.repeat(np.arange(len(degree)), degree)
+    lengths = list()
+    for trunk, branch in ((pin_x, pin_y), (pin_y, pin_x)):
+        # Sort pins by branch coordinate within each net to find medians
+        order = np.lexsort((branch, net))
+        has_pins = degree > 0
+        median_pin = order[(bs.net_start[:-1] + degree // 2)[has_pins]]
+        median = np.zeros(len(degree))
+        median[has_pins] = branch[median_pin]
+
+        span = np.zeros(len(degree))
+        s = bs.net_start[:-1][has_pins]
+        if len(s) > 0:
+            span[has_pins] = np.maximum.reduceat(trunk, s) \
+                             - np.minimum.reduceat(trunk, s)
+        branches = np.bincount(net, weights=np.abs(branch - median[net]),
+                               minlength=len(degree))
+        lengths.append(span + branches)
+    return np.minimum(lengths[0], lengths[1])
+
+
+def get_mst_length(bs, pin_x, pin_y, nets):
+    """ Rectilinear MST length of the given nets, which must all have the
+    same degree. Prim's algorithm runs on all of them at once.
+    """
+    degree = bs.net_start[nets[0] + 1] - bs.net_start[nets[0]]
+    pins = bs.net_start[nets][:, None] + np.arange(degree)
+    x, y = pin_x[pins], pin_y[pins]
+
+    rows = np.arange(len(nets))
+    in_tree = np.zeros(x.shape, dtype=bool)
+    in_tree[:, 0] = True
+    dist = np.abs(x - x[:, :1]) + np.abs(y - y[:, :1])
+    length = np.zeros(len(nets))
+    for i in range(degree - 1):
+        d = np.where(in_tree, np.inf, dist)
+        nearest = d.argmin(axis=1)
+        length += d[rows, nearest]
+        in_tree[rows, nearest] = True
+        dist = np.minimum(dist, np.abs(x - x[rows, nearest][:, None])
+                                + np.abs(y - y[rows, nearest][:, None]))
+    return length
+
+
+def get_net_rsmt(bs, pin_x=None, pin_y=None):
+    """ Return an estimate of the rectilinear Steiner minimal tree length of
+    each net.
+
+    Nets with up to three pins are exact (HPWL). Larger nets take the
+    shorter of the single trunk tree and, up to MAX_MST_DEGREE pins, the
+    rectilinear MST, so the estimate is an upper bound of the RSMT.
+    """
+    if pin_x is None:
+        pin_x, pin_y = bs.get_pin_xy()
+
+    rsmt = get_net_hpwl(bs, pin_x, pin_y)
+    degree = np.diff(bs.net_start)
+    large = degree > 3
+    if not np.any(large):
+        return rsmt
+
+    rsmt[large] = get_single_trunk_length(bs, pin_x, pin_y)[large]
+    for d in np.unique(degree[large & (degree <= MAX_MST_DEGREE)]):
+        nets = np.flatnonzero(degree == d)
+        rsmt[nets] = np.minimum(rsmt[nets], get_mst_length(bs, pin_x, pin_y, nets))
+    return rsmt
+
+
+def read_design(nodes, nets, pl):
+    bs = bookshelf.Bookshelf()
+    bs.read_nodes(nodes)
+    bs.read_pl(pl)
+    bs.read_nets(nets)
+    return bs
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Evaluate the wirelength of a placement.')
+    parser.add_argument('--aux', action="store", dest='src_aux', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl', default=None,
+                        help="Placement (default: the .pl in the aux file)")
+    parser.add_argument('--rsmt', action="store_true", dest='rsmt',
+                        help="Also estimate the Steiner tree wirelength.")
+    parser.add_argument('--per_net', action="store", dest='per_net', default=None,
+                        help="Write per-net wirelength to this file.")
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    bs = bookshelf.Bookshelf()
+    bs.read_aux(opt.src_aux, read_files=False)
+    src_pl = opt.src_pl if opt.src_pl is not None else bs.files['pl']
+    bs = read_design(bs.files['nodes'], bs.files['nets'], src_pl)
+
+    pin_x, pin_y = bs.get_pin_xy()
+    hpwl = get_net_hpwl(bs, pin_x, pin_y)
+    rsmt = get_net_rsmt(bs, pin_x, pin_y) if opt.rsmt else None
+
+    print ("==================================================")
+    print ("Placement          : %s" % (src_pl))
+    print ("Number of nets     : %d" % (bs.get_net_count()))
+    print ("Number of pins     : %d" % (len(bs.pin_node)))
+    print ("Total HPWL         : %.0f" % (hpwl.sum()))
+    if rsmt is not None:
+        print ("Total RSMT (est.)  : %.0f" % (rsmt.sum()))
+    print ("==================================================")
+
+    if opt.per_net is not None:
+        with compressed_io.open_file(opt.per_net, 'w') as f:
+            if rsmt is None:
+                f.writelines("%s %.1f\n" % (n, w)
+                             for n, w in zip(bs.net_names, hpwl))
+            else:
+                f.writelines("%s %.1f %.1f\n" % (n, w, s)
+                             for n, w, s in zip(bs.net_names, hpwl, rsmt))
@@ -2,6 +2,8 @@
     A LEF parser.
 """
 
+import compressed_io
+
 
 class LefSite(object):
     """ Lef Site """
@@ -190,7 +192,7 @@ class Lef(object):
 
 
         # read file without blank lines
-        with open(file_name, 'r') as f:
+        with compressed_io.open_file(file_name) as f:
             lines = [l for l in (line.strip() for line in f) if l]
 
         lines_iter = iter(lines)
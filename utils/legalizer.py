@@ -0,0 +1,379 @@
+"""
+    A row-based standard cell legalizer (Abacus or Tetris) on Bookshelf arrays.
+
+    Cells are processed in x order and put in the row segment, i.e., the free
+    part of a row between obstacles, where they move the least. Abacus keeps
+    clusters of abutting cells at their optimal positions [Spindler, ISPD'08];
+    Tetris just packs cells from the left.
+
+    In the incremental mode, only the rows holding resized cells are
+    re-legalized and every other cell is an obstacle. Row segments are built
+    on demand, so the work scales with the number of rows touched.
+"""
+
+from __future__ import print_function, division
+import sys, bisect
+from time import time
+
+import numpy as np
+
+import bookshelf
+
+
+class Segment(object):
+    """ Free part of a row, [x_min, x_max), with site alignment. """
+    def __init__(self, x_min, x_max, y, origin, site):
+        self.x_min, self.x_max = x_min, x_max
+        self.y = y
+        self.origin, self.site = origin, site
+        self.used = 0.0
+        self.cells = list()
+
+
+    def snap(self, x, w):
+        """ Nearest site-aligned position of a cell in the segment. """
+        x = self.origin + round((x - self.origin) / self.site) * self.site
+        return min(max(x, self.x_min), self.x_max - w)
+
+
+    def fits(self, w):
+        return self.used + w <= self.x_max - self.x_min
+
+
+class TetrisSegment(Segment):
+    def __init__(self, *args):
+        Segment.__init__(self, *args)
+        self.frontier = self.x_min
+        self.positions = list()
+
+
+    def fits(self, w):
+        return self.frontier + w <= self.x_max
+
+
+    def trial(self, x, w):
+        return max(self.snap(x, w), self.frontier)
+
+
+    def insert(self, cell, x, w):
+        x = self.trial(x, w)
+        self.cells.append(cell)
+        self.positions.append(x)
+        self.frontier = x + w
+        self.used += w
+
+
+    def get_positions(self):
+        return self.cells, self.positions
+
+
+class AbacusSegment(Segment):
+    """ Clusters have weight e, q = sum(e_i * (x_i - offset_i)) and width w;
+    the optimal cluster position is q / e.
+    """
+    def __init__(self, *args):
+        Segment.__init__(self, *args)
+        self.widths = list()
+        self.cl_x, self.cl_e, self.cl_q, self.cl_w = list(), list(), list(), list()
+        self.cl_first = list()
+
+
+    def trial(self, x, w):
+        """ Position the cell would get, without changing the clusters. """
+        e, q, cw = 1.0, x, w
+        k = len(self.cl_x) - 1
+        xc = self.snap(q / e, cw)
+        while k >= 0 and self.cl_x[k] + self.cl_w[k] > xc:
+            q = self.cl_q[k] + q - e * self.cl_w[k]
+            e += self.cl_e[k]
+            cw += self.cl_w[k]
+            k -= 1
+            xc = self.snap(q / e, cw)
+        return xc + cw - w
+
+
+    def insert(self, cell, x, w):
+        self.cells.append(cell)
+        self.widths.append(w)
+        self.used += w
+
+        if self.cl_x and self.cl_x[-1] + self.cl_w[-1] > self.snap(x, w):
+            # Add the cell to the last cluster
+            self.cl_q[-1] += x - self.cl_w[-1]
+            self.cl_e[-1] += 1.0
+            self.cl_w[-1] += w
+        else:
+            self.cl_x.append(0.0)
+            self.cl_e.append(1.0)
+            self.cl_q.append(x)
+            self.cl_w.append(w)
+            self.cl_first.append(len(self.cells) - 1)
+
+        # Collapse
+        while True:
+            self.cl_x[-1] = self.snap(self.cl_q[-1] / self.cl_e[-1], self.cl_w[-1])
+            if len(self.cl_x) < 2 or self.cl_x[-2] + self.cl_w[-2] <= self.cl_x[-1]:
+                break
+
+            q, e, cw = self.cl_q.pop(), self.cl_e.pop(), self.cl_w.pop()
+            self.cl_x.pop()
+            self.cl_first.pop()
+            self.cl_q[-1] += q - e * self.cl_w[-1]
+            self.cl_e[-1] += e
+            self.cl_w[-1] += cw
+
+
+    def get_positions(self):
+        positions = list()
+        bounds = self.cl_first + [len(self.cells)]
+        for k, x in enumerate(self.cl_x):
+            for i in range(bounds[k], bounds[k + 1]):
+                positions.append(x)
+                x += self.widths[i]
+        return self.cells, positions
+
+
+class Legalizer(object):
+    def __init__(self, bs, algorithm='abacus'):
+        self.bs = bs
+        self.segment_type = AbacusSegment if algorithm == 'abacus' \
+                            else TetrisSegment
+
+        order = np.argsort(bs.row_y, kind='stable')
+        self.row_y = bs.row_y[order]
+        self.row_height = bs.row_height[order]
+        self.row_x = bs.row_x[order]
+        self.row_site = bs.row_site_spacing[order]
+        self.row_end = self.row_x + bs.row_num_sites[order] * self.row_site
+
+        self.segments = dict()      # row : list of segments
+        self.obstacle_row = None
+        self.obstacle_lx, self.obstacle_ux = None, None
+        self.row_obstacles = None   # row : obstacle range (CSR)
+
+
+    def get_rows(self, lly, ury):
+        """ Rows overlapping [lly, ury), as (first, last + 1). """
+        first = np.searchsorted(self.row_y + self.row_height, lly, side='right')
+        last = np.searchsorted(self.row_y, ury, side='left')
+        return first, last
+
+
+    def set_obstacles(self, obstacles):
+        """ Nodes in obstacles (a bool mask) block the rows they overlap. """
+        bs = self.bs
+        lly, ury = bs.node_y[obstacles], bs.node_y[obstacles] + bs.node_height[obstacles]
+        lx = bs.node_x[obstacles]
+        ux = lx + bs.node_width[obstacles]
+
+        first, last = self.get_rows(lly, ury)
+        count = np.maximum(last - first, 0)
+        obs = np.repeat(np.arange(len(count)), count)
+        row = np.repeat(first, count) \
+              + np.arange(len(obs)) - np.repeat(np.cumsum(count) - count, count)
+
+        order = np.lexsort((lx[obs], row))
+        self.obstacle_row = row[order]
+        self.obstacle_lx, self.obstacle_ux = lx[obs][order], ux[obs][order]
+        self.row_obstacles = np.searchsorted(self.obstacle_row,
+                                             np.arange(len(self.row_y) + 1))
+
+
+    def get_segments(self, row):
+        """ Free segments of a row, built on the first access. """
+        try:
+            return self.segments[row]
+        except KeyError:
+            pass
+
+        x0, x1 = self.row_x[row], self.row_end[row]
+        origin, site = self.row_x[row], self.row_site[row]
+        segments, x = list(), x0
+        s, e = self.row_obstacles[row], self.row_obstacles[row + 1]
+        for lx, ux in zip(self.obstacle_lx[s:e], self.obstacle_ux[s:e]):
+            if lx > x:
+                segments.append((x, min(lx, x1)))
+            x = max(x, ux)
+        if x < x1:
+            segments.append((x, x1))
+
+        result = list()
+        for lx, ux in segments:
+            # Shrink to the site grid
+            lx = origin + np.ceil((lx - origin) / site - 1e-9) * site
+            ux = origin + np.floor((ux - origin) / site + 1e-9) * site
+            if ux > lx:
+                result.append(self.segment_type(float(lx), float(ux),
+                                                float(self.row_y[row]),
+                                                float(origin), float(site)))
+
+        self.segments[row] = (result, [seg.x_min for seg in result])
+        return self.segments[row]
+
+
+    def find_segment(self, x, y, w):
+        """ Return (cost, segment) of the best segment for a cell at (x, y). """
+        best_cost, best = np.inf, None
+        num_rows = len(self.row_y)
+        up = int(np.clip(np.searchsorted(self.row_y, y, side='right') - 1,
+                         0, num_rows - 1))
+        down = up - 1
+
+        while up < num_rows or down >= 0:
+            # Visit rows in the order of their distance to y
+            dy_up = abs(self.row_y[up] - y) if up < num_rows else np.inf
+            dy_down = abs(self.row_y[down] - y) if down >= 0 else np.inf
+            if dy_up <= dy_down:
+                row, dy = up, dy_up
+                up += 1
+            else:
+                row, dy = down, dy_down
+                down -= 1
+            if dy >= best_cost:
+                break
+
+            segments, x_mins = self.get_segments(row)
+            i = max(bisect.bisect_right(x_mins, x) - 1, 0)
+
+            # Segments on the left (including the one containing x)
+            for seg in reversed(segments[:i + 1]):
+                if dy + max(x - seg.x_max, 0) >= best_cost:
+                    break
+                if seg.fits(w):
+                    cost = dy + abs(seg.trial(x, w) - x)
+                    if cost < best_cost:
+                        best_cost, best = cost, seg
+
+            # Segments on the right
+            for seg in segments[i + 1:]:
+                if dy + max(seg.x_min - x, 0) >= best_cost:
+                    break
+                if seg.fits(w):
+                    cost = dy + abs(seg.trial(x, w) - x)
+                    if cost < best_cost:
+                        best_cost, best = cost, seg
+
+        return best_cost, best
+
+
+    def legalize(self, cells):
+        """ Legalize the cells (indices); the other nodes must be set as
+        obstacles already. Return the number of failed cells.
+        """
+        bs = self.bs
+        order = cells[np.lexsort((bs.node_y[cells], bs.node_x[cells]))]
+        num_failed = 0
+        for i, x, y, w in zip(order, bs.node_x[order], bs.node_y[order],
+                              bs.node_width[order]):
+            cost, seg = self.find_segment(float(x), float(y), float(w))
+            if seg is None:
+                sys.stderr.write("Warning: no space for %s.\n" % (bs.node_names[i]))
+                num_failed += 1
+                continue
+            seg.insert(i, float(x), float(w))
+
+        for segments, x_mins in self.segments.values():
+            for seg in segments:
+                placed, positions = seg.get_positions()
+                if placed:
+                    bs.node_x[placed] = positions
+                    bs.node_y[placed] = seg.y
+
+        return num_failed
+
+
+def get_resized_cells(bs, ref_nodes):
+    """ Return a mask of nodes whose width differs from ref_nodes. """
+    ref = bookshelf.Bookshelf()
+    ref.read_nodes(ref_nodes)
+
+    index = ref.node_table.get_ids(bs.node_names)
+    resized = index < 0
+    resized[~resized] = ref.node_width[index[~resized]] != bs.node_width[~resized]
+    return resized
+
+
+def run_legalizer(nodes, pl, scl, out, algorithm='abacus', ref_nodes=None):
+    bs = bookshelf.Bookshelf()
+    bs.read_nodes(nodes)
+    bs.read_scl(scl)
+    bs.read_pl(pl)
+    start = time()
+
+    row_height = bs.row_height.min()
+    movable = (bs.node_type == bookshelf.MOVABLE) & ~bs.node_fixed
+    multi_row = movable & (bs.node_height > row_height)
+    if np.any(multi_row):
+        print ("Warning: %d multi-row cells are kept in place."
+               % (np.count_nonzero(multi_row)))
+        movable &= ~multi_row
+
+    legalizer = Legalizer(bs, algorithm)
+    if ref_nodes is not None:
+        # Cells in the rows holding resized cells
+        resized = get_resized_cells(bs, ref_nodes) & movable
+        first, last = legalizer.get_rows(bs.node_y, bs.node_y + bs.node_height)
+        touched = np.zeros(len(legalizer.row_y) + 1, dtype=bool)
+        touched[first[resized]] = True
+        cells = movable & touched[np.minimum(first, len(legalizer.row_y))]
+        num_rows = int(np.count_nonzero(touched))
+    else:
+        resized = movable
+        cells = movable
+        num_rows = len(legalizer.row_y)
+
+    x0, y0 = bs.node_x.copy(), bs.node_y.copy()
+    # terminal_NI nodes do not block placement.
+    legalizer.set_obstacles(~cells & (bs.node_type != bookshelf.TERMINAL_NI))
+    num_failed = legalizer.legalize(np.flatnonzero(cells))
+
+    displacement = np.abs(bs.node_x - x0) + np.abs(bs.node_y - y0)
+    bs.write_pl(out)
+
+    print ("==================================================")
+    print ("Algorithm          : %s" % (algorithm))
+    print ("Mode               : %s" % ('incremental' if ref_nodes else 'full'))
+    print ("Resized cells      : %d" % (np.count_nonzero(resized)
+                                        if ref_nodes else 0))
+    print ("Legalized rows     : %d" % (num_rows))
+    print ("Legalized cells    : %d" % (np.count_nonzero(cells)))
+    print ("Failed cells       : %d" % (num_failed))
+    print ("Total displacement : %.1f" % (displacement.sum()))
+    print ("Max displacement   : %.1f" % (displacement.max(initial=0)))
+    print ("Runtime (s)        : %.2f" % (time() - start))
+    print ("==================================================")
+
+    if num_failed > 0:
+        raise SystemExit(-1)
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Legalize a placement.')
+    parser.add_argument('--aux', action="store", dest='src_aux', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl', default=None,
+                        help="Placement (default: the .pl in the aux file)")
+    parser.add_argument('--algorithm', action="store", dest='algorithm',
+                        choices=('abacus', 'tetris'), default='abacus')
+    parser.add_argument('--ref_nodes', action="store", dest='ref_nodes',
+                        default=None,
+                        help="Nodes before sizing; re-legalize only the rows "
+                             "holding resized cells (incremental mode).")
+    parser.add_argument('-o', action="store", dest='dest_pl', default='out.pl')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    bs = bookshelf.Bookshelf()
+    bs.read_aux(opt.src_aux, read_files=False)
+    src_pl = opt.src_pl if opt.src_pl is not None else bs.files['pl']
+
+    run_legalizer(bs.files['nodes'], src_pl, bs.files['scl'], opt.dest_pl,
+                  opt.algorithm, opt.ref_nodes)
@@ -0,0 +1,425 @@
+"""
+    A Liberty (.lib) parser (NLDM cells, pins and timing tables).
+
+    The file is tokenized line by line and each cell is converted as soon as
+    its group closes, so the group tree of the whole library is never held
+    in memory. All lookup tables of a library are stacked into NumPy arrays
+    and looked up in batches. Parsed libraries are cached in binary form,
+    keyed by the hash of the file contents.
+"""
+
+from __future__ import print_function, division
+import re, sys, os, hashlib, pickle
+
+import numpy as np
+
+import compressed_io
+
+TIME_UNITS = {'s' : 1.0, 'ms' : 1e-3, 'us' : 1e-6, 'ns' : 1e-9, 'ps' : 1e-12,
+              'fs' : 1e-15}
+CAP_UNITS = {'f' : 1.0, 'mf' : 1e-3, 'uf' : 1e-6, 'nf' : 1e-9, 'pf' : 1e-12,
+             'ff' : 1e-15}
+
+# Table variables that go on the first axis of a table; the other variable
+# (load or related pin transition) goes on the second axis.
+FIRST_AXIS_VARIABLES = ('input_net_transition', 'constrained_pin_transition')
+
+TABLE_NAMES = ('cell_rise', 'cell_fall', 'rise_transition', 'fall_transition',
+               'rise_constraint', 'fall_constraint')
+
+TOKEN_RE = re.compile(r'"[^"]*"|[^\s(){}:;,"\\]+|[(){}:;,]')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'liberty')
+CACHE_VERSION = 1   # Bump when the cached object layout changes
+
+
+class LibertyGroup(object):
+    """ A group statement: group_type (args) { ... } """
+    def __init__(self, group_type, args):
+        self.group_type = group_type
+        self.args = args
+        self.attributes = dict()           # simple attribute : value
+        self.complex_attributes = dict()   # complex attribute : value list
+        self.groups = list()
+
+
+    def get_groups(self, group_type):
+        return [g for g in self.groups if g.group_type == group_type]
+
+
+class TimingArc(object):
+    def __init__(self, related_pins, timing_type, timing_sense):
+        self.related_pins = related_pins
+        self.timing_type = timing_type
+        self.timing_sense = timing_sense
+        self.tables = dict()     # table name (cell_rise, ...) : table id
+
+
+    def get_table_ids(self, names):
+        """ Table ids of the given table names (-1 if missing). """
+        return [self.tables.get(name, -1) for name in names]
+
+
+    def is_combinational(self):
+        return self.timing_type == 'combinational'
+
+
+    def is_launch(self):
+        return self.timing_type in ('rising_edge', 'falling_edge')
+
+
+    def is_setup(self):
+        return self.timing_type in ('setup_rising', 'setup_falling')
+
+
+class LibertyPin(object):
+    def __init__(self, name, direction, capacitance):
+        self.name = name
+        self.direction = direction
+        self.capacitance = capacitance
+        self.timing = list()     # TimingArc list
+
+
+class LibertyCell(object):
+    def __init__(self, name, area):
+        self.name = name
+        self.area = area
+        self.pins = dict()       # pin name : LibertyPin
+
+
+class Liberty(object):
+    """ A Liberty library.
+
+    Table k is indexed by [transition, load] (or by [constrained pin
+    transition, related pin transition] for constraint tables): its
+    breakpoints are index_1[k, :size_1[k]] and index_2[k, :size_2[k]], and
+    its values values[k, :size_1[k], :size_2[k]]. Unused breakpoints are
+    +inf. Axes of length one are doubled, so lookup never special-cases them.
+    """
+    def __init__(self):
+        self.name = None
+        self.time_unit = 1e-9    # in seconds
+        self.cap_unit = 1e-12    # in farads
+        self.templates = dict()  # template name : (variables, index_1, index_2)
+        self.cells = dict()      # cell name : LibertyCell
+
+        self.index_1 = np.zeros((0, 2))
+        self.index_2 = np.zeros((0, 2))
+        self.values = np.zeros((0, 2, 2))
+        self.size_1 = np.zeros(0, dtype=np.int64)
+        self.size_2 = np.zeros(0, dtype=np.int64)
+        self.tables = list()     # (index_1, index_2, values) while parsing
+
+
+    def get_table_count(self):
+        return len(self.size_1)
+
+
+    def print_stats(self):
+        num_pins = sum(len(c.pins) for c in self.cells.values())
+        num_arcs = sum(len(p.timing) for c in self.cells.values()
+                       for p in c.pins.values())
+        print ("==================================================")
+        print ("Library            : %s" % (self.name))
+        print ("Time unit          : %g s" % (self.time_unit))
+        print ("Capacitance unit   : %g F" % (self.cap_unit))
+        print ("Number of cells    : %d" % (len(self.cells)))
+        print ("Number of pins     : %d" % (num_pins))
+        print ("Number of arcs     : %d" % (num_arcs))
+        print ("Number of tables   : %d" % (self.get_table_count()))
+        print ("==================================================")
+
+
+    def read_lib(self, file_name, cache_dir=None):
+        """ Read a Liberty file, or its cached copy in cache_dir. """
+        file_name = compressed_io.find_file(file_name)
+        cache_file = None
+        if cache_dir:
+            # Keyed by the contents only, so that copies and links of a
+            # library under other names share one entry
+            cache_file = os.path.join(cache_dir, "%s.pkl" % (get_file_hash(file_name)))
+            if os.path.exists(cache_file):
+                with open(cache_file, 'rb') as f:
+                    self.__dict__.update(pickle.load(f).__dict__)
+                return
+
+        library = None
+        stack = list()
+
+        def close_group(group, parent):
+            """ Convert the children of the library as soon as they close. """
+            if parent is not library:
+                parent.groups.append(group)
+            elif group.group_type == 'lu_table_template':
+                self.read_template(group)
+            elif group.group_type == 'cell':
+                self.read_cell(group)
+
+        with compressed_io.open_file(file_name) as f:
+            for group_type, group in parse_groups(tokenize(f)):
+                if group_type is None:         # A group was closed
+                    stack.pop()
+                    if stack:
+                        close_group(group, stack[-1])
+                    continue
+
+                if library is None:
+                    if group.group_type != 'library':
+                        sys.stderr.write("Error: no library group in %s.\n"
+                                         % (file_name))
+                        raise SystemExit(-1)
+                    library = group
+                    self.name = group.args[0] if group.args else None
+                stack.append(group)
+
+        if library is None:
+            sys.stderr.write("Error: no library group in %s.\n" % (file_name))
+            raise SystemExit(-1)
+        self.read_units(library)
+        self.stack_tables()
+
+        if cache_file is not None:
+            write_cache(self, cache_file)
+
+
+    def read_units(self, library):
+        if 'time_unit' in library.attributes:
+            m = re.match(r'([0-9.eE+-]*)\s*([a-zA-Z]+)',
+                         library.attributes['time_unit'])
+            self.time_unit = float(m.group(1) or 1.0) * TIME_UNITS[m.group(2).lower()]
+
+        if 'capacitive_load_unit' in library.complex_attributes:
+            value, unit = library.complex_attributes['capacitive_load_unit'][:2]
+            self.cap_unit = float(value) * CAP_UNITS[unit.lower()]
+
+
+    def read_template(self, group):
+        variables = [group.attributes.get('variable_1'),
+                     group.attributes.get('variable_2')]
+        self.templates[group.args[0]] = \
+            (variables, group.complex_attributes.get('index_1'),
+             group.complex_attributes.get('index_2'))
+
+
+    def read_cell(self, group):
+        cell = LibertyCell(group.args[0], float(group.attributes.get('area', 0.0)))
+        for p in group.get_groups('pin'):
+            cell.pins[p.args[0]] = self.read_pin(p)
+        self.cells[cell.name] = cell
+
+
+    def read_pin(self, group):
+        a = group.attributes
+        capacitance = max(float(a.get(k, 0.0)) for k in
+                          ('capacitance', 'rise_capacitance', 'fall_capacitance'))
+        pin = LibertyPin(group.args[0], a.get('direction'), capacitance)
+
+        for t in group.get_groups('timing'):
+            arc = TimingArc(t.attributes.get('related_pin', '').split(),
+                            t.attributes.get('timing_type', 'combinational'),
+                            t.attributes.get('timing_sense'))
+            for table in t.groups:
+                if table.group_type in TABLE_NAMES:
+                    arc.tables[table.group_type] = self.read_table(table)
+            pin.timing.append(arc)
+
+        return pin
+
+
+    def read_table(self, group):
+        """ Add a table and return its id. """
+        template = group.args[0] if group.args else 'scalar'
+        variables, index_1, index_2 = \
+            self.templates.get(template, ([None, None], None, None))
+        index_1 = group.complex_attributes.get('index_1', index_1)
+        index_2 = group.complex_attributes.get('index_2', index_2)
+
+        def floats(values):
+            return np.array([float(v) for s in values for v in s.split(',')
+                             if v.strip()], dtype=np.float64)
+
+        values = floats(group.complex_attributes['values'])
+        index_1 = floats(index_1) if index_1 is not None else np.zeros(1)
+        index_2 = floats(index_2) if index_2 is not None else np.zeros(1)
+        if len(values) == 1:
+            index_1, index_2 = np.zeros(1), np.zeros(1)
+        values = values.reshape(len(index_1), len(index_2))
+
+        if variables[0] is not None and variables[0] not in FIRST_AXIS_VARIABLES:
+            index_1, index_2, values = index_2, index_1, values.T
+
+        if len(index_1) == 1:
+            index_1 = np.array([index_1[0], index_1[0] + 1.0])
+            values = np.vstack((values, values))
+        if len(index_2) == 1:
+            index_2 = np.array([index_2[0], index_2[0] + 1.0])
+            values = np.hstack((values, values))
+
+        self.tables.append((index_1, index_2, values))
+        return len(self.tables) - 1
+
+
+    def stack_tables(self):
+        """ Pad the parsed tables into the stacked arrays. """
+        num_tables = len(self.tables)
+        n1 = max([len(t[0]) for t in self.tables] + [2])
+        n2 = max([len(t[1]) for t in self.tables] + [2])
+        self.index_1 = np.full((num_tables, n1), np.inf)
+        self.index_2 = np.full((num_tables, n2), np.inf)
+        self.values = np.zeros((num_tables, n1, n2))
+        self.size_1 = np.zeros(num_tables, dtype=np.int64)
+        self.size_2 = np.zeros(num_tables, dtype=np.int64)
+        for k, (index_1, index_2, values) in enumerate(self.tables):
+            s1, s2 = len(index_1), len(index_2)
+            self.index_1[k, :s1], self.index_2[k, :s2] = index_1, index_2
+            self.values[k, :s1, :s2] = values
+            self.size_1[k], self.size_2[k] = s1, s2
+        self.tables = list()
+
+
+    def lookup(self, table_ids, x, y):
+        """ Look up table table_ids[i] at (x[i], y[i]) with bilinear
+        interpolation (extrapolation outside the table). Missing tables (-1)
+        give 0.
+        """
+        table_ids = np.asarray(table_ids, dtype=np.int64)
+        x = np.broadcast_to(np.asarray(x, dtype=np.float64), table_ids.shape)
+        y = np.broadcast_to(np.asarray(y, dtype=np.float64), table_ids.shape)
+        if self.get_table_count() == 0:
+            return np.zeros(table_ids.shape)
+
+        t = np.maximum(table_ids, 0)
+        i, tx = get_interval(self.index_1[t], self.size_1[t], x)
+        j, ty = get_interval(self.index_2[t], self.size_2[t], y)
+        v = self.values
+        value = (1 - tx) * (1 - ty) * v[t, i, j] + tx * (1 - ty) * v[t, i + 1, j] \
+                + (1 - tx) * ty * v[t, i, j + 1] + tx * ty * v[t, i + 1, j + 1]
+        return np.where(table_ids >= 0, value, 0.0)
+
+
+def get_interval(index, size, x):
+    """ Return the lower breakpoint and the interpolation weight of x in
+    each row of index (rows padded with +inf).
+    """
+    i = np.clip((index <= x[..., None]).sum(axis=-1) - 1, 0, size - 2)
+    lo = np.take_along_axis(index, i[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(index, i[..., None] + 1, axis=-1)[..., 0]
+    return i, (x - lo) / (hi - lo)
+
+
+def get_file_hash(file_name):
+    h = hashlib.sha1(("liberty %d\n" % (CACHE_VERSION)).encode())
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_cache(lib, cache_file):
+    """ Write atomically, so that concurrent runs never see a partial file. """
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(lib, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError) as e:
+        sys.stderr.write("Warning: cannot write the cache %s (%s).\n"
+                         % (cache_file, e))
+
+
+def tokenize(lines):
+    """ Yield tokens line by line; comments and line continuations are
+    dropped.
+    """
+    in_comment = False
+    for line in lines:
+        if in_comment or '/*' in line:
+            parts, rest = list(), line
+            while rest:
+                if in_comment:
+                    end = rest.find('*/')
+                    if end < 0:
+                        rest = ''
+                    else:
+                        rest, in_comment = rest[end + 2:], False
+                else:
+                    start = rest.find('/*')
+                    if start < 0:
+                        parts.append(rest)
+                        rest = ''
+                    else:
+                        parts.append(rest[:start])
+                        rest, in_comment = rest[start + 2:], True
+            line = ' '.join(parts)
+
+        for token in TOKEN_RE.findall(line):
+            yield token
+
+
+def parse_groups(tokens):
+    """ Yield (group_type, group) when a group opens and (None, group) when
+    it closes. Attributes are stored in the innermost open group.
+    """
+    stack = list()
+    tokens = iter(tokens)
+    pending = None
+
+    while True:
+        name = pending if pending is not None else next(tokens, None)
+        pending = None
+        if name is None:
+            return
+
+        if name == '}':
+            if stack:
+                yield None, stack.pop()
+            continue
+        if name in (';', ',', ')', '{'):
+            continue
+
+        sep = next(tokens, None)
+        if sep == ':':
+            value = next(tokens, '')
+            if stack:
+                stack[-1].attributes[name] = value.strip('"')
+        elif sep == '(':
+            args = list()
+            for t in tokens:
+                if t == ')':
+                    break
+                if t != ',':
+                    args.append(t.strip('"'))
+
+            after = next(tokens, None)
+            if after == '{':
+                group = LibertyGroup(name, args)
+                stack.append(group)
+                yield name, group
+            else:
+                if stack:
+                    stack[-1].complex_attributes[name] = args
+                if after != ';':
+                    pending = after
+        else:
+            pending = sep
+
+
+if __name__ == '__main__':
+    def parse_cl():
+        import argparse
+        parser = argparse.ArgumentParser(description='A Liberty parser.')
+        parser.add_argument('-i', action="store", dest='src', required=True)
+        parser.add_argument('--cache_dir', action="store", dest='cache_dir',
+                            default=DEFAULT_CACHE_DIR,
+                            help="Cache of parsed libraries ('' to disable)")
+        opt = parser.parse_args()
+        return opt
+
+    opt = parse_cl()
+
+    import liberty_parser   # So that the cache refers to the module classes
+    lib = liberty_parser.Liberty()
+    lib.read_lib(opt.src, opt.cache_dir)
+    lib.print_stats()
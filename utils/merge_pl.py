@@ -2,7 +2,12 @@
 """
 
 from time import gmtime, strftime
-import sys
+import sys, os, shutil
+
+import numpy as np
+
+import compressed_io
+import placement_table
 
 
 def parse_cl():
@@ -18,35 +23,54 @@ def parse_cl():
     return opt.nodes, opt.src_pl, opt.ref_pl
 
 
-def merge_pl(nodes, src_pl, ref_pl):
+def get_terminals(nodes):
+    """ Return the set of terminal names in a nodes file. """
+    terminals = set()
+    with compressed_io.open_file(nodes) as f:
+        for l in f:
+            l = l.rstrip()
+            if l.endswith('terminal'):
+                terminals.add(l.split()[0])
+    return terminals
 
 
-    # Find terminal
-    lines = [x.rstrip() for x in open(nodes, 'r')]
-    terminals = [l.split()[0] for l in lines if l.endswith('terminal')]
-
-    with open(src_pl, 'r') as f_src_pl:
-        src_lines = [x.rstrip() for x in f_src_pl]
-    with open(ref_pl, 'r') as f_ref_pl:
-        ref_lines = [x.rstrip() for x in f_ref_pl]
-
-    with open(src_pl, 'w') as f_pl:
-        f_pl = open(src_pl, 'w')
-        for l in src_lines:
-            try:
-                if l.split()[0] in terminals: pass
-                else: f_pl.write(l + '\n')
-            except IndexError:
-                f_pl.write(l + '\n')
-     
-        for l in ref_lines:
-            try:
-                tokens = l.split()
-                if tokens[0] in terminals:
-                    f_pl.write("%s\t%.4f\t%.4f\t: N\n" \
-                                % (tokens[0], float(tokens[1]), float(tokens[2])))
-            except IndexError:
-                pass
+def get_terminal_locations(ref_pl, terminals):
+    """ Return (name, x, y) of the terminals in ref_pl, in file order. """
+    ref = placement_table.read_placement(ref_pl)
+    ids = ref.get_ids(terminals)
+    ids = np.sort(ids[ids >= 0])
+    return zip(ref.table.get_names(ids), ref.x[ids].tolist(), ref.y[ids].tolist())
+
+
+def merge_pl(nodes, src_pl, ref_pl):
+    """ Replace the terminal locations of src_pl with those of ref_pl.
+
+    Terminal lines of src_pl are dropped and the terminals of ref_pl are
+    appended. src_pl is streamed to a temporary file, which then replaces
+    it, so that it is never left half written. A compressed src_pl stays
+    compressed.
+    """
+    terminals = get_terminals(nodes)
+    locations = get_terminal_locations(ref_pl, terminals)
+
+    src_pl = compressed_io.find_file(src_pl)
+    tmp_file = compressed_io.add_suffix(src_pl, ".%d.tmp" % (os.getpid()))
+    try:
+        with compressed_io.open_file(src_pl) as f_src_pl, \
+             compressed_io.open_file(tmp_file, 'w') as f_pl:
+            for l in f_src_pl:
+                tokens = l.split(None, 1)
+                if tokens and tokens[0] in terminals:
+                    continue
+                f_pl.write(l.rstrip() + '\n')
+
+            f_pl.writelines("%s\t%.4f\t%.4f\t: N\n" % t for t in locations)
+
+        shutil.copymode(src_pl, tmp_file)
+        os.rename(tmp_file, src_pl)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,224 @@
+"""
+    A placement table: node locations of a Bookshelf pl file.
+
+    Names are kept in a SymbolTable (the hash index), and x, y, orientation
+    and fixed flag in NumPy arrays indexed by the same ids, so placements
+    can be scaled, snapped and compared as a whole. Tables are read from and
+    written to pl text, or saved to a binary .npz file that loads without
+    parsing.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import compressed_io
+import symbol_table
+
+ORIENTS = ('N', 'W', 'S', 'E', 'FN', 'FW', 'FS', 'FE')
+ORIENT_INDEX = {o : i for i, o in enumerate(ORIENTS)}
+
+# Fixed flags
+MOVABLE, FIXED, FIXED_NI = 0, 1, 2
+FIXED_SUFFIXES = ('', ' /FIXED', ' /FIXED_NI')
+
+BINARY_EXTENSION = '.npz'
+
+
+class PlacementTable(object):
+    def __init__(self, names=(), x=None, y=None, orient=None, fixed=None):
+        self.table = symbol_table.get_unique_table(list(names), 'node', 'placement')
+        self.names = self.table.names
+        self.index = self.table.index      # name : id
+
+        num = len(self.names)
+        self.x = np.zeros(num) if x is None else np.asarray(x, dtype=np.float64)
+        self.y = np.zeros(num) if y is None else np.asarray(y, dtype=np.float64)
+        self.orient = np.zeros(num, dtype=np.int8) if orient is None \
+                      else np.asarray(orient, dtype=np.int8)
+        self.fixed = np.zeros(num, dtype=np.int8) if fixed is None \
+                     else np.asarray(fixed, dtype=np.int8)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def get_node_count(self):
+        return len(self.names)
+
+
+    def get_orient(self, i):
+        return ORIENTS[self.orient[i]]
+
+
+    def is_fixed(self):
+        return self.fixed != MOVABLE
+
+
+    def read_pl(self, file_name):
+        """ Read a Bookshelf pl file, replacing the table. """
+        with compressed_io.open_file(file_name) as f:
+            lines = f.read().splitlines()
+
+        # Skip the first line: UCLA pl ...
+        # name x y [: orient [/FIXED | /FIXED_NI]]
+        # Only strings are kept per line: lists of token lists would keep
+        # the garbage collector busy on large designs.
+        names, xs, ys, tails = list(), list(), list(), list()
+        for l in lines[1:]:
+            tokens = l.split(None, 3)
+            if not tokens or tokens[0].startswith('#'):
+                continue
+            if len(tokens) < 3:
+                sys.stderr.write("Error: invalid line in %s: %s\n"
+                                 % (file_name, l.strip()))
+                raise SystemExit(-1)
+            names.append(tokens[0])
+            xs.append(tokens[1])
+            ys.append(tokens[2])
+            tails.append(tokens[3] if len(tokens) > 3 else '')
+
+        self.table = symbol_table.get_unique_table(names, 'node', file_name)
+        self.names = self.table.names
+        self.index = self.table.index
+
+        self.x = np.array(xs, dtype=np.float64)
+        self.y = np.array(ys, dtype=np.float64)
+
+        # Few distinct tails: parse each once
+        tail_index = dict()     # tail : id
+        tail_ids = np.array([tail_index.setdefault(t, len(tail_index)) for t in tails],
+                            dtype=np.int64)
+        orient = np.zeros(len(tail_index), dtype=np.int8)
+        fixed = np.zeros(len(tail_index), dtype=np.int8)
+        for tail, i in tail_index.items():
+            tokens = tail.split()
+            if len(tokens) > 1 and tokens[0] == ':':
+                try:
+                    orient[i] = ORIENT_INDEX[tokens[1]]
+                except KeyError:
+                    sys.stderr.write("Error: unknown orientation %s in %s.\n"
+                                     % (tokens[1], file_name))
+                    raise SystemExit(-1)
+            if tokens and tokens[-1] in ('/FIXED', '/FIXED_NI'):
+                fixed[i] = FIXED if tokens[-1] == '/FIXED' else FIXED_NI
+
+        self.orient = orient[tail_ids]
+        self.fixed = fixed[tail_ids]
+
+
+    def write_pl(self, file_name):
+        orients = np.array(ORIENTS, dtype=object)[self.orient]
+        suffix = np.array(FIXED_SUFFIXES, dtype=object)[self.fixed]
+
+        with compressed_io.open_file(file_name, 'w') as f:
+            f.write('UCLA pl 1.0\n\n')
+            f.writelines("%s\t%.15g\t%.15g\t: %s%s\n" % t
+                         for t in zip(self.names, self.x, self.y, orients, suffix))
+
+
+    def save(self, file_name):
+        """ Save the table in NumPy .npz format. """
+        names = np.frombuffer('\n'.join(self.names).encode(), dtype=np.uint8)
+        with open(file_name, 'wb') as f:
+            np.savez(f, names=names, x=self.x, y=self.y,
+                     orient=self.orient, fixed=self.fixed)
+
+
+    def load(self, file_name):
+        """ Load a table written by save, replacing this one. """
+        with np.load(file_name, allow_pickle=False) as data:
+            names = data['names'].tobytes().decode()
+            names = names.split('\n') if names else list()
+            self.__init__(names, data['x'], data['y'], data['orient'],
+                          data['fixed'])
+
+
+    def get_ids(self, names):
+        """ Ids of names; unknown names get -1. """
+        return self.table.get_ids(names)
+
+
+    def copy(self):
+        return PlacementTable(self.names, self.x.copy(), self.y.copy(),
+                              self.orient.copy(), self.fixed.copy())
+
+
+    def scale(self, x_scale, y_scale):
+        """ Return a copy with locations multiplied by x_scale and y_scale,
+        e.g. Bookshelf units to DEF database units.
+        """
+        scaled = self.copy()
+        scaled.x *= x_scale
+        scaled.y *= y_scale
+        return scaled
+
+
+    def snap(self, site_width, row_height, origin_x=0, origin_y=0):
+        """ Return a copy with movable nodes moved to the nearest site of the
+        row grid at (origin_x, origin_y).
+        """
+        snapped = self.copy()
+        movable = self.fixed == MOVABLE
+        for v, step, origin in ((snapped.x, site_width, origin_x),
+                                (snapped.y, row_height, origin_y)):
+            v[movable] = origin + np.round((v[movable] - origin) / step) * step
+        return snapped
+
+
+    def align(self, other):
+        """ Return (ids, other_ids): the nodes in both tables, in the order
+        of this table.
+        """
+        if self.names == other.names:   # Same nodes in the same order
+            ids = np.arange(len(self.names))
+            return ids, ids
+        other_ids = other.get_ids(self.names)
+        ids = np.flatnonzero(other_ids >= 0)
+        return ids, other_ids[ids]
+
+
+    def diff(self, other):
+        """ Return (ids, dx, dy): the movement of the nodes in both tables,
+        from this table to other.
+        """
+        ids, other_ids = self.align(other)
+        return ids, other.x[other_ids] - self.x[ids], other.y[other_ids] - self.y[ids]
+
+
+def read_placement(file_name):
+    """ Read a pl file, or a binary table if file_name ends with .npz. """
+    placement = PlacementTable()
+    if file_name.endswith(BINARY_EXTENSION):
+        placement.load(file_name)
+    else:
+        placement.read_pl(file_name)
+    return placement
+
+
+if __name__ == '__main__':
+    """ Convert between pl text and binary tables. """
+    def parse_cl():
+        import argparse
+        parser = argparse.ArgumentParser(
+                    description='Convert a pl file to/from a binary table (%s).'
+                                % (BINARY_EXTENSION))
+        parser.add_argument('-i', action="store", dest='src', required=True)
+        parser.add_argument('-o', action="store", dest='dest', required=True)
+        opt = parser.parse_args()
+        return opt
+
+    opt = parse_cl()
+
+    placement = read_placement(opt.src)
+    if opt.dest.endswith(BINARY_EXTENSION):
+        placement.save(opt.dest)
+    else:
+        placement.write_pl(opt.dest)
+
+    print ("==================================================")
+    print ("Number of nodes    : %d" % (placement.get_node_count()))
+    print ("Number of fixed    : %d" % (np.count_nonzero(placement.is_fixed())))
+    print ("==================================================")
@@ -0,0 +1,198 @@
+"""
+    Raster image helpers: palette mapping, resizing and PNG output.
+
+    Maps are rendered straight from NumPy arrays, so no gnuplot script has
+    to be written and rendered for every plot.
+"""
+
+from __future__ import print_function, division
+import struct, zlib
+
+import numpy as np
+
+# gnuplot: set palette defined (0 "blue", 10 "cyan", 30 "green", 45 "yellow",
+#                               70 "orange", 100 "red")
+CONGESTION_PALETTE = ((0, (0, 0, 255)),
+                      (10, (0, 255, 255)),
+                      (30, (0, 255, 0)),
+                      (45, (255, 255, 0)),
+                      (70, (255, 165, 0)),
+                      (100, (255, 0, 0)))
+
+BORDER_COLOR = (16, 16, 16)     # '#101010'
+
+
+def rasterize_rects(llx, lly, urx, ury, region, width, height, weights=None):
+    """ Accumulate rectangle coverage on a width x height pixel grid.
+
+    Return cov[x, y], the area of pixel (x, y) covered by the rectangles, as
+    a fraction of the pixel area (overlapping rectangles add up). region is
+    (llx, lly, urx, ury) of the grid; rectangles are clipped to it. With
+    weights, the coverage of each rectangle is scaled by its weight.
+
+    The coverage of a rectangle is outer(fx, fy), where fx is 1 on the pixel
+    columns it spans except for fractions at both ends. Writing fx as a box
+    minus end corrections, every rectangle becomes a few entries in
+    difference arrays, so the cost is linear in the number of rectangles
+    plus the number of pixels.
+    """
+    sx = width / (region[2] - region[0])
+    sy = height / (region[3] - region[1])
+    ax = np.clip((np.asarray(llx, dtype=np.float64) - region[0]) * sx, 0, width)
+    bx = np.clip((np.asarray(urx, dtype=np.float64) - region[0]) * sx, 0, width)
+    ay = np.clip((np.asarray(lly, dtype=np.float64) - region[1]) * sy, 0, height)
+    by = np.clip((np.asarray(ury, dtype=np.float64) - region[1]) * sy, 0, height)
+
+    valid = (bx > ax) & (by > ay)
+    ax, bx, ay, by = ax[valid], bx[valid], ay[valid], by[valid]
+    w = 1.0 if weights is None else np.asarray(weights, dtype=np.float64)[valid]
+
+    def span(a, b, size):
+        """ First/last pixel and the uncovered fractions at both ends. """
+        i0 = np.minimum(np.floor(a).astype(np.int64), size - 1)
+        i1 = np.maximum(np.ceil(b).astype(np.int64) - 1, i0)
+        return i0, i1, a - i0, (i1 + 1) - b
+
+    x0, x1, gx0, gx1 = span(ax, bx, width)
+    y0, y1, gy0, gy1 = span(ay, by, height)
+
+    # Box part: 2D difference array
+    box = np.zeros((width + 1, height + 1))
+    np.add.at(box, (x0, y0), w)
+    np.add.at(box, (x1 + 1, y0), -w)
+    np.add.at(box, (x0, y1 + 1), -w)
+    np.add.at(box, (x1 + 1, y1 + 1), w)
+    cov = box.cumsum(axis=0).cumsum(axis=1)[:width, :height]
+
+    # End columns: y-ranges with the uncovered x fraction
+    cols = np.zeros((width, height + 1))
+    for x, g in ((x0, gx0), (x1, gx1)):
+        np.add.at(cols, (x, y0), g * w)
+        np.add.at(cols, (x, y1 + 1), -g * w)
+    cov -= cols.cumsum(axis=1)[:, :height]
+
+    # End rows: x-ranges with the uncovered y fraction
+    rows = np.zeros((width + 1, height))
+    for y, g in ((y0, gy0), (y1, gy1)):
+        np.add.at(rows, (x0, y), g * w)
+        np.add.at(rows, (x1 + 1, y), -g * w)
+    cov -= rows.cumsum(axis=0)[:width, :]
+
+    # Corners were subtracted twice
+    for x, h in ((x0, gx0), (x1, gx1)):
+        for y, v in ((y0, gy0), (y1, gy1)):
+            np.add.at(cov, (x, y), h * v * w)
+
+    return cov
+
+
+def blend(image, coverage, color, alpha=1.0):
+    """ Paint color over an (h, w, 3) image with coverage[x, y] as opacity. """
+    opacity = alpha * np.clip(coverage, 0.0, 1.0).T[::-1, :, None]
+    blended = image * (1.0 - opacity) + np.array(color) * opacity
+    return np.rint(blended).astype(np.uint8)
+
+
+def draw_segments(image, x0, y0, x1, y1, region, color):
+    """ Draw line segments (x0, y0)-(x1, y1) on an (h, w, 3) image in place.
+
+    region is (llx, lly, urx, ury) of the image; y grows upward. Each
+    segment is sampled once per pixel along its longer side, and all
+    samples are written at once.
+    """
+    height, width = image.shape[:2]
+    sx = (width - 1) / (region[2] - region[0])
+    sy = (height - 1) / (region[3] - region[1])
+    ax = (np.asarray(x0, dtype=np.float64) - region[0]) * sx
+    ay = (np.asarray(y0, dtype=np.float64) - region[1]) * sy
+    bx = (np.asarray(x1, dtype=np.float64) - region[0]) * sx
+    by = (np.asarray(y1, dtype=np.float64) - region[1]) * sy
+
+    num = np.ceil(np.maximum(np.abs(bx - ax), np.abs(by - ay))).astype(np.int64) + 1
+    seg = np.repeat(np.arange(len(num)), num)
+    first = np.repeat(np.cumsum(num) - num, num)
+    t = (np.arange(len(seg)) - first) / np.maximum(num[seg] - 1, 1)
+
+    px = np.rint(ax[seg] + t * (bx - ax)[seg]).astype(np.int64)
+    py = np.rint(ay[seg] + t * (by - ay)[seg]).astype(np.int64)
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    image[height - 1 - py[inside], px[inside]] = color
+
+
+def to_rgb(hex_color):
+    """ '#RRGGBB' to an (r, g, b) tuple. """
+    return tuple(int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def colorize(values, palette, vmin, vmax):
+    """ Map values to RGB colors, as gnuplot does for a given cbrange.
+
+    vmin maps to the first palette entry and vmax to the last one; values
+    out of [vmin, vmax] are clipped.
+    """
+    stops = np.array([p for p, c in palette], dtype=np.float64)
+    colors = np.array([c for p, c in palette], dtype=np.float64)
+
+    gray = (np.clip(values, vmin, vmax) - vmin) / (vmax - vmin)
+    pos = stops[0] + gray * (stops[-1] - stops[0])
+
+    image = np.empty(np.shape(values) + (3,), dtype=np.uint8)
+    for c in range(3):
+        image[..., c] = np.rint(np.interp(pos, stops, colors[:, c]))
+    return image
+
+
+def resize(image, height, width):
+    """ Nearest-neighbor resize of an (h, w[, 3]) image. """
+    rows = np.arange(height) * image.shape[0] // height
+    cols = np.arange(width) * image.shape[1] // width
+    return image[rows][:, cols]
+
+
+def color_bar(height, width, palette):
+    """ Vertical color bar image, vmax at the top. """
+    values = np.linspace(1.0, 0.0, height)[:, None].repeat(width, axis=1)
+    return colorize(values, palette, 0.0, 1.0)
+
+
+def add_border(image, thickness=2, color=BORDER_COLOR):
+    image = image.copy()
+    image[:thickness], image[-thickness:] = color, color
+    image[:, :thickness], image[:, -thickness:] = color, color
+    return image
+
+
+def render_map(values, palette, vmin, vmax, width, height, bar_width=50):
+    """ Render a 2D map, values[x, y], as an image with a color bar.
+
+    y grows upward as in the layout, i.e., values[:, -1] is the top row.
+    """
+    image = colorize(np.asarray(values).T[::-1], palette, vmin, vmax)
+    image = add_border(resize(image, height, width))
+
+    if bar_width > 0:
+        gap = np.full((height, bar_width // 2, 3), 255, dtype=np.uint8)
+        bar = add_border(color_bar(height, bar_width // 2, palette))
+        image = np.concatenate((image, gap, bar), axis=1)
+    return image
+
+
+def write_png(file_name, image):
+    """ Write an (h, w, 3) uint8 RGB image to a PNG file. """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+
+    # Each scanline starts with a filter type byte (0: None).
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data \
+               + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    with open(file_name, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                           8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
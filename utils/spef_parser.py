@@ -0,0 +1,286 @@
+"""
+    A SPEF (Standard Parasitic Exchange Format) parser.
+
+    The file is read line by line (plain or gzip/bzip2 compressed), and one
+    *D_NET is held at a time, so memory is bounded by the largest net plus
+    the per-net summary arrays and the name map.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import compressed_io
+
+TIME_UNITS = {'S' : 1.0, 'MS' : 1e-3, 'US' : 1e-6, 'NS' : 1e-9, 'PS' : 1e-12,
+              'FS' : 1e-15}
+CAP_UNITS = {'F' : 1.0, 'MF' : 1e-3, 'UF' : 1e-6, 'NF' : 1e-9, 'PF' : 1e-12,
+             'FF' : 1e-15}
+RES_UNITS = {'OHM' : 1.0, 'KOHM' : 1e3, 'MOHM' : 1e6}
+
+
+def to_value(token):
+    """ Parse a value; min:typ:max triplets give the typical value. """
+    if ':' in token:
+        token = token.split(':')[1]
+    return float(token)
+
+
+class RCNet(object):
+    """ Parasitics of one net.
+
+    The RC tree (nodes, node_cap, res_from/res_to/res_value, couplings) is
+    only filled in when requested.
+    """
+    def __init__(self, name, total_cap):
+        self.name = name
+        self.total_cap = total_cap
+        self.ground_cap = 0.0
+        self.coupling_cap = 0.0
+        self.total_res = 0.0
+        self.pins = list()          # (pin name, direction)
+
+        self.nodes = list()         # node names
+        self.node_cap = None        # ground cap per node
+        self.res_from, self.res_to, self.res_value = None, None, None
+        self.couplings = list()     # (node name, other node name, cap)
+
+
+    def has_tree(self):
+        return self.node_cap is not None
+
+
+    def print_tree(self):
+        print ("Net %s: %d pins, %d nodes, %d resistors"
+               % (self.name, len(self.pins), len(self.nodes), len(self.res_value)))
+        for pin, direction in self.pins:
+            print ("  pin %-30s %s" % (pin, direction))
+        for node, cap in zip(self.nodes, self.node_cap):
+            print ("  cap %-30s %g" % (node, cap))
+        for u, v, r in zip(self.res_from, self.res_to, self.res_value):
+            print ("  res %-30s %-30s %g" % (self.nodes[u], self.nodes[v], r))
+        for u, v, c in self.couplings:
+            print ("  cc  %-30s %-30s %g" % (u, v, c))
+
+
+class Spef(object):
+    def __init__(self):
+        self.file_name = None
+        self.design = None
+        self.delimiter = ':'
+        self.time_unit = 1e-12      # in seconds
+        self.cap_unit = 1e-15       # in farads
+        self.res_unit = 1.0         # in ohms
+        self.name_map = dict()      # *index : name
+        self.ports = dict()         # port name : direction
+
+        # Per net, in file order (values in the file units)
+        self.net_names = list()
+        self.net_cap = None         # total cap of the *D_NET line
+        self.net_ground_cap = None
+        self.net_coupling_cap = None
+        self.net_res = None
+        self.net_num_pins = None
+        self.net_num_nodes = None
+
+        self.trees = dict()         # net name : RCNet, if kept
+
+
+    def get_net_count(self):
+        return len(self.net_names)
+
+
+    def get_name(self, token):
+        """ Resolve a mapped name (*12 or *12:a). """
+        if not token.startswith('*'):
+            return token
+        index, sep, rest = token.partition(self.delimiter)
+        return self.name_map.get(index, index) + sep + rest
+
+
+    def read_header(self, line):
+        tokens = line.split()
+        keyword = tokens[0]
+        if keyword == '*DESIGN':
+            self.design = tokens[1].strip('"')
+        elif keyword == '*DELIMITER':
+            self.delimiter = tokens[1]
+        elif keyword == '*T_UNIT':
+            self.time_unit = float(tokens[1]) * TIME_UNITS[tokens[2].upper()]
+        elif keyword == '*C_UNIT':
+            self.cap_unit = float(tokens[1]) * CAP_UNITS[tokens[2].upper()]
+        elif keyword == '*R_UNIT':
+            self.res_unit = float(tokens[1]) * RES_UNITS[tokens[2].upper()]
+
+
+    def iter_nets(self, file_name, build_trees=True, names=None):
+        """ Yield an RCNet per *D_NET.
+
+        RC trees are built for all nets if build_trees is True, otherwise
+        only for nets in names (a set), if given.
+        """
+        self.file_name = file_name
+        section, net, tree = None, None, False
+        node_index, node_cap = dict(), list()
+        res_from, res_to, res_value = list(), list(), list()
+
+        def node(token):
+            name = self.get_name(token)
+            if name not in node_index:
+                node_index[name] = len(net.nodes)
+                net.nodes.append(name)
+                node_cap.append(0.0)
+            return node_index[name]
+
+        with compressed_io.open_file(file_name) as f:
+            for line in f:
+                if not line.startswith('*'):
+                    tokens = line.split()
+                    if len(tokens) == 0 or tokens[0].startswith('//'):
+                        continue
+
+                    if section == '*CAP':
+                        c = to_value(tokens[-1])
+                        if len(tokens) == 3:
+                            net.ground_cap += c
+                            if tree:
+                                node_cap[node(tokens[1])] += c
+                        else:
+                            net.coupling_cap += c
+                            if tree:
+                                node(tokens[1])
+                                net.couplings.append((self.get_name(tokens[1]),
+                                                      self.get_name(tokens[2]), c))
+                    elif section == '*RES':
+                        r = to_value(tokens[-1])
+                        net.total_res += r
+                        if tree:
+                            res_from.append(node(tokens[1]))
+                            res_to.append(node(tokens[2]))
+                            res_value.append(r)
+                    elif section == '*PORTS':
+                        self.ports[tokens[0]] = tokens[1] if len(tokens) > 1 else None
+                    continue
+
+                tokens = line.split()
+                keyword = tokens[0]
+
+                if keyword in ('*P', '*I') and section == '*CONN':
+                    net.pins.append((self.get_name(tokens[1]), tokens[2]))
+                    if tree:
+                        node(tokens[1])
+                elif keyword in ('*CONN', '*CAP', '*RES', '*INDUC'):
+                    section = keyword
+                elif keyword == '*D_NET':
+                    name = self.get_name(tokens[1])
+                    net = RCNet(name, to_value(tokens[2]))
+                    tree = build_trees is True or (names is not None and name in names)
+                    section = None
+                elif keyword == '*END':
+                    if tree:
+                        net.node_cap = np.array(node_cap)
+                        net.res_from = np.array(res_from, dtype=np.int64)
+                        net.res_to = np.array(res_to, dtype=np.int64)
+                        net.res_value = np.array(res_value)
+                        node_index, node_cap = dict(), list()
+                        res_from, res_to, res_value = list(), list(), list()
+                    yield net
+                    section, net, tree = None, None, False
+                elif keyword in ('*NAME_MAP', '*PORTS'):
+                    section = keyword
+                elif section == '*NAME_MAP' and len(tokens) > 1:
+                    self.name_map[keyword] = tokens[1]
+                elif section == '*PORTS' and len(tokens) > 1:
+                    self.ports[self.get_name(keyword)] = tokens[1]
+                elif net is None:
+                    self.read_header(line)
+
+
+    def read_spef(self, file_name, keep_trees=None):
+        """ Read per-net parasitic totals. RC trees are kept for all nets if
+        keep_trees is True, or for the nets in keep_trees (a set).
+        """
+        names = keep_trees if keep_trees is not True else None
+        cap, ground, coupling, res, num_pins, num_nodes = \
+            list(), list(), list(), list(), list(), list()
+
+        for net in self.iter_nets(file_name, keep_trees is True, names):
+            self.net_names.append(net.name)
+            cap.append(net.total_cap)
+            ground.append(net.ground_cap)
+            coupling.append(net.coupling_cap)
+            res.append(net.total_res)
+            num_pins.append(len(net.pins))
+            num_nodes.append(len(net.nodes))
+            if net.has_tree():
+                self.trees[net.name] = net
+
+        self.net_cap = np.array(cap)
+        self.net_ground_cap = np.array(ground)
+        self.net_coupling_cap = np.array(coupling)
+        self.net_res = np.array(res)
+        self.net_num_pins = np.array(num_pins, dtype=np.int64)
+        self.net_num_nodes = np.array(num_nodes, dtype=np.int64)
+
+
+    def print_stats(self, num_top=10):
+        num_nets = self.get_net_count()
+        print ("==================================================")
+        print ("Design             : %s" % (self.design))
+        print ("Units (T, C, R)    : %g s, %g F, %g ohm"
+               % (self.time_unit, self.cap_unit, self.res_unit))
+        print ("Number of ports    : %d" % (len(self.ports)))
+        print ("Number of nets     : %d" % (num_nets))
+        if num_nets == 0:
+            print ("==================================================")
+            return
+
+        print ("Number of pins     : %d" % (self.net_num_pins.sum()))
+        print ("Total capacitance  : %g" % (self.net_cap.sum()))
+        print ("  Coupling         : %g" % (self.net_coupling_cap.sum()))
+        print ("Total resistance   : %g" % (self.net_res.sum()))
+        print ("Average net cap    : %g" % (self.net_cap.mean()))
+        print ("Maximum net cap    : %g (%s)"
+               % (self.net_cap.max(), self.net_names[int(self.net_cap.argmax())]))
+        print ("Maximum net res    : %g (%s)"
+               % (self.net_res.max(), self.net_names[int(self.net_res.argmax())]))
+
+        # Nets whose *D_NET total disagrees with the sum of their caps
+        mismatch = np.abs(self.net_cap - self.net_ground_cap - self.net_coupling_cap) \
+                   > 1e-3 * np.maximum(self.net_cap, 1e-12)
+        print ("Inconsistent totals: %d" % (np.count_nonzero(mismatch)))
+        print ("==================================================")
+
+        if num_top > 0:
+            print ("Largest nets by capacitance:")
+            for i in np.argsort(-self.net_cap, kind='stable')[:num_top]:
+                print ("  %-40s C %10g  R %10g  pins %d"
+                       % (self.net_names[i], self.net_cap[i], self.net_res[i],
+                          self.net_num_pins[i]))
+
+
+if __name__ == '__main__':
+    def parse_cl():
+        import argparse
+        parser = argparse.ArgumentParser(description='A SPEF parser.')
+        parser.add_argument('-i', action="store", dest='src', required=True)
+        parser.add_argument('--top', action="store", type=int, dest='num_top',
+                            default=10, help="Number of largest nets to list")
+        parser.add_argument('--net', action="store", dest='nets', nargs='+',
+                            default=None, help="Print the RC trees of these nets")
+        opt = parser.parse_args()
+        return opt
+
+    opt = parse_cl()
+
+    spef = Spef()
+    spef.read_spef(opt.src, set(opt.nets) if opt.nets else None)
+    spef.print_stats(opt.num_top)
+
+    for name in (opt.nets or ()):
+        if name in spef.trees:
+            print ("")
+            spef.trees[name].print_tree()
+        else:
+            sys.stderr.write("Warning: net %s is not in %s.\n" % (name, opt.src))
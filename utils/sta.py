@@ -0,0 +1,431 @@
+"""
+    A static timing estimator for placed gate-level netlists.
+
+    The netlist is flattened into arrays of sinks (input pins) and timing
+    arcs, the nets are levelized once, and arrival times are propagated one
+    level at a time. Cell delays come from the Liberty NLDM tables (worst of
+    rise and fall); wire delays are Elmore delays of a star from the driver
+    to each sink, with lengths from the Bookshelf placement. It is not
+    sign-off accurate; it is meant to rank placements in seconds.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import verilog_parser
+import liberty_parser
+import bookshelf
+import compressed_io
+import symbol_table
+
+# Local wire parasitics of the ICCAD 2015 contest
+WIRE_RES = 2.535    # ohm per micron
+WIRE_CAP = 0.16     # fF per micron
+
+LN9 = np.log(9.0)   # Elmore delay to 10-90% slew (PERI)
+
+
+def read_sdc(file_name):
+    """ Read the clock, port delays, input transitions and output loads. """
+    sdc = {'clock_port' : None, 'period' : 0.0,
+           'input_delay' : dict(), 'input_transition' : dict(),
+           'output_delay' : dict(), 'output_load' : dict()}
+
+    def value(tokens, key):
+        return float(tokens[tokens.index(key) + 1]) if key in tokens else 0.0
+
+    with compressed_io.open_file(file_name) as f:
+        for line in f:
+            tokens = line.replace('[', ' ').replace(']', ' ').split()
+            if len(tokens) == 0 or 'get_ports' not in tokens:
+                continue
+
+            port = tokens[tokens.index('get_ports') + 1]
+            if tokens[0] == 'create_clock':
+                sdc['clock_port'], sdc['period'] = port, value(tokens, '-period')
+            elif tokens[0] == 'set_input_delay':
+                sdc['input_delay'][port] = float(tokens[1])
+            elif tokens[0] == 'set_output_delay':
+                sdc['output_delay'][port] = float(tokens[1])
+            elif tokens[0] == 'set_driving_cell':
+                sdc['input_transition'][port] = \
+                    max(value(tokens, '-input_transition_rise'),
+                        value(tokens, '-input_transition_fall'))
+            elif tokens[0] == 'set_load':
+                sdc['output_load'][port] = value(tokens, '-pin_load')
+
+    return sdc
+
+
+class TimingGraph(object):
+    """ Array representation of the timing graph.
+
+    Nets are the graph vertices (a net carries the arrival time of its
+    driver), sinks are the input pins, and arcs go from a sink to the net
+    driven by the same instance.
+    """
+    def __init__(self, module, lib, sdc):
+        self.lib = lib
+        self.sdc = sdc
+        self.cell_arcs = dict()    # gate type : see get_cell_arcs
+
+        self.build(module)
+        self.levelize()
+
+
+    def get_cell_arcs(self, gate_type):
+        """ Return (in library, input pin caps, setup arcs, launch arcs,
+        combinational arcs) of a cell type, with table ids.
+        """
+        if gate_type not in self.cell_arcs:
+            cell = self.lib.cells.get(gate_type)
+            caps, setup, launch, comb = dict(), list(), list(), list()
+            for pin in (cell.pins.values() if cell is not None else ()):
+                caps[pin.name] = pin.capacitance
+                for arc in pin.timing:
+                    delay = arc.get_table_ids(('cell_rise', 'cell_fall'))
+                    slew = arc.get_table_ids(('rise_transition',
+                                              'fall_transition'))
+                    if arc.is_setup():
+                        setup.append((pin.name, arc.get_table_ids(
+                            ('rise_constraint', 'fall_constraint'))))
+                    elif arc.is_launch():
+                        launch.append((pin.name, delay, slew))
+                    elif arc.is_combinational():
+                        comb.extend((pin.name, related_pin, delay, slew)
+                                    for related_pin in arc.related_pins)
+            self.cell_arcs[gate_type] = (cell is not None, caps, setup,
+                                         launch, comb)
+        return self.cell_arcs[gate_type]
+
+
+    def build(self, module):
+        sdc = self.sdc
+        nets = symbol_table.SymbolTable(module.net_dict)
+        self.net_names = nets.names
+        net_id = nets.index
+        self.inst_names = [i.name for i in module.instances]
+        self.inst_types = [i.gate_type for i in module.instances]
+
+        num_nets = len(self.net_names)
+        self.driver = np.full(num_nets, -1, dtype=np.int64)
+        sink_net, sink_inst, sink_cap = list(), list(), list()
+        arc_sink, arc_net, arc_delay, arc_slew = list(), list(), list(), list()
+        launch_net, launch_delay, launch_slew = list(), list(), list()
+        end_sink, end_offset, end_setup = list(), list(), list()
+        missing = set()
+
+        for k, inst in enumerate(module.instances):
+            known, caps, setup, launch, comb = self.get_cell_arcs(inst.gate_type)
+            if not known and inst.gate_type not in ('PI', 'PO') \
+               and inst.gate_type not in verilog_parser.__tie_cells__ \
+               and not inst.gate_type.startswith(verilog_parser.__block_prefix__):
+                missing.add(inst.gate_type)
+
+            sinks = dict()
+            for pin, net in inst.input_pin_dict.items():
+                sinks[pin] = len(sink_net)
+                sink_net.append(net_id[net])
+                sink_inst.append(k)
+                sink_cap.append(caps.get(pin, 0.0))
+
+            if inst.gate_type == 'PO':
+                sink_cap[-1] = sdc['output_load'].get(inst.name, 0.0)
+                end_sink.append(len(sink_net) - 1)
+                end_offset.append(sdc['output_delay'].get(inst.name, 0.0))
+                end_setup.append([-1, -1])
+
+            for pin, ids in setup:
+                if pin in sinks:
+                    end_sink.append(sinks[pin])
+                    end_offset.append(0.0)
+                    end_setup.append(ids)
+
+            outputs = inst.output_pin_dict
+            for pin, net in outputs.items():
+                n = net_id[net]
+                if self.driver[n] < 0:
+                    self.driver[n] = k
+
+            for pin, delay, slew in launch:
+                if pin in outputs:
+                    launch_net.append(net_id[outputs[pin]])
+                    launch_delay.append(delay)
+                    launch_slew.append(slew)
+
+            for pin, related_pin, delay, slew in comb:
+                if pin in outputs and related_pin in sinks:
+                    arc_sink.append(sinks[related_pin])
+                    arc_net.append(net_id[outputs[pin]])
+                    arc_delay.append(delay)
+                    arc_slew.append(slew)
+
+        if len(missing) > 0:
+            sys.stderr.write("Warning: %d cell types are not in the library "
+                             "(e.g. %s).\n" % (len(missing), sorted(missing)[0]))
+
+        def int_array(x, columns=None):
+            a = np.array(x, dtype=np.int64)
+            return a.reshape(-1, columns) if columns else a
+
+        self.sink_net, self.sink_inst = int_array(sink_net), int_array(sink_inst)
+        self.sink_cap = np.array(sink_cap, dtype=np.float64)
+        self.arc_sink, self.arc_net = int_array(arc_sink), int_array(arc_net)
+        self.arc_delay, self.arc_slew = int_array(arc_delay, 2), int_array(arc_slew, 2)
+        self.launch_net = int_array(launch_net)
+        self.launch_delay = int_array(launch_delay, 2)
+        self.launch_slew = int_array(launch_slew, 2)
+        self.end_sink = int_array(end_sink)
+        self.end_offset = np.array(end_offset, dtype=np.float64)
+        self.end_setup = int_array(end_setup, 2)
+
+        # Primary inputs
+        pi = [k for k, t in enumerate(self.inst_types) if t == 'PI']
+        self.pi_net = int_array([net_id[self.inst_names[k]] for k in pi])
+        self.pi_delay = np.array([sdc['input_delay'].get(self.inst_names[k], 0.0)
+                                  for k in pi], dtype=np.float64)
+        self.pi_slew = np.array([sdc['input_transition'].get(self.inst_names[k], 0.0)
+                                 for k in pi], dtype=np.float64)
+        self.clock_slew = sdc['input_transition'].get(sdc['clock_port'], 0.0)
+
+
+    def levelize(self):
+        """ Topological levels of nets (longest arc count from a source).
+
+        Arcs on combinational loops are dropped.
+        """
+        num_nets = len(self.net_names)
+        src, dst = self.sink_net[self.arc_sink], self.arc_net
+        order = np.argsort(src, kind='stable')
+        start = np.searchsorted(src[order], np.arange(num_nets + 1))
+
+        indegree = np.bincount(dst, minlength=num_nets)
+        level = np.full(num_nets, -1, dtype=np.int64)
+        frontier, l = np.flatnonzero(indegree == 0), 0
+        while len(frontier) > 0:
+            level[frontier] = l
+            count = start[frontier + 1] - start[frontier]
+            offset = np.repeat(start[frontier] - (np.cumsum(count) - count), count)
+            targets = dst[order[np.arange(count.sum()) + offset]]
+            targets, count = np.unique(targets, return_counts=True)
+            indegree[targets] -= count
+            frontier = targets[indegree[targets] == 0]
+            l += 1
+
+        num_loop_nets = np.count_nonzero(level < 0)
+        if num_loop_nets > 0:
+            sys.stderr.write("Warning: %d nets are on combinational loops.\n"
+                             % (num_loop_nets))
+
+        valid = (level[src] >= 0) & (level[dst] >= 0)
+        arcs = np.flatnonzero(valid)
+        arcs = arcs[np.argsort(level[dst[arcs]], kind='stable')]
+        self.level_arcs = arcs
+        self.level_start = np.searchsorted(level[dst[arcs]], np.arange(l + 1))
+        self.num_levels = l
+
+
+    def lookup_worst(self, table_ids, x, y):
+        """ Worst of the rise and fall tables (table_ids has two columns). """
+        return self.lib.lookup(table_ids.ravel(), np.repeat(x, 2),
+                               np.repeat(y, 2)).reshape(-1, 2).max(axis=1)
+
+
+    def set_placement(self, bs, x_unit=1.0, y_unit=1.0,
+                      wire_res=WIRE_RES, wire_cap=WIRE_CAP):
+        """ Compute net loads and sink wire delays from a placement.
+
+        x_unit and y_unit convert Bookshelf coordinates into microns.
+        Instances missing in the placement get no wire.
+        """
+        node = np.array([bs.node_index.get(n, -1) for n in self.inst_names],
+                        dtype=np.int64)
+        placed = node >= 0
+        inst_x = np.where(placed, (bs.node_x + bs.node_width / 2)[node] * x_unit, 0.0)
+        inst_y = np.where(placed, (bs.node_y + bs.node_height / 2)[node] * y_unit, 0.0)
+
+        num_nets = len(self.net_names)
+        driver = self.driver[self.sink_net]
+        has_wire = placed[self.sink_inst] & (driver >= 0) & placed[driver]
+        dist = np.where(has_wire, np.abs(inst_x[self.sink_inst] - inst_x[driver])
+                                  + np.abs(inst_y[self.sink_inst] - inst_y[driver]), 0.0)
+
+        # HPWL of each net over its placed pins
+        nets = np.flatnonzero((self.driver >= 0) & placed[np.maximum(self.driver, 0)])
+        pin_net = np.concatenate((nets, self.sink_net[placed[self.sink_inst]]))
+        pin_inst = np.concatenate((self.driver[nets], self.sink_inst[placed[self.sink_inst]]))
+        order = np.argsort(pin_net, kind='stable')
+        pin_net, pin_inst = pin_net[order], pin_inst[order]
+        hpwl = np.zeros(num_nets)
+        if len(pin_net) > 0:
+            s = np.flatnonzero(np.r_[True, np.diff(pin_net) != 0])
+            x, y = inst_x[pin_inst], inst_y[pin_inst]
+            hpwl[pin_net[s]] = np.maximum.reduceat(x, s) - np.minimum.reduceat(x, s) \
+                               + np.maximum.reduceat(y, s) - np.minimum.reduceat(y, s)
+
+        cap_unit, time_unit = self.lib.cap_unit, self.lib.time_unit
+        c = wire_cap * 1e-15       # F per micron
+        self.load = np.bincount(self.sink_net, weights=self.sink_cap,
+                                minlength=num_nets) + hpwl * c / cap_unit
+        self.wire_delay = wire_res * dist * (c * dist / 2
+                                             + self.sink_cap * cap_unit) / time_unit
+
+
+    def propagate(self):
+        """ Propagate arrival times and slews; return the endpoint slacks. """
+        num_nets = len(self.net_names)
+        arrival, slew = np.zeros(num_nets), np.zeros(num_nets)
+        arrival[self.arc_net[self.level_arcs]] = -np.inf
+        self.pred = np.full(num_nets, -1, dtype=np.int64)
+
+        arrival[self.pi_net] = self.pi_delay
+        slew[self.pi_net] = self.pi_slew
+
+        n = self.launch_net
+        clock_slew = np.full(len(n), self.clock_slew)
+        np.maximum.at(arrival, n, self.lookup_worst(self.launch_delay,
+                                                    clock_slew, self.load[n]))
+        np.maximum.at(slew, n, self.lookup_worst(self.launch_slew,
+                                                 clock_slew, self.load[n]))
+
+        for l in range(1, self.num_levels):
+            a = self.level_arcs[self.level_start[l]:self.level_start[l + 1]]
+            s, dst = self.arc_sink[a], self.arc_net[a]
+            src = self.sink_net[s]
+            wire = self.wire_delay[s]
+            slew_in = np.sqrt(slew[src] ** 2 + (LN9 * wire) ** 2)
+            load = self.load[dst]
+
+            at = arrival[src] + wire \
+                 + self.lookup_worst(self.arc_delay[a], slew_in, load)
+            np.maximum.at(arrival, dst, at)
+            np.maximum.at(slew, dst, self.lookup_worst(self.arc_slew[a],
+                                                       slew_in, load))
+            critical = at >= arrival[dst]
+            self.pred[dst[critical]] = a[critical]
+
+        self.arrival, self.slew = arrival, slew
+
+        # Endpoints
+        s = self.end_sink
+        wire = self.wire_delay[s]
+        end_arrival = arrival[self.sink_net[s]] + wire
+        end_slew = np.sqrt(slew[self.sink_net[s]] ** 2 + (LN9 * wire) ** 2)
+        setup = self.lookup_worst(self.end_setup, end_slew,
+                                  np.full(len(s), self.clock_slew))
+        required = self.sdc['period'] - self.end_offset - setup
+        return required - end_arrival
+
+
+    def get_critical_path(self, endpoint):
+        """ Return (instance, gate type, arrival) from the endpoint back to
+        the start point.
+        """
+        s = self.end_sink[endpoint]
+        path = [(self.inst_names[self.sink_inst[s]], self.inst_types[self.sink_inst[s]],
+                 self.arrival[self.sink_net[s]] + self.wire_delay[s])]
+        n = self.sink_net[s]
+        while n >= 0:
+            k = self.driver[n]
+            if k >= 0:
+                path.append((self.inst_names[k], self.inst_types[k], self.arrival[n]))
+            a = self.pred[n]
+            n = self.sink_net[self.arc_sink[a]] if a >= 0 else -1
+        return path
+
+
+def analyze(graph, bs, x_unit, y_unit, wire_res, wire_cap, verbose=True):
+    """ Time one placement; return (WNS, TNS). """
+    graph.set_placement(bs, x_unit, y_unit, wire_res, wire_cap)
+    slack = graph.propagate()
+    if len(slack) == 0:
+        return 0.0, 0.0
+
+    worst = int(np.argmin(slack))
+    wns, tns = min(slack[worst], 0.0), slack[slack < 0].sum()
+    if verbose:
+        print ("==================================================")
+        print ("Clock period       : %.2f" % (graph.sdc['period']))
+        print ("Number of levels   : %d" % (graph.num_levels))
+        print ("Number of endpoints: %d" % (len(slack)))
+        print ("Violating endpoints: %d" % (np.count_nonzero(slack < 0)))
+        print ("Worst slack        : %.2f" % (slack[worst]))
+        print ("WNS                : %.2f" % (wns))
+        print ("TNS                : %.2f" % (tns))
+        print ("==================================================")
+        print ("Critical path (endpoint first):")
+        for name, gate_type, at in graph.get_critical_path(worst):
+            print ("  %-30s %-12s %12.2f" % (name, gate_type, at))
+        print ("")
+    return wns, tns
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Estimate the timing of placed netlists.')
+    parser.add_argument('--verilog', action="store", dest='src_v', required=True)
+    parser.add_argument('--lib', action="store", dest='src_lib', required=True,
+                        help="Late Liberty library")
+    parser.add_argument('--sdc', action="store", dest='src_sdc', required=True)
+    parser.add_argument('--nodes', action="store", dest='src_nodes', required=True)
+    parser.add_argument('--pl', action="store", dest='src_pl', nargs='+',
+                        required=True, help="Placements to time and rank")
+    parser.add_argument('--lef', action="store", dest='src_lef', default=None,
+                        help="LEF for the Bookshelf unit (default: microns)")
+    parser.add_argument('--lib_cache', action="store", dest='lib_cache',
+                        default=liberty_parser.DEFAULT_CACHE_DIR,
+                        help="Cache of parsed libraries ('' to disable)")
+    parser.add_argument('--wire_res', action="store", type=float,
+                        dest='wire_res', default=WIRE_RES,
+                        help="Wire resistance in ohm/um (default: %(default)s)")
+    parser.add_argument('--wire_cap', action="store", type=float,
+                        dest='wire_cap', default=WIRE_CAP,
+                        help="Wire capacitance in fF/um (default: %(default)s)")
+    parser.add_argument('-j', action="store", type=int, dest='num_workers',
+                        default=1, help="Number of verilog parsing processes")
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    x_unit, y_unit = 1.0, 1.0
+    if opt.src_lef is not None:
+        import lef_parser
+        the_lef = lef_parser.Lef()
+        the_lef.read_lef(opt.src_lef)
+        x_unit = the_lef.metal_layer_dict['metal2']
+        y_unit = the_lef.metal_layer_dict['metal1']
+
+    module = verilog_parser.Module()
+    module.read_verilog(opt.src_v, opt.num_workers)
+
+    lib = liberty_parser.Liberty()
+    lib.read_lib(opt.src_lib, opt.lib_cache)
+    lib.print_stats()
+
+    graph = TimingGraph(module, lib, read_sdc(opt.src_sdc))
+
+    bs = bookshelf.Bookshelf()
+    bs.read_nodes(opt.src_nodes)
+
+    results = list()
+    for pl in opt.src_pl:
+        print ("Placement          : %s" % (pl))
+        bs.read_pl(pl)
+        results.append((pl,) + analyze(graph, bs, x_unit, y_unit,
+                                       opt.wire_res, opt.wire_cap))
+
+    if len(results) > 1:
+        print ("Ranking (by TNS, then WNS):")
+        results.sort(key=lambda r: (-r[2], -r[1]))
+        for rank, (pl, wns, tns) in enumerate(results):
+            print ("  %2d %-50s WNS %12.2f TNS %14.2f" % (rank + 1, pl, wns, tns))
@@ -0,0 +1,376 @@
+"""
+    A parameter sweep over the flow.
+
+    Each swept parameter first affects one group of stages:
+
+        max_fo          100 (logic synthesis)
+        target_density  300 - 440 (placement, timing, sizing)
+        tile_size,      500 - 510 (global routing)
+        adjustment
+
+    Floorplanning (200) has no parameter of its own, since its rows come
+    from the DEF of the bench; it runs once per synthesized netlist.
+
+    Each group runs once for each distinct combination of the parameters up to
+    and including its own, in a flow tree of its own under the sweep
+    directory. The stage scripts are copied into the tree and the outputs of
+    upstream groups are linked in, so grid points that differ only
+    downstream share the upstream artifacts. A group that has already
+    finished in an earlier sweep is not run again.
+
+    Groups run in parallel through tool_runner, and the results of all
+    grid points are written to <sweep_dir>/sweep_results.txt.
+"""
+
+from __future__ import print_function, division
+import sys, os, re, shutil, asyncio, itertools
+
+import hpwl
+import tool_runner
+
+ROOT_DIR = tool_runner.ROOT_DIR
+CONFIG = os.path.join(ROOT_DIR, '000_config', 'config.sh')
+
+# Stage groups in flow order: (name, parameters, stage directories)
+GROUPS = (('synth', ('max_fo',), ('100_logic_synthesis',)),
+          ('floorplan', (), ('200_floorplanning',)),
+          ('place', ('target_density',),
+           ('300_placement', '310_write_def', '320_timing', '400_gate_sizing',
+            '410_write_bookshelf', '420_legalization', '430_write_def',
+            '440_timing')),
+          ('route', ('tile_size', 'adjustment'),
+           ('500_gr_bench_gen', '510_global_route')))
+
+PARAMS = [p for g in GROUPS for p in g[1]]
+PARAM_ABBREVS = {'max_fo' : 'fo', 'target_density' : 'td', 'tile_size' : 'ts',
+                 'adjustment' : 'adj'}
+DONE_FILE = 'done.txt'
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description="Run the flow over a grid of parameters. A value "
+                            "can be a range start:stop:step. Parameters not "
+                            "given take their value in config.sh.")
+    for p in PARAMS:
+        parser.add_argument('--' + p, action="store", dest=p, nargs='+')
+    parser.add_argument('--sweep_dir', action="store", dest='sweep_dir',
+                        default=os.path.join(ROOT_DIR, 'sweep'))
+    parser.add_argument('-j', action="store", type=int, dest='max_jobs',
+                        help="Maximum number of groups run at a time")
+    parser.add_argument('--timeout', action="store", type=float, dest='timeout',
+                        help="Timeout (s) of each group")
+    parser.add_argument('--rerun', action="store_true", dest='rerun',
+                        help="Run groups again even if they have finished")
+
+    return parser.parse_args()
+
+
+def parse_values(tokens):
+    """ Expand start:stop:step ranges (stop included). """
+    values = list()
+    for t in tokens:
+        if ':' not in t:
+            values.append(t)
+            continue
+
+        start, stop, step = [float(v) for v in t.split(':')]
+        if step <= 0:
+            sys.stderr.write("Error: invalid range %s.\n" % (t))
+            raise SystemExit(-1)
+        num = int((stop - start) / step + 1e-9) + 1
+        is_int = all(v.lstrip('-').isdigit() for v in t.split(':'))
+        for i in range(num):
+            v = start + i * step
+            values.append(str(int(v)) if is_int else '%g' % (round(v, 9)))
+    return values
+
+
+def read_config(file_name):
+    """ Return the text of config.sh and its scalar name : value pairs. """
+    with open(file_name) as f:
+        text = f.read()
+    config = dict(re.findall(r'^\s*(\w+)=([^(\s][^\s]*)\s*$', text, re.M))
+    return text, config
+
+
+def write_config(text, values, file_name):
+    """ Write config.sh with the given parameter values. """
+    for name, value in sorted(values.items()):
+        line = '%s=%s' % (name, value)
+        text, num = re.subn(r'^(\s*)%s=.*$' % (name), r'\g<1>' + line, text,
+                            flags=re.M)
+        if num == 0:
+            text = text.rstrip() + '\n' + line + '\n'
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def get_list(text, name):
+    """ Values of the bash array name in config.sh. """
+    m = re.search(r'^\s*%s=\((.*)\)' % (name), text, re.M)
+    return re.findall(r'"([^"]*)"', m.group(1)) if m else list()
+
+
+def get_key_name(values):
+    return '_'.join('%s%s' % (PARAM_ABBREVS[p], v) for p, v in values)
+
+
+def link_tree(src, dest):
+    """ Recreate directory src at dest with links to its files. """
+    shutil.copytree(src, dest,
+                    copy_function=lambda s, d: os.symlink(os.path.realpath(s), d),
+                    ignore_dangling_symlinks=True)
+
+
+class Group(object):
+    """ One run of a group of stages, for the values of the parameters up
+    to and including the group's.
+    """
+    def __init__(self, level, values, parent, sweep_dir):
+        self.level = level
+        self.name, self.params, self.stages = GROUPS[level]
+        self.values = values        # ((parameter, value), ...)
+        self.parent = parent
+        self.dir = os.path.join(sweep_dir, self.name, get_key_name(values))
+        self.result = None          # tool_runner.JobResult
+        self.run_time = 0.0         # including the parent groups
+        self.fresh = False          # run in this sweep
+
+
+    def is_done(self):
+        return os.path.exists(os.path.join(self.dir, DONE_FILE))
+
+
+    def prepare(self, config_text):
+        """ Create the flow tree of the group. """
+        if os.path.isdir(self.dir):
+            shutil.rmtree(self.dir)
+        os.makedirs(os.path.join(self.dir, '000_config'))
+        write_config(config_text, dict(self.values),
+                     os.path.join(self.dir, '000_config', 'config.sh'))
+
+        for name in ('bench', 'bin', 'utils'):
+            os.symlink(os.path.join(ROOT_DIR, name), os.path.join(self.dir, name))
+
+        # Upstream stages: links to the outputs of the parent groups
+        if self.parent is not None:
+            for level in range(self.level):
+                for stage in GROUPS[level][2]:
+                    link_tree(os.path.join(self.parent.dir, stage),
+                              os.path.join(self.dir, stage))
+
+        # Stages of this group: their scripts only
+        for stage in self.stages:
+            os.makedirs(os.path.join(self.dir, stage))
+            for f in os.listdir(os.path.join(ROOT_DIR, stage)):
+                if f.startswith('run_') or f == 'Makefile':
+                    shutil.copy2(os.path.join(ROOT_DIR, stage, f),
+                                 os.path.join(self.dir, stage, f))
+
+
+    def get_job(self, timeout):
+        cmds = [['bash', '-c', 'cd %s && ./run_batch' \
+                 % (os.path.join(self.dir, stage))] for stage in self.stages]
+        name = '%s_%s' % (self.name, get_key_name(self.values))
+        return tool_runner.Job(name, cmds, self.dir, timeout=timeout)
+
+
+class Sweep(object):
+    def __init__(self, grid, sweep_dir, max_jobs=None, timeout=None, rerun=False):
+        self.grid = grid            # parameter : list of values
+        self.sweep_dir = os.path.abspath(sweep_dir)
+        self.timeout = timeout
+        self.rerun = rerun
+        self.runner = tool_runner.ToolRunner(max_jobs)
+        self.config_text, config = read_config(CONFIG)
+        self.bench_list = get_list(self.config_text, 'bench_list')
+        self.script_list = get_list(self.config_text, 'script_list')
+        self.placer_list = get_list(self.config_text, 'placer_list')
+        self.router_list = get_list(self.config_text, 'router_list')
+
+        self.groups = dict()        # (level, values) : Group
+        self.tasks = dict()         # Group : asyncio task
+
+
+    def get_points(self):
+        """ All grid points, as ((parameter, value), ...). """
+        values = [[(p, v) for v in self.grid[p]] for p in PARAMS]
+        return list(itertools.product(*values))
+
+
+    def get_group(self, level, point):
+        num = sum(len(g[1]) for g in GROUPS[:level + 1])
+        key = (level, point[:num])
+        if key not in self.groups:
+            parent = self.get_group(level - 1, point) if level > 0 else None
+            self.groups[key] = Group(level, point[:num], parent, self.sweep_dir)
+        return self.groups[key]
+
+
+    async def run_group(self, group):
+        if group.parent is not None:
+            await self.get_task(group.parent)
+            if group.parent.result is None or group.parent.result.status != 'done':
+                print ("Skipping %s: upstream failed." % (group.dir))
+                return
+            group.run_time = group.parent.run_time
+
+        if not self.rerun and group.is_done() \
+           and (group.parent is None or not group.parent.fresh):
+            with open(os.path.join(group.dir, DONE_FILE)) as f:
+                run_time = float(f.read())
+            group.result = tool_runner.JobResult(group.get_job(None), 'done',
+                                                 0, run_time, list())
+        else:
+            group.prepare(self.config_text)
+            group.fresh = True
+            group.result = await self.runner.run_job(group.get_job(self.timeout))
+            if group.result.status == 'done':
+                with open(os.path.join(group.dir, DONE_FILE), 'w') as f:
+                    f.write('%.1f\n' % (group.result.run_time))
+        group.run_time += group.result.run_time
+
+
+    def get_task(self, group):
+        if group not in self.tasks:
+            self.tasks[group] = asyncio.ensure_future(self.run_group(group))
+        return self.tasks[group]
+
+
+    async def run_all(self, leaves):
+        await asyncio.gather(*[self.get_task(g) for g in leaves])
+
+
+    def run(self):
+        points = self.get_points()
+        leaves = [self.get_group(len(GROUPS) - 1, p) for p in points]
+        print ("Grid points        : %d" % (len(points)))
+        for level in range(len(GROUPS)):
+            print ("%-19s: %d" % ('%s runs' % (GROUPS[level][0]),
+                   len(set(self.get_group(level, p) for p in points))))
+        sys.stdout.flush()
+
+        asyncio.run(self.run_all(leaves))
+
+        rows = list()
+        for point, leaf in zip(points, leaves):
+            rows.extend(self.get_results(point, leaf))
+        self.write_results(rows, os.path.join(self.sweep_dir, 'sweep_results.txt'))
+
+
+    def get_results(self, point, leaf):
+        """ Rows of metrics of a grid point, one per bench/script/placer/router. """
+        floorplan, place = leaf.parent.parent.dir, leaf.parent.dir
+        values = [v for p, v in point]
+
+        rows = list()
+        for bench in self.bench_list:
+            for script in self.script_list:
+                sta = get_sta_results(os.path.join(place, '320_timing',
+                                     '%s_%s_sta.log.txt' % (bench, script)))
+                for placer in self.placer_list:
+                    base_name = '%s_%s_%s' % (bench, script, placer)
+                    pl = os.path.join(place, '300_placement', base_name,
+                                      bench + '_solution.pl')
+                    bookshelf = os.path.join(floorplan, '200_floorplanning',
+                                             'bookshelf-%s_%s' % (bench, script), bench)
+                    wl = get_hpwl(bookshelf, pl)
+                    wns, tns = sta.get(os.path.realpath(pl), (None, None))
+
+                    for router in self.router_list:
+                        out_name = '%s_%s' % (base_name, router)
+                        tot_of, max_of = get_overflow(
+                            os.path.join(leaf.dir, '510_global_route',
+                                         'gr_' + out_name, out_name + '.eval'))
+                        rows.append(values + [bench, script, placer, router,
+                                              wl, tot_of, max_of, wns, tns,
+                                              leaf.run_time,
+                                              leaf.result.status if leaf.result
+                                              else 'skipped'])
+        return rows
+
+
+    def write_results(self, rows, file_name):
+        header = [PARAM_ABBREVS[p] for p in PARAMS] \
+                 + ['bench', 'script', 'placer', 'router', 'HPWL', 'TotOF',
+                    'MaxOF', 'WNS', 'TNS', 'Time(s)', 'Status']
+
+        def fmt(v):
+            if v is None:
+                return '-'
+            return '%.2f' % (v) if isinstance(v, float) else str(v)
+
+        lines = [header] + [[fmt(v) for v in r] for r in rows]
+        widths = [max(len(l[i]) for l in lines) for i in range(len(header))]
+        with open(file_name, 'w') as f:
+            for l in lines:
+                f.write('  '.join(v.rjust(w) for v, w in zip(l, widths)) + '\n')
+
+        print ("")
+        with open(file_name) as f:
+            sys.stdout.write(f.read())
+        print ("Results            : %s" % (file_name))
+
+
+def get_hpwl(bookshelf, pl):
+    if not os.path.exists(pl) or not os.path.exists(bookshelf + '.nets'):
+        return None
+    bs = hpwl.read_design(bookshelf + '.nodes', bookshelf + '.nets', pl)
+    return float(hpwl.get_net_hpwl(bs).sum())
+
+
+def get_sta_results(log):
+    """ Placement : (WNS, TNS) from the log of sta.py. """
+    results = dict()
+    if not os.path.exists(log):
+        return results
+
+    pl, wns = None, None
+    with open(log) as f:
+        for line in f:
+            tokens = line.split(':', 1)
+            if len(tokens) != 2:
+                continue
+            name, value = tokens[0].strip(), tokens[1].strip()
+            if name == 'Placement':
+                pl = os.path.realpath(os.path.join(os.path.dirname(log), value))
+            elif name == 'WNS':
+                wns = float(value)
+            elif name == 'TNS' and pl is not None:
+                results[pl] = (wns, float(value))
+    return results
+
+
+def get_overflow(eval_file):
+    """ (total, max) overflow from the output of 510_eval2008.py. """
+    if not os.path.exists(eval_file):
+        return None, None
+    with open(eval_file) as f:
+        for line in f:
+            m = re.match(r'^\S+, \S+\s+(\d+)\s+(\d+)\s+\d+\s*$', line)
+            if m:
+                return int(m.group(1)), int(m.group(2))
+    return None, None
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    config = read_config(CONFIG)[1]
+    grid = dict()
+    for p in PARAMS:
+        tokens = getattr(opt, p)
+        if tokens is None:
+            tokens = [config.get(p)]
+            if tokens[0] is None:
+                sys.stderr.write("Error: %s is not set in %s.\n" % (p, CONFIG))
+                raise SystemExit(-1)
+        grid[p] = parse_values(tokens)
+
+    Sweep(grid, opt.sweep_dir, opt.max_jobs, opt.timeout, opt.rerun).run()
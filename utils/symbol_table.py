@@ -0,0 +1,89 @@
+"""
+    A symbol table for net, node and instance names.
+
+    Each name is stored once and gets a dense integer id in insertion order,
+    so parsers and writers can keep ids in NumPy arrays and compare or join
+    on integers instead of strings.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+
+class SymbolTable(object):
+    def __init__(self, names=()):
+        self.names = list(names)    # id : name
+        self.index = {n : i for i, n in enumerate(self.names)}     # name : id
+
+        if len(self.index) != len(self.names):  # Keep the first of duplicates
+            names, self.names, self.index = self.names, list(), dict()
+            self.add_all(names)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __contains__(self, name):
+        return name in self.index
+
+
+    def __iter__(self):
+        return iter(self.names)
+
+
+    def add(self, name):
+        """ Return the id of name, adding it if it is new. """
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+
+    def add_all(self, names):
+        """ Add names and return their ids as an array. """
+        return np.fromiter((self.add(n) for n in names), dtype=np.int64)
+
+
+    def intern(self, name):
+        """ Return the stored copy of name, adding it if it is new. """
+        return self.names[self.add(name)]
+
+
+    def get_id(self, name, default=-1):
+        return self.index.get(name, default)
+
+
+    def get_ids(self, names, default=-1):
+        """ Ids of names as an array; unknown names get default. """
+        index = self.index
+        return np.fromiter((index.get(n, default) for n in names), dtype=np.int64)
+
+
+    def get_name(self, i):
+        return self.names[i]
+
+
+    def get_names(self, ids):
+        names = self.names
+        return [names[i] for i in ids]
+
+
+    def get_sort_rank(self):
+        """ rank[i] is the position of name i in sorted name order. """
+        order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank
+
+
+def get_unique_table(names, kind, file_name):
+    """ Return a SymbolTable of names, which must be unique. """
+    table = SymbolTable(names)
+    if len(table) != len(names):
+        sys.stderr.write("Error: duplicate %s names in %s.\n" % (kind, file_name))
+        raise SystemExit(-1)
+    return table
@@ -0,0 +1,109 @@
+"""
+    LEF to Bookshelf unit conversion.
+
+    Bookshelf x is in metal2 pitches and y in metal1 pitches. A TechUnits is
+    built once from a parsed Lef: it keeps the pitches and DEF database
+    units per Bookshelf unit, and the Bookshelf width, height and pin
+    offsets of every macro in NumPy arrays, so that the Bookshelf writers
+    look sizes up instead of recomputing them per instance.
+"""
+
+from __future__ import print_function, division
+import sys
+
+import numpy as np
+
+import symbol_table
+
+M1_LAYER_NAME = 'metal1'
+M2_LAYER_NAME = 'metal2'
+
+
+class TechUnits(object):
+    def __init__(self, the_lef):
+        self.lef = the_lef
+
+        m1_layer_name = the_lef.m1_layer_name or M1_LAYER_NAME
+        m2_layer_name = the_lef.m2_layer_name or M2_LAYER_NAME
+        try:
+            self.x_pitch = the_lef.metal_layer_dict[m2_layer_name]
+            self.y_pitch = the_lef.metal_layer_dict[m1_layer_name]
+        except KeyError as e:
+            sys.stderr.write("Error: no pitch of layer %s in the LEF.\n" % (e.args[0]))
+            raise SystemExit(-1)
+
+        # DEF units per Bookshelf unit
+        self.dbu_per_micron = the_lef.units_distance_microns
+        self.x_dbu = self.x_pitch * self.dbu_per_micron
+        self.y_dbu = self.y_pitch * self.dbu_per_micron
+
+        # Site, in Bookshelf units (not rounded)
+        self.site_width = the_lef.site_width / self.x_pitch \
+                          if the_lef.site_width is not None else None
+        self.site_height = the_lef.site_height / self.y_pitch \
+                           if the_lef.site_height is not None else None
+
+        # Macros (the first one of duplicate names)
+        macros = the_lef.macros
+        self.macro_table = symbol_table.SymbolTable(m.name for m in macros)
+        self.macros = [None] * len(self.macro_table)
+        for m in reversed(macros):
+            self.macros[self.macro_table.get_id(m.name)] = m
+
+        width = np.array([m.width for m in self.macros], dtype=np.float64)
+        height = np.array([m.height for m in self.macros], dtype=np.float64)
+        self.macro_width = np.ceil(width / self.x_pitch).astype(np.int64)
+        self.macro_height = np.ceil(height / self.y_pitch).astype(np.int64)
+        self.macro_class = [m.macro_class for m in self.macros]
+
+        # Pins: (macro name, pin name) : (direction, x offset, y offset),
+        # offsets from the macro center
+        pin_keys, pin_dirs, pin_macro, pin_x, pin_y = [], [], [], [], []
+        for i, m in enumerate(self.macros):
+            for p in m.pin_list:
+                pin_keys.append((m.name, p.name))
+                pin_dirs.append(p.direction[0])
+                pin_macro.append(i)
+                pin_x.append(p.x)
+                pin_y.append(p.y)
+        pin_macro = np.array(pin_macro, dtype=np.int64)
+        center_x = (width / self.x_pitch) * 0.5
+        center_y = (height / self.y_pitch) * 0.5
+        pin_dx = np.array(pin_x, dtype=np.float64) / self.x_pitch - center_x[pin_macro]
+        pin_dy = np.array(pin_y, dtype=np.float64) / self.y_pitch - center_y[pin_macro]
+
+        self.pins = dict()
+        for key, pin in zip(pin_keys, zip(pin_dirs, pin_dx.tolist(), pin_dy.tolist())):
+            self.pins.setdefault(key, pin)
+
+
+    def get_macro_id(self, name):
+        return self.macro_table.get_id(name)
+
+
+    def get_macro_ids(self, names):
+        """ Ids of macro names as an array; unknown names get -1. """
+        return self.macro_table.get_ids(names)
+
+
+    def get_size(self, name):
+        """ Return the Bookshelf (width, height) of a macro. """
+        i = self.macro_table.get_id(name)
+        if i < 0:
+            sys.stderr.write("Error: no macro %s in the LEF.\n" % (name))
+            raise SystemExit(-1)
+        return int(self.macro_width[i]), int(self.macro_height[i])
+
+
+    def get_pin(self, macro_name, pin_name):
+        """ Return (direction, x offset, y offset) of a macro pin, or None. """
+        return self.pins.get((macro_name, pin_name))
+
+
+    def to_bookshelf_x(self, x):
+        """ DEF x to Bookshelf x (not rounded). """
+        return x / self.x_dbu
+
+
+    def to_bookshelf_y(self, y):
+        return y / self.y_dbu
@@ -0,0 +1,126 @@
+"""
+    Check that 200_gen_bookshelf.py writes the same Bookshelf files whether
+    the verilog is parsed serially or in parallel (-j).
+
+    Run from the utils directory: python3 -m unittest test_gen_bookshelf
+"""
+
+from __future__ import print_function, division
+import sys, os, shutil, random, tempfile, subprocess, unittest
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+GEN_BOOKSHELF = os.path.join(UTILS_DIR, '200_gen_bookshelf.py')
+
+CLOCK_PORT = 'iccad_clk'
+NUM_INPUTS, NUM_OUTPUTS, NUM_GATES = 20, 20, 2000
+
+# macro : (width, pins), the output pin last
+MACROS = {'in01f01' : (0.38, ('a', 'o')),
+          'na02f01' : (0.57, ('a', 'b', 'o')),
+          'ms00f80' : (1.90, ('ck', 'd', 'o'))}
+
+
+def get_lef():
+    lines = ["VERSION 5.7 ;", "UNITS", "DATABASE MICRONS 2000 ;", "END UNITS",
+             "LAYER metal1", "TYPE ROUTING ;", "DIRECTION HORIZONTAL ;",
+             "PITCH 0.19 ;", "WIDTH 0.07 ;", "END metal1",
+             "LAYER metal2", "TYPE ROUTING ;", "DIRECTION VERTICAL ;",
+             "PITCH 0.19 ;", "WIDTH 0.07 ;", "END metal2",
+             "SITE core", "CLASS CORE ;", "SIZE 0.19 BY 1.71 ;", "END core"]
+    for macro, (width, pins) in sorted(MACROS.items()):
+        lines += ["MACRO %s" % (macro), "CLASS CORE ;", "ORIGIN 0 0 ;",
+                  "SIZE %.2f BY 1.71 ;" % (width), "SITE core ;"]
+        for k, pin in enumerate(pins):
+            x = 0.05 + 0.19 * k
+            lines += ["PIN %s" % (pin),
+                      "DIRECTION %s ;" % ('OUTPUT' if pin == 'o' else 'INPUT'),
+                      "PORT", "LAYER metal1 ;",
+                      "RECT %.3f 0.5 %.3f 0.6 ;" % (x, x + 0.07), "END",
+                      "END %s" % (pin)]
+        lines.append("END %s" % (macro))
+    lines.append("END LIBRARY")
+    return '\n'.join(lines) + '\n'
+
+
+def get_verilog(seed=1):
+    """ A random netlist of NUM_GATES gates driving one wire each. """
+    rand = random.Random(seed)
+    inputs = [CLOCK_PORT] + ['pi%d' % (i) for i in range(NUM_INPUTS)]
+    outputs = ['po%d' % (i) for i in range(NUM_OUTPUTS)]
+    wires = ['n%d' % (i) for i in range(NUM_GATES)]
+
+    gates = list()
+    for i, wire in enumerate(wires):
+        macro = rand.choice(sorted(MACROS))
+        sources = inputs[1:] + wires[:i]
+        pins = ["ck(%s)" % (CLOCK_PORT) if p == 'ck' else
+                "%s(%s)" % (p, wire if p == 'o' else rand.choice(sources))
+                for p in MACROS[macro][1]]
+        gates.append("%s g%d ( .%s );" % (macro, i, ', .'.join(pins)))
+    for i, po in enumerate(outputs):
+        gates.append("in01f01 b%d ( .a(%s), .o(%s) );" % (i, wires[-1 - i], po))
+
+    lines = ["module top (", ',\n'.join(inputs + outputs) + ");", ""]
+    lines += ["input %s;" % (i) for i in inputs]
+    lines += ["output %s;" % (o) for o in outputs]
+    lines += ["wire %s;" % (w) for w in wires] + [""]
+    lines += gates + ["", "endmodule"]
+    return '\n'.join(lines) + '\n'
+
+
+class TestParallelVerilog(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='test_gen_bookshelf_')
+        self.src_v = os.path.join(self.work_dir, 'top.v')
+        self.src_lef = os.path.join(self.work_dir, 'top.lef')
+        with open(self.src_v, 'w') as f:
+            f.write(get_verilog())
+        with open(self.src_lef, 'w') as f:
+            f.write(get_lef())
+
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+    def gen_bookshelf(self, name, *args):
+        """ Run 200_gen_bookshelf.py and return {file name : content}. """
+        out_dir = os.path.join(self.work_dir, name)
+        os.makedirs(out_dir)
+        cmd = [sys.executable, GEN_BOOKSHELF, '-i', self.src_v,
+               '--lef', self.src_lef, '--clock', CLOCK_PORT, '-o', 'top'] \
+              + list(args)
+        proc = subprocess.run(cmd, cwd=out_dir, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, universal_newlines=True)
+        self.assertEqual(proc.returncode, 0, proc.stdout)
+
+        files = dict()
+        for name in os.listdir(out_dir):
+            with open(os.path.join(out_dir, name)) as f:
+                files[name] = f.read()
+        self.assertIn('top.nets', files)
+        return files
+
+
+    def check_parallel(self, *args):
+        serial = self.gen_bookshelf('serial', *args)
+        parallel = self.gen_bookshelf('parallel', '-j', '3', *args)
+        self.assertEqual(sorted(serial), sorted(parallel))
+        for name in sorted(serial):
+            self.assertEqual(serial[name], parallel[name], "%s differs" % (name))
+
+
+    def test_parallel(self):
+        self.check_parallel()
+
+
+    def test_parallel_remove_clock_port(self):
+        self.check_parallel('--remove_clock_port')
+
+
+    def test_parallel_mem_budget(self):
+        self.check_parallel('--mem_budget', '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
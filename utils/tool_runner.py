@@ -0,0 +1,467 @@
+"""
+    An asyncio runner for the external tools of the flow.
+
+    Each job runs its commands in a scratch directory of its own, into which
+    the input files are linked, so that placers or routers writing fixed
+    file names (out.pl, *.plt, ...) can run at the same time. Tool output is
+    streamed to the console and to the job log as it is produced. A job has
+    a timeout and is pinned to its own CPUs. Its output files are moved to
+    the output directory when it finishes.
+
+    run_place.sh, run_groute.sh and run_sizer.sh run their tool through this
+    script, as a single job with --out_dir and --log.
+"""
+
+from __future__ import print_function, division
+import sys, os, glob, shutil, signal, tempfile, asyncio
+from time import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN_DIR = os.path.join(ROOT_DIR, 'bin')
+
+PLACERS = ('ComPLx', 'NTUPlace3', 'mPL6', 'mPL5', 'Capo', 'FastPlace-GP')
+ROUTERS = ('NCTUgr', 'FastRoute', 'BFG-R')
+SIZERS = ('USizer',)
+
+# Default timeouts (s) of each tool
+TOOL_TIMEOUTS = {'ComPLx' : 4 * 3600, 'NTUPlace3' : 4 * 3600,
+                 'mPL6' : 4 * 3600, 'mPL5' : 4 * 3600, 'Capo' : 4 * 3600,
+                 'FastPlace-GP' : 4 * 3600, 'NCTUgr' : 8 * 3600,
+                 'FastRoute' : 8 * 3600, 'BFG-R' : 8 * 3600,
+                 'USizer' : 8 * 3600}
+
+BOOKSHELF_EXTS = ('aux', 'nodes', 'nets', 'wts', 'scl', 'pl', 'shapes')
+NCTUGR_DATA = ('POWV9.dat', 'POST9.dat', 'PORT9.dat')
+KILL_WAIT = 5       # Seconds between SIGTERM and SIGKILL
+
+
+def parse_cl():
+    """ parse and check command line options
+    @return: dict - optinos key/value
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+                description='Run placers, global routers or a gate sizer '
+                            'concurrently.')
+    parser.add_argument('--placers', action="store", dest='placers', nargs='+',
+                        choices=PLACERS, help="Placers to run")
+    parser.add_argument('--bench', action="store", dest='bench')
+    parser.add_argument('--bookshelf_dir', action="store", dest='bookshelf_dir')
+    parser.add_argument('--target_density', action="store", dest='target_density',
+                        default='0.85')
+    parser.add_argument('--routers', action="store", dest='routers', nargs='+',
+                        choices=ROUTERS, help="Global routers to run")
+    parser.add_argument('--gr', action="store", dest='input_gr')
+    parser.add_argument('--sizer', action="store", dest='sizer',
+                        choices=SIZERS, help="Gate sizer to run")
+    parser.add_argument('--verilog', action="store", dest='verilog')
+    parser.add_argument('--sdc', action="store", dest='sdc')
+    parser.add_argument('--spef', action="store", dest='spef')
+    parser.add_argument('--lib', action="store", dest='lib')
+    parser.add_argument('--out_prefix', action="store", dest='out_prefix',
+                        help="Each job writes <out_prefix>_<tool>; with "
+                             "--out_dir, the output name of a router or sizer")
+    parser.add_argument('--out_dir', action="store", dest='out_dir',
+                        help="Output directory of a single job")
+    parser.add_argument('--log', action="store", dest='log',
+                        help="Log file of a single job (default: "
+                             "<tool>.log.txt in its output directory)")
+    parser.add_argument('--timeout', action="store", type=float, dest='timeout',
+                        help="Timeout (s) of each job")
+    parser.add_argument('-j', action="store", type=int, dest='max_jobs',
+                        help="Maximum number of concurrent jobs (default: "
+                             "one per CPU set)")
+    parser.add_argument('--cpus_per_job', action="store", type=int,
+                        dest='cpus_per_job', default=1)
+    parser.add_argument('--keep_scratch', action="store_true", dest='keep_scratch')
+
+    opt = parser.parse_args()
+
+    tools = (opt.placers or []) + (opt.routers or [])
+    if opt.sizer is not None:
+        tools.append(opt.sizer)
+    if not tools:
+        parser.error("One of --placers, --routers or --sizer is required.")
+    if opt.placers is not None and (opt.bench is None or opt.bookshelf_dir is None):
+        parser.error("--placers requires --bench and --bookshelf_dir.")
+    if opt.routers is not None and opt.input_gr is None:
+        parser.error("--routers requires --gr.")
+    if opt.sizer is not None and None in (opt.verilog, opt.sdc, opt.spef, opt.lib):
+        parser.error("--sizer requires --verilog, --sdc, --spef and --lib.")
+
+    if opt.out_dir is not None or opt.log is not None:
+        if len(tools) != 1:
+            parser.error("--out_dir and --log require a single job.")
+    if opt.out_prefix is None and (opt.out_dir is None or opt.placers is None):
+        parser.error("--out_prefix is required.")
+
+    return opt
+
+
+class Job(object):
+    """ Commands of one tool run, with the files they read and write. """
+    def __init__(self, name, cmds, out_dir, inputs=(), outputs=(), files=None,
+                 timeout=None, result_file=None, result_src=None):
+        self.name = name
+        self.cmds = cmds            # argument lists, run in order
+        self.out_dir = out_dir
+        self.inputs = inputs        # files linked into the scratch directory
+        self.outputs = outputs      # glob patterns, or (file, new name) pairs
+        self.files = files if files is not None else dict()  # name : content
+        self.timeout = timeout      # in seconds, for all of the commands
+        self.result_file = result_file  # main output, under out_dir
+        self.result_src = result_src    # output copied to result_file
+        self.log = os.path.join(out_dir, name + '.log.txt')
+
+
+class JobResult(object):
+    def __init__(self, job, status, returncode, run_time, outputs):
+        self.job = job
+        self.name = job.name
+        self.status = status        # done, failed, timeout or cancelled
+        self.returncode = returncode
+        self.run_time = run_time
+        self.outputs = outputs      # files moved to job.out_dir
+
+        self.result_file = None
+        if job.result_file is not None:
+            result_file = os.path.join(job.out_dir, job.result_file)
+            if status == 'done' and os.path.exists(result_file):
+                self.result_file = result_file
+
+
+    def __str__(self):
+        return "%-24s %-9s %8.1f s  %s" \
+               % (self.name, self.status, self.run_time, self.result_file or '-')
+
+
+def get_cpu_sets(max_jobs=None, cpus_per_job=1):
+    """ Split the CPUs this process may use into sets, one per job slot. """
+    if not hasattr(os, 'sched_setaffinity'):
+        return [None] * (max_jobs or os.cpu_count() or 1)
+
+    cpus = sorted(os.sched_getaffinity(0))
+    if max_jobs is None:
+        max_jobs = max(1, len(cpus) // max(1, cpus_per_job))
+
+    if max_jobs > len(cpus):    # More jobs than CPUs: share them
+        return [set(cpus) for i in range(max_jobs)]
+    return [set(cpus[i::max_jobs]) for i in range(max_jobs)]
+
+
+class ToolRunner(object):
+    def __init__(self, max_jobs=None, cpus_per_job=1, scratch_dir=None,
+                 keep_scratch=False, quiet=False):
+        self.cpu_sets = get_cpu_sets(max_jobs, cpus_per_job)
+        self.scratch_dir = scratch_dir
+        self.keep_scratch = keep_scratch
+        self.quiet = quiet
+        self.slots = None   # queue of free CPU sets, created in the event loop
+
+
+    def run(self, jobs):
+        """ Run jobs to completion and return their results in order. """
+        return asyncio.run(self.run_all(jobs))
+
+
+    async def run_all(self, jobs):
+        return await asyncio.gather(*[self.run_job(j) for j in jobs])
+
+
+    async def get_slot(self):
+        if self.slots is None:
+            self.slots = asyncio.Queue()
+            for cpus in self.cpu_sets:
+                self.slots.put_nowait(cpus)
+        return await self.slots.get()
+
+
+    async def run_job(self, job):
+        """ Run a job once a slot is free. Cancelling the task kills the
+        running tool, and the job is reported as cancelled, also while it
+        is still waiting for a slot.
+        """
+        try:
+            cpus = await self.get_slot()
+        except asyncio.CancelledError:
+            result = JobResult(job, 'cancelled', None, 0.0, [])
+            if not self.quiet:
+                print ("[%s] %s" % (job.name, result))
+            return result
+
+        try:
+            return await self.run_in_scratch(job, cpus)
+        finally:
+            self.slots.put_nowait(cpus)
+
+
+    async def run_in_scratch(self, job, cpus):
+        if not os.path.isdir(job.out_dir):
+            os.makedirs(job.out_dir)
+        work_dir = tempfile.mkdtemp(prefix=job.name + '_',
+                                    dir=self.scratch_dir or job.out_dir)
+        for src in job.inputs:
+            os.symlink(os.path.abspath(src),
+                       os.path.join(work_dir, os.path.basename(src)))
+        for name, content in job.files.items():
+            with open(os.path.join(work_dir, name), 'w') as f:
+                f.write(content)
+
+        start = time()
+        status, returncode = 'done', 0
+        with open(job.log, 'w') as f_log:
+            try:
+                for cmd in job.cmds:
+                    returncode = await self.run_command(job, cmd, work_dir,
+                                                        cpus, f_log, start)
+                    if returncode != 0:
+                        status = 'failed'
+                        break
+            except asyncio.TimeoutError:
+                status, returncode = 'timeout', None
+            except asyncio.CancelledError:
+                status, returncode = 'cancelled', None
+
+            run_time = time() - start
+            f_log.write("\nRun time: %.1f s (%s)\n" % (run_time, status))
+
+        outputs = list()
+        if status != 'cancelled':
+            outputs = move_outputs(job, work_dir)
+        if not self.keep_scratch:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        result = JobResult(job, status, returncode, run_time, outputs)
+        if not self.quiet:
+            print ("[%s] %s" % (job.name, result))
+        return result
+
+
+    async def run_command(self, job, cmd, work_dir, cpus, f_log, start):
+        line = ' '.join(cmd)
+        f_log.write(line + '\n')
+        if not self.quiet:
+            print ("[%s] %s" % (job.name, line))
+
+        def set_affinity():
+            if cpus is not None:
+                os.sched_setaffinity(0, cpus)
+
+        proc = await asyncio.create_subprocess_exec(
+                    *cmd, cwd=work_dir, stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    preexec_fn=set_affinity, start_new_session=True)
+
+        timeout = None
+        if job.timeout is not None:
+            timeout = max(0, job.timeout - (time() - start))
+        try:
+            return await asyncio.wait_for(self.communicate(job, proc, f_log),
+                                          timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await kill(proc)
+            raise
+
+
+    async def communicate(self, job, proc, f_log):
+        """ Stream the output of proc and return its exit code. """
+        prefix = "[%s] " % (job.name)
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            line = line.decode('utf-8', 'replace')
+            f_log.write(line)
+            if not self.quiet:
+                sys.stdout.write(prefix + line)
+        f_log.flush()
+        return await proc.wait()
+
+
+async def kill(proc):
+    """ Terminate the process group of a tool, then kill it if needed. """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            await asyncio.wait_for(asyncio.shield(proc.wait()), KILL_WAIT)
+            break
+        except asyncio.TimeoutError:
+            continue
+
+
+def move_outputs(job, work_dir):
+    """ Move the files matching job.outputs from work_dir to job.out_dir. """
+    moved = list()
+    for pattern in job.outputs:
+        if isinstance(pattern, tuple):
+            pattern, new_name = pattern
+        else:
+            new_name = None
+
+        for src in sorted(glob.glob(os.path.join(work_dir, pattern))):
+            if os.path.islink(src):     # inputs
+                continue
+            dest = os.path.join(job.out_dir, new_name or os.path.basename(src))
+            shutil.move(src, dest)
+            moved.append(dest)
+
+    if job.result_src is not None:
+        src = os.path.join(job.out_dir, job.result_src)
+        if os.path.exists(src):
+            dest = os.path.join(job.out_dir, job.result_file)
+            shutil.copy(src, dest)
+            moved.append(dest)
+    return moved
+
+
+def get_fastplace_dp_cmd(bench, bookshelf_dir, target_density, src_pl):
+    """ FastPlace detailed placement of src_pl, in the current directory. """
+    return [os.path.join(BIN_DIR, 'FastPlace3.0_Linux64_DP'), '-legalize',
+            '-noFlipping', '-target_density', str(target_density),
+            bookshelf_dir, bench + '.aux', '.', src_pl]
+
+
+def get_placer_job(bench, bookshelf_dir, placer, target_density, out_dir,
+                   timeout=None):
+    """ A job running placer as run_place.sh does. The placement is
+    <out_dir>/<bench>_solution.pl.
+    """
+    bookshelf_dir = os.path.abspath(bookshelf_dir)
+    aux = os.path.join(bookshelf_dir, bench + '.aux')
+    density = str(target_density)
+    inputs, solution = list(), '%s_FP_dp.pl' % (bench)
+
+    if placer == 'Capo':
+        cmds = [[os.path.join(BIN_DIR, 'MetaPl-Capo10.2-Lnx64.exe'), '-faster',
+                 '-f', aux, '-save']]
+        solution = '%s_Capo.pl' % (bench)
+        outputs = [('out.pl', solution)]
+
+    elif placer == 'NTUPlace3':
+        cmds = [[os.path.join(BIN_DIR, 'ntuplace3'), '-aux', aux, '-util', density]]
+        solution = '%s.ntup.pl' % (bench)
+        outputs = ['*.pl', '*.plt']
+
+    elif placer == 'ComPLx':
+        cmds = [[os.path.join(BIN_DIR, 'ComPLx.exe'), '-f', aux, '-ut', density],
+                get_fastplace_dp_cmd(bench, bookshelf_dir, density,
+                                     bench + '-ComPLx.pl')]
+        outputs = [bench + '-ComPLx.pl', solution]
+
+    elif placer == 'FastPlace-GP':
+        cmds = [[os.path.join(BIN_DIR, 'FastPlace3.0_Linux32_GP'),
+                 '-target_density', density, bookshelf_dir, bench + '.aux', '.'],
+                get_fastplace_dp_cmd(bench, bookshelf_dir, density,
+                                     bench + '_FP_gp.pl')]
+        outputs = [bench + '_FP_gp.pl', solution]
+
+    elif placer in ('mPL6', 'mPL5'):
+        # mPL reads the Bookshelf files in the current directory.
+        inputs = [os.path.join(bookshelf_dir, '%s.%s' % (bench, ext))
+                  for ext in BOOKSHELF_EXTS]
+        cmds = [[os.path.join(BIN_DIR, placer), '-d', bench + '.aux',
+                 '-mPL_DP', '0', '-target_density', density],
+                get_fastplace_dp_cmd(bench, bookshelf_dir, density,
+                                     bench + '-mPL.pl')]
+        outputs = ['*mPL.pl', solution]
+
+    else:
+        sys.stderr.write("Error: unknown placer %s.\n" % (placer))
+        raise SystemExit(-1)
+
+    if timeout is None:
+        timeout = TOOL_TIMEOUTS[placer]
+
+    return Job(placer, cmds, out_dir, inputs, outputs, timeout=timeout,
+               result_file=bench + '_solution.pl', result_src=solution)
+
+
+def get_router_job(input_gr, router, out_name, out_dir, timeout=None):
+    """ A job running router as run_groute.sh does. """
+    input_gr = os.path.abspath(input_gr)
+
+    if router == 'NCTUgr':
+        inputs = [os.path.join(BIN_DIR, f) for f in NCTUGR_DATA]
+        cmds = [[os.path.join(BIN_DIR, 'NCTUgr'), 'REGULAR_ISPD', input_gr,
+                 os.path.join(BIN_DIR, 'NCTU-GR', 'Parameter_Files',
+                              'RegularDefault.set'), out_name]]
+
+    elif router == 'FastRoute':
+        # FastRoute does not work outside of its directory.
+        inputs = [os.path.join(BIN_DIR, 'FastRoute')] \
+                 + [os.path.join(BIN_DIR, f) for f in NCTUGR_DATA]
+        cmds = [['./FastRoute', input_gr, '-o', out_name]]
+
+    elif router == 'BFG-R':
+        inputs = list()
+        cmds = [[os.path.join(BIN_DIR, 'FGR'), input_gr, '-o', out_name]]
+
+    else:
+        sys.stderr.write("Error: unknown router %s.\n" % (router))
+        raise SystemExit(-1)
+
+    if timeout is None:
+        timeout = TOOL_TIMEOUTS[router]
+
+    return Job(router, cmds, out_dir, inputs, [out_name + '*'],
+               timeout=timeout, result_file=out_name)
+
+
+def get_sizer_job(verilog, sdc, spef, lib, out_name, out_dir, timeout=None):
+    """ A job running USizer as run_sizer.sh does. The sized netlist is
+    <out_dir>/<out_name>.v.
+    """
+    inputs = [verilog, sdc, spef, lib]
+    config = ' '.join(os.path.basename(f) for f in inputs) + '\n'
+    cmds = [[os.path.join(BIN_DIR, 'usizer2013'), '-config', 'usizer.config',
+             'open-eda']]
+    if timeout is None:
+        timeout = TOOL_TIMEOUTS['USizer']
+
+    return Job('USizer', cmds, out_dir, inputs,
+               [('usizer_usizer.v', out_name + '.v'), 'usizer.config'],
+               files={'usizer.config' : config}, timeout=timeout,
+               result_file=out_name + '.v')
+
+
+if __name__ == '__main__':
+    opt = parse_cl()
+
+    def get_out_name(tool):
+        if opt.out_dir is not None:
+            return opt.out_prefix
+        return '%s_%s' % (opt.out_prefix, tool)
+
+    jobs = list()
+    for placer in opt.placers or ():
+        jobs.append(get_placer_job(opt.bench, opt.bookshelf_dir, placer,
+                                   opt.target_density,
+                                   opt.out_dir or get_out_name(placer), opt.timeout))
+    for router in opt.routers or ():
+        out_name = get_out_name(router)
+        jobs.append(get_router_job(opt.input_gr, router, out_name,
+                                   opt.out_dir or out_name, opt.timeout))
+    if opt.sizer is not None:
+        out_name = get_out_name(opt.sizer)
+        jobs.append(get_sizer_job(opt.verilog, opt.sdc, opt.spef, opt.lib,
+                                  out_name, opt.out_dir or out_name, opt.timeout))
+    if opt.log is not None:
+        jobs[0].log = opt.log
+
+    runner = ToolRunner(opt.max_jobs, opt.cpus_per_job,
+                        keep_scratch=opt.keep_scratch)
+    results = runner.run(jobs)
+
+    print ("")
+    print ("==================================================")
+    for r in results:
+        print (r)
+    print ("==================================================")
+
+    if any(r.status != 'done' for r in results):
+        raise SystemExit(-1)
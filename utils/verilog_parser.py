@@ -2,12 +2,21 @@
     A Verilog parser (for ISPD/ICCAD/TAU contest verilog files).
 """
 
-import sys, operator
+import sys, operator, gc, contextlib
+from itertools import islice
+
+import numpy as np
+
+import compressed_io
+import symbol_table
 
 __tie_cells__ = ('vcc', 'vss')
 __dff_name__ = 'ms00f80'
 __block_prefix__ = 'block_'
 
+CHUNKS_PER_WORKER = 4     # Byte ranges per process, for load balance
+BLOCK_LINES = 1 << 16     # Gate lines per block when reading without pins
+
 class Net(object):
     def __init__(self, name):
         self.name = name
@@ -69,6 +78,107 @@ class Instance(object):
         return val
 
 
+class Gates(object):
+    """ The gates of a cell section in compact form.
+
+    Names are kept newline-separated in one byte buffer, gate types as ids
+    into type_table, and pins in CSR form: the pins of gate i are
+    pin_start[i]:pin_start[i + 1] of pin_ids (into pin_table) and net_ids
+    (into the net table of the module). Blocks parsed with chunk-local
+    tables (see parse_gate_lines) are merged through the global tables.
+    """
+    def __init__(self, net_table, with_pins=True):
+        self.net_table = net_table
+        self.with_pins = with_pins
+        self.type_table = symbol_table.SymbolTable()
+        self.pin_table = symbol_table.SymbolTable()
+
+        self.name_buffer = b''
+        self.name_end = np.zeros(0, dtype=np.int64)     # offset of each '\n'
+        self.type_ids = np.zeros(0, dtype=np.int32)
+        self.pin_start = np.zeros(1, dtype=np.int64)
+        self.pin_ids = np.zeros(0, dtype=np.int32)
+        self.net_ids = np.zeros(0, dtype=np.int64)
+
+        self.blocks = list()    # until finish()
+
+
+    def __len__(self):
+        return len(self.type_ids)
+
+
+    def add_block(self, block):
+        """ Add the output of parse_gate_lines. """
+        types, type_ids, names, pins, pin_count, pin_ids, nets, net_ids = block
+        if len(type_ids) == 0:
+            return
+        type_map = self.type_table.add_all(types).astype(np.int32)
+        block = [type_map[type_ids], names]
+        if self.with_pins:
+            block.append(pin_count)
+            block.append(self.pin_table.add_all(pins).astype(np.int32)[pin_ids])
+            block.append(self.net_table.add_all(nets)[net_ids])
+        self.blocks.append(block)
+
+
+    def finish(self):
+        """ Concatenate the added blocks. """
+        blocks, self.blocks = self.blocks, list()
+        if not blocks:
+            return
+        self.name_buffer = b''.join([self.name_buffer]
+                                    + [b[1] + b'\n' for b in blocks])
+        self.type_ids = np.concatenate([self.type_ids] + [b[0] for b in blocks])
+        self.name_end = np.flatnonzero(np.frombuffer(self.name_buffer, dtype=np.uint8)
+                                       == ord('\n'))
+        if self.with_pins:
+            counts = np.concatenate([b[2] for b in blocks])
+            self.pin_start = np.concatenate((self.pin_start,
+                                             self.pin_start[-1] + np.cumsum(counts)))
+            self.pin_ids = np.concatenate([self.pin_ids] + [b[3] for b in blocks])
+            self.net_ids = np.concatenate([self.net_ids] + [b[4] for b in blocks])
+
+
+    def get_names(self, begin=0, end=None):
+        """ Names of gates begin to end. """
+        end = len(self) if end is None else end
+        if end <= begin:
+            return list()
+        first = self.name_end[begin - 1] + 1 if begin > 0 else 0
+        return self.name_buffer[first:self.name_end[end - 1]].decode().split('\n')
+
+
+    def get_types(self, begin=0, end=None):
+        """ Gate types of gates begin to end. """
+        names = self.type_table.names
+        return [names[t] for t in self.type_ids[begin:end].tolist()]
+
+
+    def get_net_degrees(self, nets):
+        """ Return net : number of gate pins on it, for nets. """
+        degree = np.bincount(self.net_ids, minlength=len(self.net_table))
+        return dict(zip(nets, degree[self.net_table.get_ids(nets)].tolist()))
+
+
+    def get_instances(self):
+        """ Build the Instances of all gates, with pin dicts if with_pins. """
+        instances = [Instance(t, n) for t, n in zip(self.get_types(), self.get_names())]
+        if not self.with_pins:
+            return instances
+
+        pin_names = self.pin_table.names
+        is_output = [p.startswith('o') for p in pin_names]
+        net_names = self.net_table.names
+        pins = zip(self.pin_ids.tolist(), self.net_ids.tolist())
+        for instance, count in zip(instances, np.diff(self.pin_start).tolist()):
+            for pin, net in islice(pins, count):
+                if is_output[pin]:
+                    instance.output_pin_dict[pin_names[pin]] = net_names[net]
+                else:
+                    instance.input_pin_dict[pin_names[pin]] = net_names[net]
+        return instances
+
+
 class Module(object):
     def __init__(self):
         self.name = None
@@ -77,6 +187,12 @@ class Module(object):
         self.wires = list()
         self.clock_port = None  # clock port name
 
+        # Declared nets (inputs, outputs, wires); the pin dicts of gates
+        # read serially refer to its name strings.
+        self.net_table = symbol_table.SymbolTable()
+
+        # Gates of a parallel or pinless read, until instances is accessed
+        self.gates = None
         self.instances = list()
 
         # circuit graph as a dictionary
@@ -85,8 +201,49 @@ class Module(object):
         self.net_dict = dict()
 
 
+    @property
+    def instances(self):
+        """ PI/PO nodes and gates. Gates read in compact form are built into
+        Instances on first access, along with the circuit graph if they
+        have pins.
+        """
+        if self.gates is not None:
+            gates, self.gates = self.gates, None
+            with gc_paused():
+                self._instances.extend(gates.get_instances())
+                if gates.with_pins:
+                    self.construct_circuit_graph()
+        return self._instances
+
+
+    @instances.setter
+    def instances(self, instances):
+        self.gates = None
+        self._instances = instances
+
+
+    @property
+    def net_dict(self):
+        self.instances      # Build pending gates
+        return self._net_dict
+
+
+    @net_dict.setter
+    def net_dict(self, net_dict):
+        self._net_dict = net_dict
+
+
     def get_instance_count(self):
-        return len(self.instances) - len(self.inputs) - len(self.outputs)
+        num_gates = len(self.gates) if self.gates is not None else 0
+        return len(self._instances) + num_gates - len(self.inputs) - len(self.outputs)
+
+
+    def get_gate_types(self):
+        """ Gate types of all instances, without building pending gates. """
+        types = [i.gate_type for i in self._instances]
+        if self.gates is not None:
+            types.extend(self.gates.get_types())
+        return types
 
 
     def print_stats(self):
@@ -97,20 +254,29 @@ class Module(object):
         print ("Number of outputs  : %d" % (len(self.outputs)))
         print ("Number of wires    : %d" % (len(self.wires)))
 
-        num_instances = len(self.instances) - (len(self.inputs + self.outputs))
+        print ("Number of instances: %d" % (self.get_instance_count()))
 
-        print ("Number of instances: %d" % (num_instances))
-
-        big_blocks = [i for i in self.instances \
-                      if i.gate_type.startswith(__block_prefix__)]
+        gate_types = self.get_gate_types()
+        big_blocks = [t for t in gate_types if t.startswith(__block_prefix__)]
         if not len(big_blocks) == 0:
             print ("Number of macros   : %d" % (len(big_blocks)))
 
-        tie_cells = [i for i in self.instances if i.gate_type in __tie_cells__]
+        tie_cells = [t for t in gate_types if t in __tie_cells__]
         if not len(tie_cells) == 0:
             print ("Number of tie cells: %d" % (len(tie_cells)))
 
-        net_degree = {k : len(v.nodes) for k,v in self.net_dict.items() if k != 'iccad_clk'}
+        if self.gates is not None and self.gates.with_pins:
+            net_degree = self.gates.get_net_degrees(self.inputs + self.outputs
+                                                    + self.wires)
+            for n in self.inputs + self.outputs:
+                net_degree[n] += 1      # PI/PO node
+        elif len(self._net_dict) > 0:
+            net_degree = {k : len(v.nodes) for k,v in self._net_dict.items()}
+        else:
+            print ("==================================================\n")
+            return      # read without pins
+
+        net_degree.pop('iccad_clk', None)
         max_fanout = max(net_degree.items(), key=operator.itemgetter(1))
         avg_fanout = sum(net_degree.values()) / float(len(net_degree.values()))
 
@@ -120,20 +286,62 @@ class Module(object):
         print ("==================================================\n")
 
 
-    def read_verilog(self, file_name):
+    def read_verilog(self, file_name, num_workers=1, with_pins=True):
         """ Read verilog and get netlist info.
        
         Read a given verilog file and generate the dictionary of the circuit
         graph, as well as input/output/wire lists and a gate list.
         The given verilog must follow the ISPD/ICCAD/TAU specification.
+
+        With num_workers > 1, the cell section of an uncompressed file is
+        split into byte ranges and parsed by that many processes.
+        With with_pins False, gates are read without their pins and the
+        circuit graph is not built (see iter_gates to stream the pins).
+        Gates of a parallel or pinless read are kept in self.gates, and
+        only built into Instances (and the circuit graph) when
+        self.instances or self.net_dict is accessed.
         """
+        file_name = compressed_io.find_file(file_name)
+        parallel = num_workers > 1 and compressed_io.get_extension(file_name) is None
+
+        # The netlist is a great many small objects, which the cyclic GC
+        # would otherwise rescan every few thousand allocations.
+        with gc_paused():
+            if parallel:
+                with open(file_name, 'rb') as f:
+                    self.read_header(iter_binary_lines(f))
+                    cell_start = f.tell()
+                self.create_pio_nodes()
+                self.read_cells_parallel(file_name, cell_start, num_workers,
+                                         with_pins)
+            else:
+                with compressed_io.open_file(file_name) as f:
+                    # Read file without blank lines
+                    lines_iter = (l for l in (line.strip() for line in f) if l)
+                    self.read_header(lines_iter)
+                    self.create_pio_nodes()
+                    self.read_cells(lines_iter, with_pins)
+
+            # Circuit graph construction (deferred for compact gates)
+            if with_pins and self.gates is None:
+                self.construct_circuit_graph()
+
+        try:
+            assert len(self.inputs) > 0    
+            assert len(self.outputs) > 0    
+            assert len(self.wires) > 0    
+            assert self.get_instance_count() > 0
+        except AssertionError:
+            print ("Error: in Verilog parsing...")
+            sys.exit(-1)
 
-        # read file without blank lines
-        with open(file_name, 'r') as f:
-            lines = [l for l in (line.strip() for line in f) if l]
-        lines_iter = iter(lines)
 
-        # Get input, output, wire names 
+    def read_header(self, lines_iter):
+        """ Get input, output, wire names.
+
+        lines_iter yields stripped non-blank lines, and is left at the first
+        line of the cell section.
+        """
         inputs, outputs, wires = list(), list(), list()
 
         for line in lines_iter:
@@ -176,40 +384,53 @@ class Module(object):
         self.inputs = inputs
         self.outputs = outputs
         self.wires = wires  # wire = wire - input - output
+        self.net_table = symbol_table.SymbolTable(inputs + outputs + wires)
 
-        # Create PI/PO nodes
-        self.create_pio_nodes()
-
-        # Gate node extraction
-        for line in lines_iter:
-            for c in ['.', ',', '(', ')', ';']:
-                line = line.replace(c, ' ')
 
-            tokens = line.split()
+    def read_cells(self, lines_iter, with_pins=True):
+        """ Gate node extraction. """
+        if not with_pins:
+            self.gates = Gates(self.net_table, with_pins)
+            for block in iter(lambda: list(islice(lines_iter, BLOCK_LINES)), []):
+                self.gates.add_block(parse_gate_lines(block, with_pins))
+            self.gates.finish()
+            return
 
-            if tokens.__len__() < 2 or tokens[0] == '//': continue
+        intern = self.net_table.intern
+        for line in lines_iter:
+            gate = parse_gate(line)
+            if gate is None: continue
 
-            gate_type, name = tokens[0], tokens[1]
+            gate_type, name, pins = gate
             self.instances.append( Instance(gate_type, name) ) 
+            if not with_pins: continue
 
-            it = iter(tokens[2:])
-            for (pin, net) in zip(it, it):
+            for (pin, net) in pins:
+                net = intern(net)
                 if pin.startswith('o'):
                     self.instances[-1].output_pin_dict[pin] = net
                 else:
                     self.instances[-1].input_pin_dict[pin] = net
 
-        # Circuit graph construction
-        self.construct_circuit_graph()
 
+    def read_cells_parallel(self, file_name, start, num_workers, with_pins=True):
+        """ Parse the cell section from byte offset start with num_workers
+        processes, and append the gates in file order.
+        """
+        import multiprocessing
+
+        ranges = [r + (with_pins,) for r in
+                  split_file(file_name, start, num_workers * CHUNKS_PER_WORKER)]
+        gates = Gates(self.net_table, with_pins)
+        pool = multiprocessing.Pool(num_workers)
         try:
-            assert len(inputs) > 0    
-            assert len(outputs) > 0    
-            assert len(wires) > 0    
-            assert len(self.instances) > 0
-        except AssertionError:
-            print ("Error: in Verilog parsing...")
-            sys.exit(-1)
+            for block in pool.imap(parse_cell_chunk, ranges):
+                gates.add_block(block)
+        finally:
+            pool.close()
+            pool.join()
+        gates.finish()
+        self.gates = gates
 
 
     def create_pio_nodes(self):
@@ -295,7 +516,7 @@ class Module(object):
         outputs = sorted(self.outputs)
         wires = sorted(self.wires)
 
-        with open(file_name, 'w') as f:
+        with compressed_io.open_file(file_name, 'w') as f:
             f.write("module %s (\n" % (self.name))
             f.write(',\n'.join(inputs) + ',\n')
             f.write(',\n'.join(outputs) + ');\n')
@@ -323,7 +544,7 @@ class Module(object):
 
         inputs.remove(self.clock_port)   # FIXME
 
-        with open(file_name, 'w') as f:
+        with compressed_io.open_file(file_name, 'w') as f:
             f.write('# Synopsys Design Constraints Format\n\n'
                     '# clock definition\n')
             f.write("create_clock -name mclk -period %.2f [get_ports %s]\n\n" \
@@ -343,6 +564,133 @@ class Module(object):
             [f.write("set_load -pin_load 4.0 [get_ports %s]\n" % (o)) for o in outputs]
 
 
+@contextlib.contextmanager
+def gc_paused():
+    """ Disable the cyclic garbage collector within a with block. """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def parse_gate(line):
+    """ Split a gate line into (gate type, name, [(pin, net), ...]),
+    or return None if it is not a gate.
+    """
+    for c in ['.', ',', '(', ')', ';']:
+        line = line.replace(c, ' ')
+
+    tokens = line.split()
+
+    if tokens.__len__() < 2 or tokens[0] == '//': return None
+
+    it = iter(tokens[2:])
+    return tokens[0], tokens[1], list(zip(it, it))
+
+
+def iter_gates(file_name):
+    """ Yield (gate type, name, [(pin, net), ...]) for each gate of a
+    verilog file, reading one line at a time.
+    """
+    with compressed_io.open_file(file_name) as f:
+        lines_iter = (l for l in (line.strip() for line in f) if l)
+        skip_header(lines_iter)
+        for line in lines_iter:
+            gate = parse_gate(line)
+            if gate is not None:
+                yield gate
+
+
+def skip_header(lines_iter):
+    """ Advance lines_iter as Module.read_header does, without keeping the
+    net names.
+    """
+    in_wires = False
+    for line in lines_iter:
+        if line.startswith('wire '):
+            in_wires = True
+        elif in_wires:
+            return
+        elif line.startswith('module '):
+            while not next(lines_iter).endswith(');'):
+                continue
+
+
+def iter_binary_lines(f):
+    """ Yield stripped non-blank lines of a binary file. f.tell() after
+    a line is the offset of the next one.
+    """
+    for line in iter(f.readline, b''):
+        line = line.strip()
+        if line:
+            yield line.decode()
+
+
+def split_file(file_name, start, num_chunks):
+    """ Split file_name from byte offset start into (file_name, begin, end)
+    ranges that begin and end at line boundaries.
+    """
+    with open(file_name, 'rb') as f:
+        f.seek(0, 2)
+        size = f.tell()
+
+        bounds = [start]
+        for k in range(1, num_chunks):
+            f.seek(max(start + (size - start) * k // num_chunks, bounds[-1]))
+            if f.tell() > start:
+                f.seek(-1, 1)   # a line starting right at the split point
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+        bounds.append(size)
+
+    return [(file_name, b, e) for b, e in zip(bounds[:-1], bounds[1:]) if e > b]
+
+
+def parse_gate_lines(lines, with_pins=True):
+    """ Parse gate lines into compact arrays, with chunk-local tables:
+    (types, type ids, names, pin names, pin count per gate, pin name ids,
+    net names, net ids). Names are newline-separated bytes.
+    """
+    types, pins, nets = dict(), dict(), dict()     # name : local id
+    type_ids, names, pin_count, pin_ids, net_ids = list(), list(), list(), list(), list()
+    with gc_paused():
+        for line in lines:
+            gate = parse_gate(line.strip())
+            if gate is None: continue
+
+            gate_type, name, gate_pins = gate
+            type_ids.append(types.setdefault(gate_type, len(types)))
+            names.append(name)
+            if not with_pins: continue
+
+            pin_count.append(len(gate_pins))
+            for (pin, net) in gate_pins:
+                pin_ids.append(pins.setdefault(pin, len(pins)))
+                net_ids.append(nets.setdefault(net, len(nets)))
+
+    return (list(types), np.array(type_ids, dtype=np.int32),
+            '\n'.join(names).encode(), list(pins),
+            np.array(pin_count, dtype=np.int64), np.array(pin_ids, dtype=np.int32),
+            list(nets), np.array(net_ids, dtype=np.int64))
+
+
+def parse_cell_chunk(args):
+    """ Parse the gate lines in a (file_name, begin, end, with_pins) byte
+    range with parse_gate_lines.
+
+    Only arrays and the distinct names of the chunk are sent back, so the
+    parent merges tables instead of unpickling an object per gate.
+    """
+    file_name, begin, end, with_pins = args
+    with open(file_name, 'rb') as f:
+        f.seek(begin)
+        data = f.read(end - begin).decode()
+    return parse_gate_lines(data.split('\n'), with_pins)
+
+
 def extract_pin_and_net(token):
     """ token should be .PIN(NET), or .PIN(NET) """ 
     # replace .,() with blank
@@ -360,6 +708,8 @@ if __name__ == '__main__':
         import argparse
         parser = argparse.ArgumentParser(description='A Verilog parser.')
         parser.add_argument('-i', action="store", dest='src', required=True)
+        parser.add_argument('-j', action="store", type=int, dest='num_workers',
+                            default=1, help="Number of parsing processes")
         opt = parser.parse_args()
         return opt
 
@@ -367,7 +717,7 @@ if __name__ == '__main__':
     src = opt.src
 
     module = Module()
-    module.read_verilog(src)
+    module.read_verilog(src, opt.num_workers)
     module.print_stats()
 
 